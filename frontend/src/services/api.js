@@ -1,12 +1,14 @@
 import axios from 'axios';
 
 const API_URL = 'http://localhost:8000/api';
+// Чтение каталога - асинхронные представления (ответы как у /api/rooms/)
+const ASYNC_API_URL = `${API_URL}/async`;
 
 export const roomsAPI = {
   // Получение списка комнат с фильтрацией
   getRooms: async (params) => {
     try {
-      const response = await axios.get(`${API_URL}/rooms/`, { params });
+      const response = await axios.get(`${ASYNC_API_URL}/rooms/`, { params });
       return response.data;
     } catch (error) {
       console.error('Ошибка при получении списка комнат:', error);
@@ -17,7 +19,7 @@ export const roomsAPI = {
   // Получение деталей конкретной комнаты
   getRoomDetails: async (roomId) => {
     try {
-      const response = await axios.get(`${API_URL}/rooms/${roomId}/`);
+      const response = await axios.get(`${ASYNC_API_URL}/rooms/${roomId}/`);
       return response.data;
     } catch (error) {
       console.error('Ошибка при получении информации о комнате:', error);
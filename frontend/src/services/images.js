@@ -0,0 +1,9 @@
+// Уменьшенные копии изображений из API (photo_variants, image_variants).
+// v-img не умеет <source type>, поэтому берется srcset в WebP - его
+// понимают все современные браузеры; ширину браузер выбирает по sizes.
+// Пока копии не построены, variants равен null и грузится исходник.
+export function variantSrcset(variants, type = 'image/webp') {
+  if (!variants) return undefined;
+  const source = variants.sources.find((item) => item.type === type) || variants.sources[0];
+  return source ? source.srcset : undefined;
+}
@@ -9,6 +9,9 @@ export default createStore({
     user: null,
     rooms: [],
     bookings: [],
+    // Курсор следующей страницы ленты бронирований и общее число (?count=1)
+    bookingsNext: null,
+    bookingsCount: 0,
     reviews: []
   },
   mutations: {
@@ -24,6 +27,13 @@ export default createStore({
     setBookings(state, bookings) {
       state.bookings = bookings
     },
+    appendBookings(state, bookings) {
+      state.bookings = state.bookings.concat(bookings)
+    },
+    setBookingsPage(state, { next, count }) {
+      state.bookingsNext = next
+      state.bookingsCount = count
+    },
     setReviews(state, reviews) {
       state.reviews = reviews
     }
@@ -56,8 +66,25 @@ export default createStore({
     },
     async fetchBookings({ commit }) {
       try {
-        const response = await axios.get(`${API_URL}/bookings/`)
-        commit('setBookings', response.data)
+        // Курсорная пагинация: {count, next, previous, results}; count только по ?count=1
+        const response = await axios.get(`${API_URL}/bookings/`, { params: { count: 1 } })
+        commit('setBookings', response.data.results)
+        commit('setBookingsPage', { next: response.data.next, count: response.data.count })
+      } catch (error) {
+        console.error('Error fetching bookings:', error)
+      }
+    },
+    async fetchMoreBookings({ commit, state }) {
+      if (!state.bookingsNext) {
+        return
+      }
+      try {
+        // Число уже известно: следующие страницы без повторного подсчёта
+        const url = new URL(state.bookingsNext)
+        url.searchParams.delete('count')
+        const response = await axios.get(url.toString())
+        commit('appendBookings', response.data.results)
+        commit('setBookingsPage', { next: response.data.next, count: state.bookingsCount })
       } catch (error) {
         console.error('Error fetching bookings:', error)
       }
@@ -65,6 +92,7 @@ export default createStore({
   },
   getters: {
     isAuthenticated: state => state.isAuthenticated,
-    user: state => state.user
+    user: state => state.user,
+    hasMoreBookings: state => state.bookingsNext !== null
   }
 }) 
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+Стоимость старта процесса: django.setup() с загрузкой админки.
+
+Каждый замер выполняется в отдельном интерпретаторе, чтобы кэш модулей
+не искажал результат. Отдельно измеряется первое построение PDF, которое
+теперь платит за поиск шрифта, и повторные поиски шрифта: базовая линия
+без кэша (get_default_font.cache_clear() перед каждым вызовом, как при
+поиске шрифта на каждый отчёт) против lru_cache.
+
+    python benchmarks/admin_import.py --runs 10 --lookups 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'guesthouse_booking.settings')
+started = time.perf_counter()
+import django
+django.setup()
+import bookings.admin
+setup = time.perf_counter() - started
+result = {'setup_ms': setup * 1000, 'reportlab_loaded': 'reportlab' in sys.modules}
+if %(with_font)r:
+    started = time.perf_counter()
+    from bookings.pdf_utils import get_default_font
+    get_default_font()
+    result['first_font_ms'] = (time.perf_counter() - started) * 1000
+
+    def lookups(clear):
+        timings = []
+        for _ in range(%(lookups)d):
+            if clear:
+                get_default_font.cache_clear()
+            started = time.perf_counter()
+            get_default_font()
+            timings.append((time.perf_counter() - started) * 1000)
+        return sum(timings) / len(timings)
+
+    result['cold_font_ms'] = lookups(clear=True)
+    result['cached_font_ms'] = lookups(clear=False)
+print(json.dumps(result))
+"""
+
+
+def run_probe(with_font, lookups=0):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE % {'with_font': with_font, 'lookups': lookups}],
+        cwd=PROJECT_DIR, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples, key, digits=1):
+    values = [sample[key] for sample in samples]
+    return {
+        'median_ms': round(statistics.median(values), digits),
+        'min_ms': round(min(values), digits),
+        'max_ms': round(max(values), digits),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--lookups', type=int, default=20, help='повторных поисков шрифта в одном процессе')
+    args = parser.parse_args()
+
+    setup_samples = [run_probe(with_font=False) for _ in range(args.runs)]
+    font_samples = [run_probe(with_font=True, lookups=args.lookups) for _ in range(args.runs)]
+    # Повторный поиск - доли миллисекунды
+    cold = summarize(font_samples, 'cold_font_ms', digits=4)
+    cached = summarize(font_samples, 'cached_font_ms', digits=4)
+    print(json.dumps({
+        'runs': args.runs,
+        'django_setup_with_admin': summarize(setup_samples, 'setup_ms'),
+        'reportlab_loaded_at_startup': setup_samples[0]['reportlab_loaded'],
+        'first_pdf_font_lookup': summarize(font_samples, 'first_font_ms'),
+        'font_lookup_per_report': {
+            'lookups': args.lookups,
+            'baseline_cold_cache': cold,
+            'lru_cache': cached,
+            'speedup': round(cold['median_ms'] / max(cached['median_ms'], 0.0001), 1),
+        },
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
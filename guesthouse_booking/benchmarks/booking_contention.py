@@ -0,0 +1,113 @@
+"""
+Нагрузочная проверка создания бронирований под конкуренцией.
+
+Несколько процессов одновременно бронируют небольшой набор комнат на
+случайные пересекающиеся даты через bookings.services.create_booking.
+Скрипт работает с базой бенчмарков (benchmarks/settings.py: SQLite или
+PostgreSQL из настроек проекта), создаёт собственные комнаты и гостей и
+удаляет их по завершении.
+
+    python benchmarks/booking_contention.py --processes 8 --attempts 200 --rooms 3
+
+Результат: число успешных бронирований и конфликтов, пропускная
+способность и проверка, что ни одна ночь не занята дважды.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+from multiprocessing import Pool
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import setup_django  # noqa: E402
+
+
+def worker(args):
+    """Выполняет серию попыток бронирования в отдельном процессе"""
+    room_ids, user_id, attempts, seed = args
+    from django.db import connections
+    from bookings.models import Room
+    from django.contrib.auth.models import User
+    from bookings.services import BookingConflict, create_booking
+
+    rng = random.Random(seed)
+    user = User.objects.get(pk=user_id)
+    rooms = list(Room.objects.filter(pk__in=room_ids))
+    start = date(2030, 1, 1)
+    created = conflicts = 0
+    errors = []
+    for _ in range(attempts):
+        check_in = start + timedelta(days=rng.randrange(60))
+        try:
+            create_booking(user, rng.choice(rooms), check_in, check_in + timedelta(days=rng.randint(1, 4)))
+            created += 1
+        except BookingConflict:
+            conflicts += 1
+        except Exception as e:
+            errors.append(repr(e))
+    connections.close_all()
+    return created, conflicts, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--attempts', type=int, default=100, help='попыток на процесс')
+    parser.add_argument('--rooms', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.contrib.auth.models import User
+    from django.db import connection, connections
+    from django.db.models import Count
+    from bookings.models import Room, RoomNight
+
+    call_command('migrate', verbosity=0)
+    tag = uuid.uuid4().hex[:8]
+    rooms = [
+        Room.objects.create(room_number=f'bench-{tag}-{i}', room_type='Эконом', price_per_night=1000, max_occupancy=2)
+        for i in range(args.rooms)
+    ]
+    users = [User.objects.create_user(username=f'bench-{tag}-{i}') for i in range(args.processes)]
+    room_ids = [room.pk for room in rooms]
+    connections.close_all()
+
+    try:
+        tasks = [(room_ids, user.pk, args.attempts, i) for i, user in enumerate(users)]
+        started = time.perf_counter()
+        with Pool(args.processes, initializer=setup_django) as pool:
+            results = pool.map(worker, tasks)
+        elapsed = time.perf_counter() - started
+
+        created = sum(result[0] for result in results)
+        conflicts = sum(result[1] for result in results)
+        errors = [error for result in results for error in result[2]]
+        double_booked = RoomNight.objects.filter(room_id__in=room_ids).values('room_id', 'date').annotate(
+            total=Count('id')
+        ).filter(total__gt=1).count()
+        print(json.dumps({
+            'database': connection.vendor,
+            'processes': args.processes,
+            'rooms': args.rooms,
+            'attempts': args.processes * args.attempts,
+            'created': created,
+            'conflicts': conflicts,
+            'errors': len(errors),
+            'error_samples': sorted(set(errors))[:5],
+            'seconds': round(elapsed, 2),
+            'attempts_per_second': round(args.processes * args.attempts / elapsed, 1),
+            'double_booked_nights': double_booked,
+        }, indent=2))
+    finally:
+        Room.objects.filter(pk__in=room_ids).delete()
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+
+if __name__ == '__main__':
+    main()
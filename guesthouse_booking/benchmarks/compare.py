@@ -0,0 +1,55 @@
+"""
+Сравнивает два файла результатов benchmarks/run.py.
+
+    python benchmarks/compare.py base.json head.json --threshold 0.15
+
+Код возврата 1, если p50 или число запросов какого-либо сценария выросли
+больше порога (для запросов - любое увеличение).
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding='utf-8') as results_file:
+        return json.load(results_file)
+
+
+def compare(base, head, threshold):
+    rows = []
+    regressions = []
+    for name in sorted(set(base['results']) | set(head['results'])):
+        old = base['results'].get(name, {})
+        new = head['results'].get(name, {})
+        if 'p50_ms' not in old or 'p50_ms' not in new:
+            rows.append((name, old.get('p50_ms'), new.get('p50_ms'), None, old.get('queries'), new.get('queries')))
+            continue
+        change = (new['p50_ms'] - old['p50_ms']) / old['p50_ms'] if old['p50_ms'] else 0.0
+        rows.append((name, old['p50_ms'], new['p50_ms'], change, old['queries'], new['queries']))
+        if change > threshold or new['queries'] > old['queries']:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.15, help='допустимый рост p50 (доля)')
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    rows, regressions = compare(base, head, args.threshold)
+    print(f"{'scenario':28}{'base p50':>12}{'head p50':>12}{'change':>10}{'queries':>12}")
+    for name, old, new, change, old_queries, new_queries in rows:
+        change_text = f'{change:+.0%}' if change is not None else '-'
+        mark = ' !' if name in regressions else ''
+        print(f'{name:28}{old or "-":>12}{new or "-":>12}{change_text:>10}{f"{old_queries}->{new_queries}":>12}{mark}')
+    if regressions:
+        print(f"\nРегрессии: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Конкурентная запись и чтение при разных профилях базы данных.
+
+Каждый профиль - набор переменных окружения настроек проекта
+(DB_ENGINE, DB_CONN_MAX_AGE, SQLITE_*, DB_POOL). Для профиля скрипт
+запускается заново в отдельном процессе, а тот - --processes рабочих
+процессов. Рабочий повторяет цикл запроса Django: сигнал
+request_started, бронирование через bookings.services.create_booking
+(доля --write-ratio) или поиск свободных комнат, сигнал request_finished.
+Поэтому в замер входят открытие соединений (CONN_MAX_AGE=0), их
+переиспользование и выдача из пула.
+
+Профили:
+- sqlite-default: журнал DELETE, synchronous=FULL, без mmap, соединение
+  на каждый запрос - как до настройки профиля SQLite;
+- sqlite-tuned: настройки проекта по умолчанию (WAL, synchronous=NORMAL,
+  busy_timeout, mmap_size, постоянные соединения);
+- postgresql, postgresql-persistent, postgresql-pool: соединение на
+  запрос, постоянные соединения и пул psycopg. Параметры сервера - из
+  окружения (DB_HOST, DB_USER, ...), база BENCH_DB или guesthouse_bench.
+
+    python benchmarks/db_concurrency.py --processes 8 --requests 200
+    python benchmarks/db_concurrency.py --profile sqlite-default --profile sqlite-tuned \\
+        --output benchmarks/results/db.json
+
+Профиль, для которого нет драйвера или сервера, попадает в результат с
+ошибкой. Созданные комнаты, гости и бронирования удаляются.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+from multiprocessing import Pool
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import PROJECT_DIR, setup_django  # noqa: E402
+
+PROFILES = {
+    'sqlite-default': {
+        'DB_ENGINE': 'sqlite', 'DB_CONN_MAX_AGE': '0', 'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT': '5000', 'SQLITE_MMAP_SIZE': '0',
+    },
+    'sqlite-tuned': {'DB_ENGINE': 'sqlite'},
+    'postgresql': {'DB_ENGINE': 'postgresql', 'DB_CONN_MAX_AGE': '0'},
+    'postgresql-persistent': {'DB_ENGINE': 'postgresql', 'DB_CONN_MAX_AGE': '60'},
+    'postgresql-pool': {'DB_ENGINE': 'postgresql', 'DB_POOL': 'True'},
+}
+
+
+def worker(args):
+    """Серия запросов в отдельном процессе: время каждого и ошибки по типам"""
+    room_ids, user_id, requests, write_ratio, seed = args
+    from django.contrib.auth.models import User
+    from django.core.signals import request_finished, request_started
+    from django.db import connections
+
+    from bookings.models import Room
+    from bookings.services import BookingConflict, create_booking
+
+    rng = random.Random(seed)
+    user = User.objects.get(pk=user_id)
+    rooms = list(Room.objects.filter(pk__in=room_ids))
+    connections.close_all()
+    start = date(2030, 1, 1)
+    timings = {'write': [], 'read': []}
+    conflicts = 0
+    errors = Counter()
+    for _ in range(requests):
+        check_in = start + timedelta(days=rng.randrange(60))
+        check_out = check_in + timedelta(days=rng.randint(1, 4))
+        kind = 'write' if rng.random() < write_ratio else 'read'
+        request_started.send(sender=None)
+        started = time.perf_counter()
+        try:
+            if kind == 'write':
+                create_booking(user, rng.choice(rooms), check_in, check_out)
+            else:
+                Room.rooms.available_rooms(check_in, check_out).filter(pk__in=room_ids).count()
+            timings[kind].append(time.perf_counter() - started)
+        except BookingConflict:
+            conflicts += 1
+            timings[kind].append(time.perf_counter() - started)
+        except Exception as e:
+            errors[f'{type(e).__name__}: {e}'] += 1
+        finally:
+            request_finished.send(sender=None)
+    connections.close_all()
+    return timings, conflicts, errors
+
+
+def summary(timings, elapsed):
+    from bookings.metrics import percentile
+
+    timings = sorted(timings)
+    if not timings:
+        return {'requests': 0}
+    return {
+        'requests': len(timings),
+        'throughput_rps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+    }
+
+
+def run_profile(args):
+    """Замер в текущем процессе: окружение профиля уже задано"""
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection, connections
+
+    from bookings.models import Room
+
+    call_command('migrate', verbosity=0)
+    tag = uuid.uuid4().hex[:8]
+    rooms = [
+        Room.objects.create(room_number=f'dbbench-{tag}-{i}', room_type='Эконом', price_per_night=1000, max_occupancy=2)
+        for i in range(args.rooms)
+    ]
+    users = [User.objects.create_user(username=f'dbbench-{tag}-{i}') for i in range(args.processes)]
+    room_ids = [room.pk for room in rooms]
+    with connection.cursor() as cursor:
+        pragmas = {}
+        if connection.vendor == 'sqlite':
+            for name in settings.SQLITE_PRAGMAS:
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+    connections.close_all()
+
+    try:
+        tasks = [(room_ids, user.pk, args.requests, args.write_ratio, i) for i, user in enumerate(users)]
+        started = time.perf_counter()
+        with Pool(args.processes, initializer=setup_django) as pool:
+            results = pool.map(worker, tasks)
+        elapsed = time.perf_counter() - started
+    finally:
+        Room.objects.filter(pk__in=room_ids).delete()
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    errors = Counter()
+    for _, _, worker_errors in results:
+        errors.update(worker_errors)
+    return {
+        'database': connection.vendor,
+        'conn_max_age': settings.DATABASES['default']['CONN_MAX_AGE'],
+        'pool': bool(settings.DATABASES['default']['OPTIONS'].get('pool')),
+        'pragmas': pragmas,
+        'seconds': round(elapsed, 2),
+        'write': summary([t for timings, _, _ in results for t in timings['write']], elapsed),
+        'read': summary([t for timings, _, _ in results for t in timings['read']], elapsed),
+        'conflicts': sum(result[1] for result in results),
+        'errors': sum(errors.values()),
+        'error_samples': [error for error, _ in errors.most_common(5)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES), help='по умолчанию все')
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='запросов на процесс')
+    parser.add_argument('--write-ratio', type=float, default=0.5, help='доля запросов на запись')
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--output', help='файл JSON с результатами')
+    parser.add_argument('--run-profile', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        print(json.dumps(run_profile(args)))
+        return
+
+    options = [
+        '--processes', str(args.processes), '--requests', str(args.requests),
+        '--write-ratio', str(args.write_ratio), '--rooms', str(args.rooms),
+    ]
+    results = {}
+    for name in args.profile or PROFILES:
+        env = {**os.environ, **PROFILES[name], 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings'}
+        process = subprocess.run(
+            [sys.executable, __file__, '--run-profile', *options],
+            cwd=PROJECT_DIR, env=env, capture_output=True, text=True,
+        )
+        if process.returncode:
+            results[name] = {'error': process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'failed'}
+        else:
+            results[name] = json.loads(process.stdout.strip().splitlines()[-1])
+        result = results[name]
+        print(f"{name:22} write {result.get('write', {}).get('throughput_rps', '-'):>8} rps  "
+              f"read {result.get('read', {}).get('throughput_rps', '-'):>8} rps  "
+              f"errors {result.get('errors', result.get('error'))}", file=sys.stderr)
+
+    report = {'processes': args.processes, 'requests': args.requests, 'write_ratio': args.write_ratio,
+              'results': results}
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
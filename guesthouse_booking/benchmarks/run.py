@@ -0,0 +1,173 @@
+"""
+Микробенчмарки API и статистики бронирований.
+
+Запросы выполняются в том же процессе через APIClient DRF, без сети,
+против базы, заполненной benchmarks/seed.py. Для каждого сценария
+измеряются p50/p99/среднее время, пропускная способность и число
+SQL-запросов; результат пишется в JSON для сравнения между коммитами
+(benchmarks/compare.py).
+
+    python benchmarks/seed.py --scale small
+    python benchmarks/run.py --iterations 50 --output benchmarks/results/$(git rev-parse --short HEAD).json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import PROJECT_DIR, setup_django  # noqa: E402
+
+# Дата внутри периода, покрытого сгенерированными бронированиями
+BENCH_MONTH = (2024, 6)
+
+
+def force(value):
+    """Вычисляет ленивые QuerySet, чтобы замер включал выполнение SQL"""
+    from django.db.models import QuerySet
+    if isinstance(value, QuerySet):
+        return list(value)
+    return value
+
+
+def build_scenarios():
+    from django.db.models import Count
+    from rest_framework.test import APIClient
+
+    from bookings import pdf_utils
+    from bookings.models import Guest, Room
+
+    guest = Guest.objects.annotate(total=Count('user__bookings')).order_by('-total').select_related('user').first()
+    if guest is None:
+        raise SystemExit('База бенчмарков пуста: сначала выполните benchmarks/seed.py')
+    client = APIClient()
+    client.force_authenticate(guest.user)
+    year, month = BENCH_MONTH
+    check_in = date(year, month, 1).isoformat()
+    check_out = date(year, month, 5).isoformat()
+
+    def get(url, **params):
+        def call():
+            response = client.get(url, params)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url}: HTTP {response.status_code}')
+            return response
+        return call
+
+    # (имя, функция, множитель итераций)
+    return [
+        ('api_rooms_list', get('/api/rooms/'), 1),
+        ('api_rooms_available', get('/api/rooms/available/', check_in=check_in, check_out=check_out), 1),
+        ('api_rooms_quote', get('/api/rooms/quote/', check_in=check_in, check_out=check_out), 1),
+        ('api_bookings_my', get('/api/bookings/my/'), 1),
+        ('api_profile_me', get('/api/profile/me/'), 1),
+        ('room_statistics', lambda: force(Room.get_room_statistics()), 1),
+        ('popular_room_types', lambda: force(Room.get_popular_room_types()), 1),
+        ('monthly_statistics', lambda: force(Room.get_monthly_statistics(year, month)), 1),
+        ('guest_statistics', lambda: guest.get_statistics(), 1),
+        ('pdf_room_statistics', pdf_utils.generate_room_statistics_pdf_unicode, 0.2),
+        ('pdf_monthly_report', lambda: pdf_utils.generate_monthly_report_pdf(year, month), 0.2),
+        ('pdf_booking_report', pdf_utils.generate_booking_report_pdf, 0.2),
+        ('pdf_special_offers_report', pdf_utils.generate_special_offers_report_pdf, 0.2),
+    ]
+
+
+def measure(func, iterations, warmup):
+    from django.db import connection
+
+    from bookings.metrics import RequestMetrics, percentile
+
+    for _ in range(warmup):
+        func()
+    # Счетчик через execute_wrapper: журнал connection.queries очищается
+    # сигналом request_started при каждом запросе тестового клиента
+    queries = RequestMetrics()
+    with connection.execute_wrapper(queries):
+        func()
+    timings = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'queries': queries.queries,
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+        'throughput_rps': round(iterations / elapsed, 1),
+    }
+
+
+def environment():
+    import django
+    from django.db import connection
+
+    from bookings.models import Booking, Payment, Review, Room
+
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'revision': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'data': {
+            'rooms': Room.objects.count(),
+            'bookings': Booking.objects.count(),
+            'reviews': Review.objects.count(),
+            'payments': Payment.objects.count(),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', action='append', help='запустить только указанные сценарии')
+    parser.add_argument('--output', help='файл JSON с результатами')
+    args = parser.parse_args()
+
+    setup_django()
+    results = {}
+    for name, func, factor in build_scenarios():
+        if args.only and name not in args.only:
+            continue
+        iterations = max(1, round(args.iterations * factor))
+        try:
+            results[name] = measure(func, iterations, args.warmup)
+        except Exception as e:
+            # Сломанный сценарий не останавливает остальные замеры
+            results[name] = {'error': repr(e)}
+            print(f'{name:28} ошибка: {e!r}', file=sys.stderr)
+            continue
+        print(f"{name:28} p50 {results[name]['p50_ms']:>9} ms  p99 {results[name]['p99_ms']:>9} ms  "
+              f"{results[name]['queries']:>4} queries", file=sys.stderr)
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Заполняет базу бенчмарков реалистичными объемами данных.
+
+    python benchmarks/seed.py --scale medium
+
+Бронирования одной комнаты не пересекаются (как в рабочей базе после
+сервиса бронирования), отзывы уникальны для пары гость-комната,
+подтвержденные бронирования оплачены. Генерация детерминирована (--seed),
+поэтому результаты разных коммитов сравнимы. Календарь занятости и
+дневные сводки перестраиваются после массовой вставки.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import setup_django  # noqa: E402
+
+SCALES = {
+    'small': {'rooms': 200, 'users': 2000, 'bookings': 20000},
+    'medium': {'rooms': 2000, 'users': 20000, 'bookings': 200000},
+    'large': {'rooms': 5000, 'users': 50000, 'bookings': 500000},
+}
+
+ROOM_TYPES = ['Эконом', 'Стандарт', 'Комфорт', 'Люкс', 'Семейный']
+AMENITIES = ['Wi-Fi', 'Кондиционер', 'Мини-бар', 'Сейф', 'Балкон', 'Джакузи', 'Телевизор', 'Фен']
+COMMENTS = [
+    'Отличный номер, чисто и уютно',
+    'Тихо, удобная кровать, хороший завтрак',
+    'Персонал вежливый, но wifi работал плохо',
+    'Шумно ночью, окна выходят на дорогу',
+    'Прекрасный вид с балкона, вернемся снова',
+    'Номер меньше, чем на фото, но в целом неплохо',
+]
+START_DATE = date(2023, 1, 1)
+BATCH_SIZE = 5000
+
+
+def seed(rooms, users, bookings, rng):
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from django.utils import timezone
+
+    from bookings.availability import rebuild_calendar
+    from bookings.counters import reconcile_room_counters
+    from bookings.models import Amenity, Booking, Guest, Payment, Review, Room
+    from bookings.rollups import rebuild_daily_stats
+    from bookings.search import rebuild_review_index
+    from bookings.substring import rebuild_substring_index
+
+    counts = {}
+    with transaction.atomic():
+        amenity_objects = Amenity.objects.bulk_create([Amenity(name=name) for name in AMENITIES])
+        room_objects = Room.objects.bulk_create([
+            Room(
+                room_number=f'{i + 1:05d}',
+                room_type=rng.choice(ROOM_TYPES),
+                price_per_night=Decimal(rng.randrange(1500, 9900, 100)),
+                max_occupancy=rng.randint(1, 5),
+                is_available=rng.random() > 0.05,
+            )
+            for i in range(rooms)
+        ], batch_size=BATCH_SIZE)
+        Room.amenities.through.objects.bulk_create([
+            Room.amenities.through(room_id=room.pk, amenity_id=amenity.pk)
+            for room in room_objects
+            for amenity in rng.sample(amenity_objects, rng.randint(1, 5))
+        ], batch_size=BATCH_SIZE)
+        counts['rooms'] = len(room_objects)
+
+        # Хеш пароля один на всех: хеширование тысяч паролей заняло бы минуты
+        password = make_password('bench-password')
+        user_objects = User.objects.bulk_create([
+            User(username=f'bench{i}', email=f'bench{i}@example.com', password=password)
+            for i in range(users)
+        ], batch_size=BATCH_SIZE)
+        Guest.objects.bulk_create([
+            Guest(
+                user_id=user.pk, first_name=f'Гость{i}', last_name='Тестовый',
+                email=user.email, phone_number=f'+7900{i:07d}',
+            )
+            for i, user in enumerate(user_objects)
+        ], batch_size=BATCH_SIZE)
+        counts['users'] = len(user_objects)
+
+        # Бронирования одной комнаты идут подряд без пересечений
+        per_room = max(1, bookings // rooms)
+        now = timezone.now()
+        booking_objects = []
+        for room in room_objects:
+            day = START_DATE + timedelta(days=rng.randint(0, 10))
+            for _ in range(per_room):
+                nights = rng.randint(1, 7)
+                status = rng.choices(['confirmed', 'pending', 'cancelled'], weights=[70, 10, 20])[0]
+                booking_objects.append(Booking(
+                    guest_id=rng.choice(user_objects).pk, room_id=room.pk,
+                    check_in=day, check_out=day + timedelta(days=nights),
+                    status=status, guests_count=rng.randint(1, room.max_occupancy),
+                    created_at=now - timedelta(days=rng.randint(0, 900)),
+                ))
+                day += timedelta(days=nights + rng.randint(0, 3))
+        booking_objects = Booking.objects.bulk_create(booking_objects, batch_size=BATCH_SIZE)
+        counts['bookings'] = len(booking_objects)
+
+        prices = {room.pk: room.price_per_night for room in room_objects}
+        payments = []
+        for booking in booking_objects:
+            if booking.status != 'confirmed':
+                continue
+            amount = prices[booking.room_id] * (booking.check_out - booking.check_in).days
+            payments.append(Payment(
+                booking_id=booking.pk, amount=amount, status='completed',
+                payment_method=rng.choice(['card', 'cash', 'transfer']),
+                payment_date=booking.check_in,
+            ))
+        Payment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+        counts['payments'] = len(payments)
+
+        reviewed = set()
+        reviews = []
+        for booking in rng.sample(booking_objects, len(booking_objects) // 3):
+            if booking.status != 'confirmed' or (booking.guest_id, booking.room_id) in reviewed:
+                continue
+            reviewed.add((booking.guest_id, booking.room_id))
+            reviews.append(Review(
+                room_id=booking.room_id, guest_id=booking.guest_id,
+                rating=rng.choices([1, 2, 3, 4, 5], weights=[5, 5, 15, 35, 40])[0],
+                comment=rng.choice(COMMENTS),
+                review_date=timezone.make_aware(
+                    timezone.datetime.combine(booking.check_out, timezone.datetime.min.time())
+                ),
+            ))
+        Review.objects.bulk_create(reviews, batch_size=BATCH_SIZE)
+        counts['reviews'] = len(reviews)
+
+    counts['room_nights'] = rebuild_calendar()
+    counts['daily_stats'] = rebuild_daily_stats()
+    counts['room_counters'] = len(reconcile_room_counters())
+    counts['search_index'] = rebuild_review_index()
+    counts['substring_index'] = rebuild_substring_index([Room, Amenity, Guest])
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--rooms', type=int)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--bookings', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', action='store_true', help='не очищать базу перед заполнением')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    if not args.keep:
+        call_command('flush', interactive=False, verbosity=0)
+
+    volumes = {key: getattr(args, key) or value for key, value in SCALES[args.scale].items()}
+    started = time.perf_counter()
+    counts = seed(rng=random.Random(args.seed), **volumes)
+    counts['seconds'] = round(time.perf_counter() - started, 1)
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Пропускная способность чтения под конкурентной нагрузкой: gunicorn (WSGI)
+против uvicorn (ASGI).
+
+Скрипт поднимает сервер на базе бенчмарков (benchmarks/settings.py),
+дожидается готовности и в течение --duration секунд держит --concurrency
+одновременных клиентов с keep-alive соединениями. Конфигурации:
+
+- wsgi: gunicorn, синхронные представления DRF (/api/rooms/ ...);
+- asgi: uvicorn, асинхронные представления (/api/async/rooms/ ...);
+- asgi-sync: uvicorn, синхронные представления - отделяет вклад сервера
+  от вклада асинхронных представлений.
+
+    python benchmarks/seed.py --scale small
+    python benchmarks/server_throughput.py --workers 2 --concurrency 1 --concurrency 16 --concurrency 64 \\
+        --output benchmarks/results/servers.json
+
+Сервер, который не установлен (pip install gunicorn uvicorn), пропускается
+с ошибкой в результате.
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import PROJECT_DIR, setup_django  # noqa: E402
+from benchmarks.run import BENCH_MONTH, environment  # noqa: E402
+
+HOST = '127.0.0.1'
+READY_TIMEOUT = 30
+
+SERVERS = {
+    'wsgi': ('gunicorn', False),
+    'asgi': ('uvicorn', True),
+    'asgi-sync': ('uvicorn', False),
+}
+
+
+def server_command(server, workers, port):
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', 'guesthouse_booking.wsgi:application',
+                '--workers', str(workers), '--bind', f'{HOST}:{port}', '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'guesthouse_booking.asgi:application',
+            '--workers', str(workers), '--host', HOST, '--port', str(port), '--log-level', 'warning']
+
+
+def build_scenarios(use_async):
+    from bookings.models import Room
+
+    room = Room.objects.order_by('pk').first()
+    if room is None:
+        raise SystemExit('База бенчмарков пуста: сначала выполните benchmarks/seed.py')
+    year, month = BENCH_MONTH
+    prefix = '/api/async/' if use_async else '/api/'
+    return {
+        'rooms_list': f'{prefix}rooms/',
+        'rooms_available': f'{prefix}rooms/available/?check_in={year}-{month:02d}-01&check_out={year}-{month:02d}-05',
+        'room_detail': f'{prefix}rooms/{room.pk}/',
+        'reviews_list': f'{prefix}reviews/',
+    }
+
+
+def wait_ready(port, process):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'сервер завершился с кодом {process.returncode}')
+        try:
+            connection = http.client.HTTPConnection(HOST, port, timeout=2)
+            connection.request('GET', '/api/rooms/')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('сервер не ответил за отведённое время')
+
+
+def load(port, path, concurrency, duration):
+    """Клиенты в потоках с keep-alive: время каждого запроса и число ошибок"""
+    from bookings.metrics import percentile
+
+    timings, errors = [], []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        connection = http.client.HTTPConnection(HOST, port, timeout=30)
+        local_timings, local_errors = [], 0
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection(HOST, port, timeout=30)
+                continue
+            local_timings.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            timings.extend(local_timings)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    if not timings:
+        return {'requests': 0, 'errors': sum(errors)}
+    return {
+        'requests': len(timings),
+        'errors': sum(errors),
+        'throughput_rps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+    }
+
+
+def run_server(name, args, port):
+    server, use_async = SERVERS[name]
+    if importlib.util.find_spec(server) is None:
+        return {'error': f'{server} не установлен'}
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings'}
+    process = subprocess.Popen(server_command(server, args.workers, port), cwd=PROJECT_DIR, env=env)
+    results = {}
+    try:
+        wait_ready(port, process)
+        for scenario, path in build_scenarios(use_async).items():
+            if args.only and scenario not in args.only:
+                continue
+            results[scenario] = {}
+            for concurrency in args.concurrency:
+                load(port, path, concurrency, args.warmup)
+                result = load(port, path, concurrency, args.duration)
+                results[scenario][concurrency] = result
+                print(f"{name:10} {scenario:16} c={concurrency:<4} {result.get('throughput_rps', 0):>9} rps  "
+                      f"p50 {result.get('p50_ms', '-'):>8} ms  p99 {result.get('p99_ms', '-'):>8} ms  "
+                      f"errors {result['errors']}", file=sys.stderr)
+    except RuntimeError as e:
+        results = {'error': str(e)}
+        print(f'{name}: {e}', file=sys.stderr)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', action='append', choices=sorted(SERVERS), help='по умолчанию все')
+    parser.add_argument('--only', action='append', help='запустить только указанные сценарии')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, action='append', help='по умолчанию 1, 16 и 64')
+    parser.add_argument('--duration', type=float, default=5, help='секунд на замер')
+    parser.add_argument('--warmup', type=float, default=1, help='секунд прогрева')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='файл JSON с результатами')
+    args = parser.parse_args()
+    args.concurrency = args.concurrency or [1, 16, 64]
+
+    setup_django()
+    report = {
+        'environment': {**environment(), 'workers': args.workers, 'duration': args.duration},
+        'results': {name: run_server(name, args, args.port) for name in args.server or SERVERS},
+    }
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+Настройки для бенчмарков: те же, что у проекта, но с отдельной базой,
+чтобы сгенерированные объемы данных не попадали в рабочую БД.
+
+    DJANGO_SETTINGS_MODULE=benchmarks.settings
+    BENCH_DB=/path/to/bench.sqlite3   (по умолчанию benchmarks/bench.sqlite3)
+
+С DB_ENGINE=postgresql BENCH_DB - имя базы (по умолчанию guesthouse_bench).
+"""
+import os
+
+from guesthouse_booking.settings import *  # noqa: F401,F403
+from guesthouse_booking.settings import BASE_DIR, DATABASES, DB_ENGINE
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'NAME': os.environ.get(
+            'BENCH_DB',
+            'guesthouse_bench' if DB_ENGINE == 'postgresql' else str(BASE_DIR / 'benchmarks' / 'bench.sqlite3'),
+        ),
+    }
+}
+
+# Предупреждения о порогах не нужны в выводе бенчмарка
+METRICS_QUERY_THRESHOLD = 10 ** 9
+METRICS_DUPLICATE_QUERY_THRESHOLD = 10 ** 9
+METRICS_SLOW_REQUEST_MS = 10 ** 9
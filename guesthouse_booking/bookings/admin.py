@@ -1,21 +1,23 @@
 # bookings/admin.py
 
 from django.contrib import admin
-from django.http import HttpResponse
+from django.contrib.admin.views.main import ChangeList
+from django.http import HttpResponse, FileResponse, Http404
 from django.utils import timezone
 from django.contrib import messages
-from django.shortcuts import redirect
+from django.shortcuts import redirect, get_object_or_404
+from django.template.response import TemplateResponse
 from django.urls import path
 from django.db import models
-from .models import Guest, Room, Booking, Payment, Review, Amenity, SliderImage, SpecialOffer, UserRole, RoomSpecialOffer, Document
-from .pdf_utils import (
-    generate_room_statistics_pdf_unicode, 
-    generate_room_statistics_html_pdf,
-    generate_room_statistics_pdf_translit,
-    generate_monthly_report_pdf, 
-    generate_booking_report_pdf,
-    generate_special_offers_report_pdf
-)
+from django.db.models.functions import Coalesce
+from django.utils.text import smart_split, unescape_string_literal
+import os
+from .models import Guest, Room, Booking, Payment, Review, Amenity, SliderImage, SpecialOffer, UserRole, RoomSpecialOffer, Document, ReportJob, RoomRate
+from .file_metadata import SIZE_RANGES, filter_by_size
+from .reports import enqueue_report
+from .pricing import booking_totals
+from .rollups import get_dashboard_totals
+from .substring import search_q
 
 # Модель-заглушка для дашборда
 class Dashboard(models.Model):
@@ -27,6 +29,35 @@ class Dashboard(models.Model):
     def __str__(self):
         return 'Дашборд гостиницы'
 
+class SubstringSearchMixin:
+    """Поиск в списке по триграммному индексу полей (bookings.substring)"""
+
+    def get_search_results(self, request, queryset, search_term):
+        terms = [
+            unescape_string_literal(bit) if bit[0] in '"\'' and bit[-1] == bit[0] else bit
+            for bit in smart_split(search_term)
+        ]
+        if not terms:
+            return queryset, False
+        return queryset.filter(search_q(self.model, self.get_search_fields(request), terms)), False
+
+def enqueue_report_and_redirect(request, kind, params=None):
+    """Ставит PDF-отчет в очередь и открывает страницу задания"""
+    try:
+        job = enqueue_report(kind, params, user=request.user)
+    except Exception as e:
+        messages.error(request, f"Ошибка при постановке отчета в очередь: {str(e)}")
+        return redirect('admin:index')
+    if job.status == ReportJob.STATUS_DONE:
+        messages.success(request, f"{job.get_kind_display()}: отчет готов")
+    else:
+        messages.info(request, f"{job.get_kind_display()}: отчет поставлен в очередь")
+    return redirect('admin:report-job', pk=job.pk)
+
+def current_month_params():
+    current_date = timezone.now()
+    return {'year': current_date.year, 'month': current_date.month}
+
 class AmenityInline(admin.TabularInline):
     """Инлайн для удобств в админке комнаты."""
     model = Room.amenities.through  
@@ -50,10 +81,11 @@ class UserRoleAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
 
 @admin.register(Guest)
-class GuestAdmin(admin.ModelAdmin):
+class GuestAdmin(SubstringSearchMixin, admin.ModelAdmin):
     list_display = ('first_name', 'last_name', 'email', 'phone_number', 'role', 'has_documents_display')
     search_fields = ('first_name', 'last_name', 'email')
     list_filter = ('role', 'first_name', 'last_name')
+    list_select_related = ('role',)
     raw_id_fields = ('user', 'role')
     
     # Поля для редактирования
@@ -73,8 +105,8 @@ class GuestAdmin(admin.ModelAdmin):
     has_documents_display.boolean = True
 
 @admin.register(Room)
-class RoomAdmin(admin.ModelAdmin):
-    list_display = ('room_number', 'room_type', 'price_per_night', 'max_occupancy', 'has_active_offers_display', 'has_photo_display')
+class RoomAdmin(SubstringSearchMixin, admin.ModelAdmin):
+    list_display = ('room_number', 'room_type', 'price_per_night', 'current_price_display', 'max_occupancy', 'has_active_offers_display', 'has_photo_display')
     list_filter = ('room_type', 'is_available')
     search_fields = ('room_number', 'room_type')
     inlines = [AmenityInline, RoomSpecialOfferInline]
@@ -91,12 +123,23 @@ class RoomAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Цена на сегодня из календаря цен - подзапрос по индексу, а не запросы на строку
+        today_rate = RoomRate.objects.filter(room=models.OuterRef('pk'), date=timezone.now().date())
+        return super().get_queryset(request).annotate(
+            current_price=Coalesce(
+                models.Subquery(today_rate.values('price')[:1]), models.F('price_per_night')
+            ),
+            has_active_offer=models.Exists(today_rate),
+        )
+
+    @admin.display(description='Цена сегодня', ordering='current_price')
+    def current_price_display(self, obj):
+        return obj.current_price
+
     @admin.display(description='Активные предложения')
     def has_active_offers_display(self, obj):
-        try:
-            return obj.has_active_special_offers()
-        except:
-            return False
+        return obj.has_active_offer
     has_active_offers_display.boolean = True
 
     @admin.display(description='Есть фото')
@@ -112,44 +155,25 @@ class RoomAdmin(admin.ModelAdmin):
             return ""
 
     def generate_room_statistics_pdf(self, request, queryset):
-        """Генерирует PDF отчет со статистикой комнат"""
-        try:
-            # Пробуем разные методы генерации PDF
-            try:
-                # Сначала пробуем Unicode версию
-                response = generate_room_statistics_pdf_unicode()
-                messages.success(request, "PDF отчет со статистикой комнат успешно сгенерирован (Unicode)")
-            except:
-                try:
-                    # Затем пробуем HTML версию
-                    response = generate_room_statistics_html_pdf()
-                    messages.success(request, "PDF отчет со статистикой комнат успешно сгенерирован (HTML)")
-                except:
-                    # В крайнем случае используем транслитерированную версию
-                    response = generate_room_statistics_pdf_translit()
-                    messages.success(request, "PDF отчет со статистикой комнат успешно сгенерирован (транслитерация)")
-            
-            return response
-        except Exception as e:
-            messages.error(request, f"Ошибка при генерации PDF: {str(e)}")
-            return redirect('.')
+        """Ставит в очередь PDF отчет со статистикой комнат"""
+        return enqueue_report_and_redirect(request, 'room_statistics')
     generate_room_statistics_pdf.short_description = "Сгенерировать PDF отчет со статистикой комнат"
 
     def generate_monthly_report_pdf(self, request, queryset):
-        """Генерирует месячный PDF отчет"""
-        try:
-            current_date = timezone.now()
-            response = generate_monthly_report_pdf(current_date.year, current_date.month)
-            messages.success(request, f"Месячный PDF отчет за {current_date.strftime('%B %Y')} успешно сгенерирован")
-            return response
-        except Exception as e:
-            messages.error(request, f"Ошибка при генерации PDF: {str(e)}")
-            return redirect('.')
+        """Ставит в очередь месячный PDF отчет"""
+        return enqueue_report_and_redirect(request, 'monthly_report', current_month_params())
     generate_monthly_report_pdf.short_description = "Сгенерировать месячный PDF отчет"
 
+class BookingChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # Стоимость всех бронирований страницы - один запрос к календарю цен
+        booking_totals(self.result_list)
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('guest', 'room', 'check_in', 'check_out', 'total_price', 'status', 'has_documents_display')
+    list_select_related = ('guest', 'room')
     list_filter = ('status', 'check_in', 'check_out')
     date_hierarchy = 'check_in'
     raw_id_fields = ('guest', 'room')
@@ -172,20 +196,18 @@ class BookingAdmin(admin.ModelAdmin):
         return bool(obj.contract or obj.receipt or obj.additional_files)
     has_documents_display.boolean = True
 
+    def get_changelist(self, request, **kwargs):
+        return BookingChangeList
+
     def generate_booking_report_pdf(self, request, queryset):
-        """Генерирует PDF отчет по бронированиям"""
-        try:
-            response = generate_booking_report_pdf()
-            messages.success(request, "PDF отчет по бронированиям успешно сгенерирован")
-            return response
-        except Exception as e:
-            messages.error(request, f"Ошибка при генерации PDF: {str(e)}")
-            return redirect('.')
+        """Ставит в очередь PDF отчет по бронированиям"""
+        return enqueue_report_and_redirect(request, 'booking_report')
     generate_booking_report_pdf.short_description = "Сгенерировать PDF отчет по бронированиям"
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('booking', 'amount', 'payment_date', 'payment_method', 'status', 'has_documents_display')
+    list_select_related = ('booking__guest', 'booking__room')
     list_filter = ('payment_date', 'payment_method', 'status')
     date_hierarchy = 'payment_date'
     search_fields = ('booking__guest__first_name', 'booking__guest__last_name')
@@ -209,21 +231,23 @@ class PaymentAdmin(admin.ModelAdmin):
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('room', 'guest', 'rating', 'review_date')
+    list_select_related = ('room', 'guest')
     list_filter = ('rating', 'review_date')
     search_fields = ('guest__first_name', 'guest__last_name', 'room__room_number')
 
 @admin.register(Amenity)
-class AmenityAdmin(admin.ModelAdmin):
+class AmenityAdmin(SubstringSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'rooms_count')
     search_fields = ('name',)
 
-    @admin.display(description='Количество комнат')
+    def get_queryset(self, request):
+        # Число комнат - агрегат в запросе списка, а не COUNT на строку
+        return super().get_queryset(request).annotate(rooms_total=models.Count('rooms'))
+
+    @admin.display(description='Количество комнат', ordering='rooms_total')
     def rooms_count(self, obj: Amenity) -> int:
         """Возвращает количество комнат для удобства."""
-        try:
-            return obj.rooms.count()
-        except Exception:
-            return 0
+        return obj.rooms_total
 
 @admin.register(SliderImage)
 class SliderImageAdmin(admin.ModelAdmin):
@@ -241,29 +265,29 @@ class SpecialOfferAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     actions = ['generate_special_offers_report_pdf']
 
-    @admin.display(description='Всего применений')
+    def get_queryset(self, request):
+        # Оба счетчика - за один проход по применениям в запросе списка
+        today = timezone.now().date()
+        return super().get_queryset(request).annotate(
+            applications_total=models.Count('room_special_offers'),
+            active_applications_total=models.Count('room_special_offers', filter=models.Q(
+                room_special_offers__is_active=True,
+                room_special_offers__start_date__lte=today,
+                room_special_offers__end_date__gte=today,
+            )),
+        )
+
+    @admin.display(description='Всего применений', ordering='applications_total')
     def applications_count(self, obj):
-        try:
-            return obj.get_total_applications_count()
-        except:
-            return 0
+        return obj.applications_total
 
-    @admin.display(description='Активных применений')
+    @admin.display(description='Активных применений', ordering='active_applications_total')
     def active_applications_count(self, obj):
-        try:
-            return obj.get_active_applications_count()
-        except:
-            return 0
+        return obj.active_applications_total
 
     def generate_special_offers_report_pdf(self, request, queryset):
-        """Генерирует PDF отчет по специальным предложениям"""
-        try:
-            response = generate_special_offers_report_pdf()
-            messages.success(request, "PDF отчет по специальным предложениям успешно сгенерирован")
-            return response
-        except Exception as e:
-            messages.error(request, f"Ошибка при генерации PDF: {str(e)}")
-            return redirect('.')
+        """Ставит в очередь PDF отчет по специальным предложениям"""
+        return enqueue_report_and_redirect(request, 'special_offers_report')
     generate_special_offers_report_pdf.short_description = "Сгенерировать PDF отчет по специальным предложениям"
 
 @admin.register(RoomSpecialOffer)
@@ -271,6 +295,7 @@ class RoomSpecialOfferAdmin(admin.ModelAdmin):
     list_display = ('room', 'special_offer', 'start_date', 'end_date', 'discount_percentage', 'is_active', 'is_currently_active')
     list_filter = ('is_active', 'start_date', 'end_date', 'discount_percentage')
     search_fields = ('room__room_number', 'special_offer__title')
+    list_select_related = ('room', 'special_offer')
     date_hierarchy = 'start_date'
     raw_id_fields = ('room', 'special_offer')
 
@@ -282,13 +307,31 @@ class RoomSpecialOfferAdmin(admin.ModelAdmin):
             return False
     is_currently_active.boolean = True
 
+class FileSizeFilter(admin.SimpleListFilter):
+    title = 'Размер файла'
+    parameter_name = 'size'
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _, _) in SIZE_RANGES.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() in SIZE_RANGES:
+            return filter_by_size(queryset, self.value())
+        return queryset
+
+
 @admin.register(Document)
-class DocumentAdmin(admin.ModelAdmin):
-    list_display = ('title', 'file_type', 'uploaded_by', 'uploaded_at', 'is_public', 'file_size_display', 'related_object')
-    list_filter = ('file_type', 'is_public', 'uploaded_at')
+class DocumentAdmin(SubstringSearchMixin, admin.ModelAdmin):
+    list_display = ('title', 'file_type', 'uploaded_by', 'uploaded_at', 'is_public', 'file_size_display', 'mime_type', 'related_object')
+    list_filter = ('file_type', 'is_public', 'uploaded_at', FileSizeFilter, 'mime_type')
+    # Для бронирования и платежа хватает id из самой строки документа
+    list_select_related = ('uploaded_by', 'room', 'guest')
     search_fields = ('title', 'description')
     date_hierarchy = 'uploaded_at'
-    readonly_fields = ('uploaded_at', 'updated_at', 'file_size_display')
+    readonly_fields = (
+        'uploaded_at', 'updated_at', 'file_size_display', 'mime_type', 'page_count',
+        'image_width', 'image_height', 'checksum',
+    )
     
     # Поля для редактирования
     fieldsets = (
@@ -300,25 +343,28 @@ class DocumentAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Метаданные', {
-            'fields': ('uploaded_by', 'uploaded_at', 'updated_at', 'file_size_display'),
+            'fields': (
+                'uploaded_by', 'uploaded_at', 'updated_at', 'file_size_display', 'mime_type',
+                'page_count', ('image_width', 'image_height'), 'checksum',
+            ),
             'classes': ('collapse',)
         }),
     )
 
-    @admin.display(description='Размер файла')
+    @admin.display(description='Размер файла', ordering='file_size')
     def file_size_display(self, obj):
         return obj.get_file_size_display()
     
     @admin.display(description='Связанный объект')
     def related_object(self, obj):
-        if obj.room:
+        if obj.room_id:
             return f"Комната: {obj.room.room_number}"
-        elif obj.guest:
+        elif obj.guest_id:
             return f"Гость: {obj.guest.first_name} {obj.guest.last_name}"
-        elif obj.booking:
-            return f"Бронирование: {obj.booking.id}"
-        elif obj.payment:
-            return f"Платёж: {obj.payment.id}"
+        elif obj.booking_id:
+            return f"Бронирование: {obj.booking_id}"
+        elif obj.payment_id:
+            return f"Платёж: {obj.payment_id}"
         return "Не указан"
 
 # Кастомная админка для дашборда с PDF отчетами
@@ -326,62 +372,58 @@ class DocumentAdmin(admin.ModelAdmin):
 class DashboardAdmin(admin.ModelAdmin):
     change_list_template = 'admin/dashboard_change_list.html'
 
+    def changelist_view(self, request, extra_context=None):
+        # Итоги берутся из дневных сводок, а не из соединений бронирований
+        extra_context = {**get_dashboard_totals(), **(extra_context or {})}
+        return super().changelist_view(request, extra_context)
+
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
-            path('generate-room-stats-pdf/', self.generate_room_stats_pdf, name='generate-room-stats-pdf'),
-            path('generate-monthly-report-pdf/', self.generate_monthly_report_pdf, name='generate-monthly-report-pdf'),
-            path('generate-booking-report-pdf/', self.generate_booking_report_pdf, name='generate-booking-report-pdf'),
-            path('generate-special-offers-report-pdf/', self.generate_special_offers_report_pdf, name='generate-special-offers-report-pdf'),
+            path('generate-room-stats-pdf/', self.admin_site.admin_view(self.generate_room_stats_pdf), name='generate-room-stats-pdf'),
+            path('generate-monthly-report-pdf/', self.admin_site.admin_view(self.generate_monthly_report_pdf), name='generate-monthly-report-pdf'),
+            path('generate-booking-report-pdf/', self.admin_site.admin_view(self.generate_booking_report_pdf), name='generate-booking-report-pdf'),
+            path('generate-special-offers-report-pdf/', self.admin_site.admin_view(self.generate_special_offers_report_pdf), name='generate-special-offers-report-pdf'),
+            path('report-jobs/<int:pk>/', self.admin_site.admin_view(self.report_job_view), name='report-job'),
+            path('report-jobs/<int:pk>/download/', self.admin_site.admin_view(self.report_job_download), name='report-job-download'),
         ]
         return custom_urls + urls
 
     def generate_room_stats_pdf(self, request):
-        try:
-            # Пробуем разные методы генерации PDF
-            try:
-                # Сначала пробуем Unicode версию
-                response = generate_room_statistics_pdf_unicode()
-                messages.success(request, "PDF отчет со статистикой комнат успешно сгенерирован (Unicode)")
-            except:
-                try:
-                    # Затем пробуем HTML версию
-                    response = generate_room_statistics_html_pdf()
-                    messages.success(request, "PDF отчет со статистикой комнат успешно сгенерирован (HTML)")
-                except:
-                    # В крайнем случае используем транслитерированную версию
-                    response = generate_room_statistics_pdf_translit()
-                    messages.success(request, "PDF отчет со статистикой комнат успешно сгенерирован (транслитерация)")
-            
-            return response
-        except Exception as e:
-            messages.error(request, f"Ошибка при генерации PDF: {str(e)}")
-            return redirect('admin:index')
+        return enqueue_report_and_redirect(request, 'room_statistics')
 
     def generate_monthly_report_pdf(self, request):
-        try:
-            current_date = timezone.now()
-            response = generate_monthly_report_pdf(current_date.year, current_date.month)
-            messages.success(request, f"Месячный PDF отчет за {current_date.strftime('%B %Y')} успешно сгенерирован")
-            return response
-        except Exception as e:
-            messages.error(request, f"Ошибка при генерации PDF: {str(e)}")
-            return redirect('admin:index')
+        return enqueue_report_and_redirect(request, 'monthly_report', current_month_params())
 
     def generate_booking_report_pdf(self, request):
-        try:
-            response = generate_booking_report_pdf()
-            messages.success(request, "PDF отчет по бронированиям успешно сгенерирован")
-            return response
-        except Exception as e:
-            messages.error(request, f"Ошибка при генерации PDF: {str(e)}")
-            return redirect('admin:index')
+        return enqueue_report_and_redirect(request, 'booking_report')
 
     def generate_special_offers_report_pdf(self, request):
-        try:
-            response = generate_special_offers_report_pdf()
-            messages.success(request, "PDF отчет по специальным предложениям успешно сгенерирован")
-            return response
-        except Exception as e:
-            messages.error(request, f"Ошибка при генерации PDF: {str(e)}")
-            return redirect('admin:index')
+        return enqueue_report_and_redirect(request, 'special_offers_report')
+
+    def report_job_view(self, request, pk):
+        """Страница задания: обновляется, пока отчет не готов"""
+        job = get_object_or_404(ReportJob, pk=pk)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': str(job),
+            'job': job,
+        }
+        return TemplateResponse(request, 'admin/report_job.html', context)
+
+    def report_job_download(self, request, pk):
+        job = get_object_or_404(ReportJob, pk=pk, status=ReportJob.STATUS_DONE)
+        if not job.file:
+            raise Http404('Файл отчета не найден')
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=os.path.basename(job.file.name),
+            content_type='application/pdf'
+        )
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'is_stale', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status', 'is_stale')
+    readonly_fields = ('kind', 'params', 'key', 'status', 'file', 'error', 'is_stale', 'requested_by', 'created_at', 'started_at', 'finished_at')
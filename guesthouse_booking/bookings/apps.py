@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class BookingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookings'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .metrics import instrument_serializers, setting
+        from .substring import repair_fts5_triggers
+
+        post_migrate.connect(repair_fts5_triggers, sender=self)
+
+        if setting('METRICS_ENABLED'):
+            instrument_serializers()
@@ -0,0 +1,177 @@
+# bookings/async_views.py
+"""
+Асинхронные (ASGI) представления для горячих запросов чтения: список и
+карточка комнаты, поиск свободных комнат, лента отзывов.
+
+Ответы совпадают с соответствующими действиями RoomViewSet и
+ReviewViewSet: фильтры, поиск, сортировка, пагинация и сериализаторы
+берутся оттуда же. Отличие - в выполнении: пока запросы ждут базу, цикл
+событий обслуживает другие запросы вместо блокировки рабочего потока.
+Сами запросы одного ответа (страница, COUNT(*), данные для сериализации
+комнат) параллельно не выполняются: асинхронный ORM Django передаёт их
+по очереди в один общий поток для синхронного кода. asyncio.gather лишь
+ставит их в эту очередь сразу, без ожидания между ними.
+
+Под WSGI представления тоже работают (Django выполняет их через
+async_to_sync), но выигрыш дает только запуск под ASGI-сервером:
+
+    uvicorn guesthouse_booking.asgi:application --workers 4
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db.models import aprefetch_related_objects
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .availability import parse_stay
+from .images import image_variants
+from .models import Room
+from .pagination import InvalidCursor, keyset_page
+from .pricing import current_rates
+from .serializers import (
+    RoomSerializer, amenity_counts_queryset, current_bookings_queryset,
+    review_stats_queryset, room_review_stats,
+)
+from .views import ReviewViewSet, RoomViewSet
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    """JSON в том же виде, что и Response DRF"""
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def not_found(detail=None):
+    return json_response({'detail': str(detail or NotFound.default_detail)}, status.HTTP_404_NOT_FOUND)
+
+
+def make_view(viewset_class, request, action, **kwargs):
+    """Экземпляр вьюсета для его фильтров, контекста и пагинатора"""
+    return viewset_class(request=Request(request), format_kwarg=None, action=action, args=(), kwargs=kwargs)
+
+
+async def filter_queryset(view, queryset):
+    # Проверка параметров фильтров (ModelChoiceFilter) может обращаться к базе
+    return await sync_to_async(view.filter_queryset)(queryset)
+
+
+async def room_bulk(rooms, min_rating=0, request=None):
+    """Данные RoomListSerializer для страницы комнат (запросы идут в общий поток по очереди)"""
+    room_ids = [room.id for room in rooms]
+    today = timezone.now().date()
+
+    async def reviews():
+        if not float(min_rating):
+            return room_review_stats(rooms)
+        return {row['room_id']: row async for row in review_stats_queryset(room_ids, min_rating)}
+
+    async def current_bookings():
+        result = {}
+        async for booking in current_bookings_queryset(room_ids, today):
+            result.setdefault(booking.room_id, booking)
+        return result
+
+    async def amenities():
+        await aprefetch_related_objects(rooms, 'amenities')
+        amenity_ids = {amenity.id for room in rooms for amenity in room.amenities.all()}
+        return {row['amenity_id']: row async for row in amenity_counts_queryset(amenity_ids)}
+
+    reviews, bookings, amenity_counts, rates, images = await asyncio.gather(
+        reviews(), current_bookings(), amenities(), sync_to_async(current_rates)(rooms, today),
+        sync_to_async(image_variants)([room.photo.name for room in rooms], request),
+    )
+    return {
+        'reviews': reviews, 'current_bookings': bookings, 'amenities': amenity_counts, 'rates': rates,
+        'images': images,
+    }
+
+
+async def serialize_rooms(view, rooms):
+    context = view.get_serializer_context()
+    context['room_bulk'] = await room_bulk(rooms, context.get('min_rating', 0), context.get('request'))
+    # Все данные уже загружены: сериализация не обращается к базе
+    return RoomSerializer(rooms, many=True, context=context).data
+
+
+async def page_number_response(view, queryset):
+    """Страница PageNumberPagination теми же правилами, что у DRF (page=last, ошибки)"""
+    pagination = view.paginator
+    try:
+        items = await sync_to_async(pagination.paginate_queryset)(queryset, view.request, view)
+    except NotFound as e:
+        return not_found(e.detail)
+    data = await serialize_rooms(view, items)
+    return json_response(pagination.get_paginated_response(data).data)
+
+
+@require_GET
+async def room_list(request):
+    """GET /api/async/rooms/ - как RoomViewSet.list"""
+    view = make_view(RoomViewSet, request, 'list')
+    queryset = await filter_queryset(view, view.get_queryset())
+    return await page_number_response(view, queryset)
+
+
+@require_GET
+async def room_detail(request, pk):
+    """GET /api/async/rooms/<pk>/ - как RoomViewSet.retrieve"""
+    view = make_view(RoomViewSet, request, 'retrieve', pk=pk)
+    queryset = await filter_queryset(view, view.get_queryset())
+    try:
+        room = await queryset.aget(pk=pk)
+    except Room.DoesNotExist:
+        # Текст как у get_object_or_404 в RoomViewSet.retrieve
+        return not_found(f'No {Room._meta.object_name} matches the given query.')
+    data = await serialize_rooms(view, [room])
+    return json_response(data[0])
+
+
+@require_GET
+async def available_rooms(request):
+    """GET /api/async/rooms/available/ - как RoomViewSet.available"""
+    view = make_view(RoomViewSet, request, 'available')
+    check_in = request.GET.get('check_in')
+    check_out = request.GET.get('check_out')
+    if check_in and check_out:
+        try:
+            check_in, check_out = parse_stay(check_in, check_out)
+        except ValueError:
+            return json_response({'error': 'Неверный формат даты'}, status.HTTP_400_BAD_REQUEST)
+        rooms = Room.rooms.available_rooms(check_in, check_out)
+    else:
+        rooms = Room.rooms.filter(is_available=True)
+    return await page_number_response(view, rooms)
+
+
+@require_GET
+async def review_list(request):
+    """GET /api/async/reviews/ - как ReviewViewSet.list (курсорная пагинация)"""
+    view = make_view(ReviewViewSet, request, 'list')
+    queryset = await filter_queryset(view, view.get_queryset())
+    pagination = view.paginator
+    params = view.request.query_params
+    page_size = pagination.get_page_size(view.request)
+    wants_count = params.get(pagination.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    async def count():
+        return await queryset.acount() if wants_count else None
+
+    try:
+        page, total = await asyncio.gather(
+            sync_to_async(keyset_page)(queryset, params.get(pagination.cursor_query_param), page_size),
+            count(),
+        )
+    except InvalidCursor as e:
+        return not_found(e)
+    pagination.request = view.request
+    pagination.page = page
+    pagination.count = total
+    serializer = view.get_serializer(list(page), many=True)
+    # Методы ReviewSerializer могут читать связанные объекты - в потоке
+    data = await sync_to_async(lambda: serializer.data)()
+    return json_response(pagination.get_paginated_response(data).data)
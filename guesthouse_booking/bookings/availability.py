@@ -0,0 +1,110 @@
+# bookings/availability.py
+"""
+Движок доступности комнат.
+
+Занятость хранится в календаре ночей (RoomNight): бронирование
+[check_in, check_out) занимает ночи с check_in по check_out - 1 день.
+Два бронирования пересекаются, только если у них есть общая ночь,
+поэтому выезд в день заезда следующего гостя конфликтом не считается.
+"""
+from datetime import datetime, timedelta
+
+from .models import Booking, Room, RoomNight, RoomRate
+
+
+def to_date(value):
+    """Приводит значение (строку или дату) к datetime.date"""
+    return Booking._meta.get_field('check_in').to_python(value)
+
+
+def stay_nights(check_in, check_out):
+    """Возвращает список ночей проживания [check_in, check_out)"""
+    check_in, check_out = to_date(check_in), to_date(check_out)
+    return [check_in + timedelta(days=i) for i in range((check_out - check_in).days)]
+
+
+def parse_stay(check_in, check_out):
+    """Разбирает даты формата YYYY-MM-DD и проверяет, что выезд позже заезда"""
+    check_in = datetime.strptime(check_in, '%Y-%m-%d').date()
+    check_out = datetime.strptime(check_out, '%Y-%m-%d').date()
+    if check_out <= check_in:
+        raise ValueError('Дата выезда должна быть позже даты заезда')
+    return check_in, check_out
+
+
+def occupied_nights(check_in, check_out):
+    """Занятые ночи всех комнат в интервале [check_in, check_out)"""
+    return RoomNight.objects.filter(date__gte=check_in, date__lt=check_out)
+
+
+def available_rooms(check_in, check_out, queryset=None):
+    """Свободные комнаты на интервал [check_in, check_out)"""
+    if queryset is None:
+        queryset = Room.objects.all()
+    return queryset.filter(is_available=True).exclude(
+        id__in=occupied_nights(check_in, check_out).values('room_id')
+    )
+
+
+def is_room_available(room, check_in, check_out, exclude_booking=None):
+    """Проверяет, свободна ли комната на интервал [check_in, check_out)"""
+    nights = occupied_nights(check_in, check_out).filter(room=room)
+    if exclude_booking is not None:
+        nights = nights.exclude(booking=exclude_booking)
+    return not nights.exists()
+
+
+def sync_booking_nights(booking):
+    """
+    Приводит календарь занятости в соответствие с бронированием. Ночи,
+    оставшиеся за бронированием, сохраняют цену; новые получают цену
+    по календарю цен на момент записи.
+    """
+    from .pricing import night_prices
+
+    kept = dict(RoomNight.objects.filter(booking=booking, room_id=booking.room_id).values_list('date', 'price'))
+    RoomNight.objects.filter(booking=booking).delete()
+    if booking.status not in Booking.BLOCKING_STATUSES:
+        return
+    nights = stay_nights(booking.check_in, booking.check_out)
+    prices = night_prices(booking.room, [night for night in nights if night not in kept])
+    RoomNight.objects.bulk_create([
+        RoomNight(room_id=booking.room_id, booking=booking, date=night,
+                  price=kept[night] if night in kept else prices[night])
+        for night in nights
+    ])
+
+
+def rebuild_calendar():
+    """
+    Полностью перестраивает календарь занятости по бронированиям.
+    Пересекающиеся исторические бронирования не ломают перестройку: ночь
+    достаётся подтверждённому, затем более раннему бронированию. Цены
+    уже записанных ночей сохраняются, остальные берутся из календаря цен.
+    """
+    kept = {
+        (booking_id, night): price
+        for booking_id, night, price in RoomNight.objects.values_list('booking_id', 'date', 'price').iterator()
+    }
+    base_prices = dict(Room.objects.values_list('id', 'price_per_night'))
+    rates = {
+        (room_id, day): price
+        for room_id, day, price in RoomRate.objects.values_list('room_id', 'date', 'price').iterator()
+    }
+    RoomNight.objects.all().delete()
+    bookings = Booking.objects.filter(
+        status__in=Booking.BLOCKING_STATUSES
+    ).order_by('status', 'created_at', 'id')
+    taken = set()
+    nights = []
+    for booking in bookings.only('id', 'room_id', 'check_in', 'check_out').iterator():
+        for night in stay_nights(booking.check_in, booking.check_out):
+            if (booking.room_id, night) in taken:
+                continue
+            taken.add((booking.room_id, night))
+            price = kept.get((booking.id, night))
+            if price is None:
+                price = rates.get((booking.room_id, night), base_prices[booking.room_id])
+            nights.append(RoomNight(room_id=booking.room_id, booking_id=booking.id, date=night, price=price))
+    RoomNight.objects.bulk_create(nights, batch_size=1000)
+    return len(nights)
@@ -0,0 +1,83 @@
+# bookings/counters.py
+"""
+Денормализованные счётчики комнаты: сумма и число оценок отзывов
+(rating_sum, rating_count, из них - average_rating) и число подтверждённых
+бронирований (confirmed_booking_count).
+
+Сигналы Review и Booking меняют счётчики выражениями F() в той же
+транзакции, что и сохранение отзыва или бронирования, поэтому параллельные
+изменения не теряют приращений. Уменьшение не опускает счётчик ниже нуля:
+если он отстал от данных, удаление отзыва или бронирования не падает на
+ограничении PositiveIntegerField.
+
+Сигналов не вызывают QuerySet.update() и bulk_update() (в том числе смена
+оценки, комнаты или статуса), bulk_create(), loaddata (сигналы с raw=True)
+и запросы в обход ORM. После них нужен manage.py reconcile_room_counters
+(или reconcile_room_counters(room_ids) в коде). QuerySet.delete() сигналы
+вызывает и счётчики поддерживает.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Booking, Review, Room
+
+
+def _shifted(field, delta):
+    if delta >= 0:
+        return F(field) + delta
+    return Greatest(F(field) + delta, Value(0))
+
+
+def change_rating(room_id, rating, sign):
+    """Добавляет (sign=1) или убирает (sign=-1) оценку отзыва у комнаты"""
+    if room_id is None or rating is None:
+        return
+    Room.objects.filter(pk=room_id).update(
+        rating_sum=_shifted('rating_sum', sign * rating),
+        rating_count=_shifted('rating_count', sign),
+    )
+
+
+def change_confirmed_bookings(room_id, sign):
+    if room_id is None:
+        return
+    Room.objects.filter(pk=room_id).update(
+        confirmed_booking_count=_shifted('confirmed_booking_count', sign)
+    )
+
+
+def _subquery(queryset, aggregate):
+    return Coalesce(
+        Subquery(
+            queryset.filter(room=OuterRef('pk')).order_by().values('room').annotate(value=aggregate).values('value')
+        ),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def reconcile_room_counters(room_ids=None, dry_run=False):
+    """
+    Сверяет счётчики с отзывами и бронированиями и исправляет расхождения.
+    Возвращает список (room_id, было, стало) для исправленных комнат.
+    """
+    actual = {
+        'rating_sum': _subquery(Review.objects.all(), Sum('rating')),
+        'rating_count': _subquery(Review.objects.all(), Count('id')),
+        'confirmed_booking_count': _subquery(Booking.objects.filter(status='confirmed'), Count('id')),
+    }
+    rooms = Room.objects.annotate(**{f'actual_{name}': value for name, value in actual.items()}).order_by('pk')
+    if room_ids is not None:
+        rooms = rooms.filter(pk__in=room_ids)
+
+    fixed = []
+    for room in rooms.only(*actual):
+        stored = tuple(getattr(room, name) for name in actual)
+        expected = tuple(getattr(room, f'actual_{name}') for name in actual)
+        if stored != expected:
+            fixed.append((room.pk, stored, expected))
+    if fixed and not dry_run:
+        # Значения пересчитываются в самом UPDATE: изменения между сверкой
+        # и записью не теряются
+        Room.objects.filter(pk__in=[room_id for room_id, _, _ in fixed]).update(**actual)
+    return fixed
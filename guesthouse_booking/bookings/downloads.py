@@ -0,0 +1,187 @@
+# bookings/downloads.py
+"""
+Отдача защищённых файлов из FileField.
+
+Файл читается блоками и не загружается в память целиком. Поддерживаются
+запросы Range (один диапазон), If-None-Match / If-Modified-Since и If-Range.
+При settings.PROTECTED_FILES_OFFLOAD = 'x-accel' или 'x-sendfile' Django
+только проверяет права, а передачу файла выполняет фронтовой веб-сервер.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from .models import Booking, Document, Guest, Payment, Room
+
+CHUNK_SIZE = FileResponse.block_size
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _document_allowed(user, document):
+    return document.is_public or document.uploaded_by_id == user.id
+
+
+# Модель, поля с файлами и проверка владельца (персоналу доступно всё)
+DOWNLOADABLE_FILES = {
+    'document': (Document, ('file',), _document_allowed),
+    'guest': (Guest, ('passport_scan', 'id_document', 'additional_documents'),
+              lambda user, guest: guest.user_id == user.id),
+    'booking': (Booking, ('contract', 'receipt', 'additional_files'),
+                lambda user, booking: booking.guest_id == user.id),
+    'payment': (Payment, ('payment_receipt', 'bank_statement', 'refund_document'),
+                lambda user, payment: payment.booking.guest_id == user.id),
+    'room': (Room, ('photo', 'floor_plan', 'documents'), lambda user, room: True),
+}
+
+
+def get_downloadable_file(user, model_name, pk, field_name):
+    """
+    Возвращает файл объекта, если пользователь может его скачать.
+    Http404 для неизвестного поля или пустого файла, PermissionError при
+    отсутствии прав.
+    """
+    try:
+        model, fields, is_allowed = DOWNLOADABLE_FILES[model_name]
+    except KeyError:
+        raise Http404('Неизвестный тип файла')
+    if field_name not in fields:
+        raise Http404('Неизвестный тип файла')
+    queryset = model.objects.all()
+    if model is Payment:
+        queryset = queryset.select_related('booking')
+    try:
+        obj = queryset.get(pk=pk)
+    except model.DoesNotExist:
+        raise Http404('Объект не найден')
+    if not (user.is_staff or is_allowed(user, obj)):
+        raise PermissionError('Нет прав для скачивания файла')
+    field_file = getattr(obj, field_name)
+    if not field_file:
+        raise Http404('Файл не загружен')
+    return field_file
+
+
+def file_validators(field_file):
+    """ETag и время изменения файла для условных запросов"""
+    storage = field_file.storage
+    try:
+        size = storage.size(field_file.name)
+    except OSError:
+        raise Http404('Файл не найден')
+    try:
+        modified = int(storage.get_modified_time(field_file.name).timestamp())
+    except (NotImplementedError, OSError):
+        modified = None
+    etag = quote_etag(f'{size:x}-{modified or 0:x}')
+    return size, etag, modified
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range. Возвращает (start, end) включительно, None
+    для запроса всего файла и False для недостижимого диапазона.
+    Несколько диапазонов не поддерживаются, в этом случае отдаётся весь файл.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Суффикс: последние N байт
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_range(file, start, length):
+    """Читает диапазон файла блоками"""
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def offload_response(field_file, filename, as_attachment, content_type):
+    """Ответ-заголовок для передачи файла фронтовым веб-сервером"""
+    mode = settings.PROTECTED_FILES_OFFLOAD
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel':
+        prefix = settings.PROTECTED_FILES_INTERNAL_PREFIX.rstrip('/')
+        response['X-Accel-Redirect'] = quote(f'{prefix}/{field_file.name}')
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = field_file.path
+    else:
+        raise ValueError(f'Неизвестный режим PROTECTED_FILES_OFFLOAD: {mode}')
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+def serve_file(request, field_file, filename=None, as_attachment=True):
+    """Отдаёт файл с поддержкой условных запросов и Range"""
+    filename = filename or os.path.basename(field_file.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if settings.PROTECTED_FILES_OFFLOAD:
+        # Range и условные запросы обрабатывает веб-сервер
+        return offload_response(field_file, filename, as_attachment, content_type)
+
+    size, etag, modified = file_validators(field_file)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+    if not_modified is not None:
+        return not_modified
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.method == 'GET':
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range != etag and parse_http_date_safe(if_range) != modified:
+            range_header = None
+        if range_header:
+            byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            iter_range(field_file.open('rb'), start, length),
+            status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    else:
+        response = FileResponse(
+            field_file.open('rb'), as_attachment=as_attachment,
+            filename=filename, content_type=content_type
+        )
+        response['Content-Length'] = str(size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
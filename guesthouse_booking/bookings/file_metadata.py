@@ -0,0 +1,131 @@
+# bookings/file_metadata.py
+"""
+Метаданные файлов документов: размер, MIME-тип, SHA-256, число страниц
+PDF и размеры изображения.
+
+Извлекаются один раз при загрузке (Document.save, пакетная загрузка
+bookings.uploads) и хранятся в индексированных колонках Document, поэтому
+список документов, админка и фильтры по размеру и типу не обращаются к
+хранилищу. Для документов, загруженных раньше, - manage.py
+backfill_document_metadata.
+"""
+import hashlib
+import mimetypes
+
+READ_SIZE = 64 * 1024
+
+# Сигнатуры начала файла надёжнее расширения
+SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+]
+
+METADATA_FIELDS = ['file_size', 'mime_type', 'checksum', 'page_count', 'image_width', 'image_height']
+
+
+def sniff_mime_type(head, name):
+    for signature, mime_type in SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def pdf_page_count(f):
+    """
+    Число страниц по дереву страниц PDF: pypdf читает таблицу ссылок и
+    нужные объекты (в том числе из сжатых потоков), а не весь файл
+    """
+    from pypdf import PdfReader
+
+    try:
+        f.seek(0)
+        return len(PdfReader(f).pages)
+    except Exception:
+        return None
+
+
+def image_size(f):
+    from PIL import Image
+
+    try:
+        f.seek(0)
+        # Размеры читаются из заголовка, пиксели не декодируются
+        with Image.open(f) as image:
+            return image.size
+    except Exception:
+        return None, None
+
+
+def extract_metadata(f, name=None):
+    """
+    Метаданные открытого файла {поле Document: значение}. Файл читается
+    один раз целиком (для контрольной суммы) и возвращается в начало.
+    """
+    name = name or getattr(f, 'name', '') or ''
+    f.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    for chunk in iter(lambda: f.read(READ_SIZE), b''):
+        if len(head) < 16:
+            head += chunk[:16]
+        digest.update(chunk)
+        size += len(chunk)
+
+    mime_type = sniff_mime_type(head, name)
+    metadata = {
+        'file_size': size,
+        'mime_type': mime_type,
+        'checksum': digest.hexdigest(),
+        'page_count': None,
+        'image_width': None,
+        'image_height': None,
+    }
+    if mime_type == 'application/pdf':
+        metadata['page_count'] = pdf_page_count(f)
+    elif mime_type.startswith('image/'):
+        metadata['image_width'], metadata['image_height'] = image_size(f)
+    f.seek(0)
+    return metadata
+
+
+def field_file_metadata(field_file):
+    """Метаданные файла поля: нового загруженного или уже сохранённого"""
+    if field_file._committed:
+        with field_file.storage.open(field_file.name, 'rb') as f:
+            return extract_metadata(f, field_file.name)
+    return extract_metadata(field_file.file, field_file.name)
+
+
+# Фильтры списка документов по колонкам метаданных (без обращения к хранилищу)
+MB = 1024 * 1024
+SIZE_RANGES = {
+    'small': ('До 1 МБ', None, MB),
+    'medium': ('1–10 МБ', MB, 10 * MB),
+    'large': ('Больше 10 МБ', 10 * MB, None),
+}
+KINDS = {
+    'pdf': ('PDF', {'mime_type': 'application/pdf'}),
+    'image': ('Изображения', {'mime_type__startswith': 'image/'}),
+}
+
+
+def filter_by_size(queryset, key):
+    _, low, high = SIZE_RANGES[key]
+    if low is not None:
+        queryset = queryset.filter(file_size__gte=low)
+    if high is not None:
+        queryset = queryset.filter(file_size__lt=high)
+    return queryset
+
+
+def filter_by_kind(queryset, key):
+    return queryset.filter(**KINDS[key][1])
@@ -1,12 +1,34 @@
 import django_filters
-from .models import Room, Booking, Review, Payment, Guest
+from django_filters.constants import EMPTY_VALUES
+from .models import Room, Booking, Review, Payment, Guest, Amenity
+from .substring import contains
+
+
+class SubstringFilter(django_filters.CharFilter):
+    """
+    icontains по триграммному индексу (bookings.substring).
+    field_name - путь к полю, indexed_model - модель поля, если оно
+    не в фильтруемой (атрибут model занят FilterSet).
+    """
+    def __init__(self, *args, indexed_model=None, **kwargs):
+        kwargs.setdefault('lookup_expr', 'icontains')
+        super().__init__(*args, **kwargs)
+        self.indexed_model = indexed_model
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        prefix, _, field = self.field_name.rpartition('__')
+        qs = qs.filter(contains(self.indexed_model or qs.model, field, value, prefix + '__' if prefix else ''))
+        return qs.distinct() if self.distinct else qs
+
 
 class RoomFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name="price_per_night", lookup_expr='gte')
     max_price = django_filters.NumberFilter(field_name="price_per_night", lookup_expr='lte')
-    room_type = django_filters.CharFilter(field_name="room_type", lookup_expr='icontains')
+    room_type = SubstringFilter(field_name="room_type")
     min_occupancy = django_filters.NumberFilter(field_name="max_occupancy", lookup_expr='gte')
-    amenities = django_filters.CharFilter(field_name="amenities__name", lookup_expr='icontains')
+    amenities = SubstringFilter(field_name="amenities__name", indexed_model=Amenity, distinct=True)
     is_available = django_filters.BooleanFilter(field_name="is_available")
 
     class Meta:
@@ -19,7 +41,7 @@ class BookingFilter(django_filters.FilterSet):
     check_out_after = django_filters.DateFilter(field_name="check_out", lookup_expr='gte')
     check_out_before = django_filters.DateFilter(field_name="check_out", lookup_expr='lte')
     status = django_filters.CharFilter(field_name="status")
-    room_type = django_filters.CharFilter(field_name="room__room_type", lookup_expr='icontains')
+    room_type = SubstringFilter(field_name="room__room_type", indexed_model=Room)
     min_guests = django_filters.NumberFilter(field_name="guests_count", lookup_expr='gte')
 
     class Meta:
@@ -29,7 +51,7 @@ class BookingFilter(django_filters.FilterSet):
 class ReviewFilter(django_filters.FilterSet):
     min_rating = django_filters.NumberFilter(field_name="rating", lookup_expr='gte')
     max_rating = django_filters.NumberFilter(field_name="rating", lookup_expr='lte')
-    room_type = django_filters.CharFilter(field_name="room__room_type", lookup_expr='icontains')
+    room_type = SubstringFilter(field_name="room__room_type", indexed_model=Room)
     review_date_after = django_filters.DateFilter(field_name="review_date", lookup_expr='gte')
     review_date_before = django_filters.DateFilter(field_name="review_date", lookup_expr='lte')
 
@@ -53,8 +75,8 @@ class GuestFilter(django_filters.FilterSet):
     role = django_filters.CharFilter(field_name="role__name", lookup_expr='icontains')
     created_after = django_filters.DateFilter(field_name="created_at", lookup_expr='gte')
     created_before = django_filters.DateFilter(field_name="created_at", lookup_expr='lte')
-    email = django_filters.CharFilter(field_name="email", lookup_expr='icontains')
-    phone = django_filters.CharFilter(field_name="phone_number", lookup_expr='icontains')
+    email = SubstringFilter(field_name="email")
+    phone = SubstringFilter(field_name="phone_number")
 
     class Meta:
         model = Guest
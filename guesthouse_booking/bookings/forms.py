@@ -2,6 +2,7 @@ from django import forms
 from .models import Review
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
+from .file_metadata import KINDS, SIZE_RANGES
 from .models import Guest, Room, Booking, Payment, Document
 
 class GuestRegistrationForm(UserCreationForm):
@@ -126,6 +127,16 @@ class DocumentFilterForm(forms.Form):
         required=False,
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Поиск по названию...'})
     )
+    size = forms.ChoiceField(
+        choices=[('', 'Любой размер')] + [(key, label) for key, (label, _, _) in SIZE_RANGES.items()],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    kind = forms.ChoiceField(
+        choices=[('', 'Любой формат')] + [(key, label) for key, (label, _) in KINDS.items()],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
 
 class MultipleFileInput(forms.ClearableFileInput):
     allow_multiple_selected = True
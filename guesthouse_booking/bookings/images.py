@@ -0,0 +1,282 @@
+# bookings/images.py
+"""
+Производные изображений: уменьшенные копии фото комнат, слайдов и
+специальных предложений в современных форматах для srcset.
+
+После загрузки файл попадает в очередь ImageSource (сигналы post_save),
+воркер (manage.py run_image_worker) в пуле процессов строит копии
+шириной из IMAGE_DERIVATIVE_WIDTHS (не шире исходника) в форматах
+IMAGE_DERIVATIVE_FORMATS, которые поддерживает установленный Pillow.
+Имена производных - SHA-256 содержимого исходника, поэтому одинаковые
+файлы обрабатываются один раз. Сериализаторы отдают варианты как
+srcset для <picture>; пока производные не готовы, клиент получает
+исходник. Пересборка - manage.py rebuild_image_derivatives.
+"""
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ImageDerivative, ImageSource
+
+logger = logging.getLogger(__name__)
+
+# model_name -> поле изображения
+IMAGE_FIELDS = {
+    'room': 'photo',
+    'sliderimage': 'image',
+    'specialoffer': 'image',
+}
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+PIL_FORMATS = {'avif': 'AVIF', 'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def setting(name):
+    return getattr(settings, name)
+
+
+def derivative_formats():
+    """{формат: качество} из настроек, которые умеет кодировать Pillow"""
+    from PIL import features
+
+    return {
+        name: quality for name, quality in setting('IMAGE_DERIVATIVE_FORMATS').items()
+        if name == 'jpeg' or features.check(name)
+    }
+
+
+def target_widths(width):
+    """Ширины копий: из настроек меньше исходной и сама исходная, если она меньше максимальной"""
+    widths = [w for w in setting('IMAGE_DERIVATIVE_WIDTHS') if w < width]
+    if width < max(setting('IMAGE_DERIVATIVE_WIDTHS')):
+        widths.append(width)
+    return sorted(set(widths))
+
+
+def derivative_name(content_hash, width, fmt):
+    return f'derivatives/{content_hash[:2]}/{content_hash}/{width}.{fmt}'
+
+
+# Очередь
+
+def enqueue_image(field_file):
+    """Ставит файл изображения в очередь, если он ещё не обработан"""
+    if not field_file:
+        return None
+    try:
+        with transaction.atomic():
+            source, created = ImageSource.objects.get_or_create(name=field_file.name)
+    except IntegrityError:
+        # Тот же файл поставили в очередь параллельно
+        return ImageSource.objects.get(name=field_file.name)
+    if created and setting('IMAGE_DERIVATIVES_EAGER'):
+        claim_source(source.pk)
+        process_source(source.pk)
+        source.refresh_from_db()
+    return source
+
+
+def claim_source(source_id):
+    """Атомарно переводит изображение из очереди в работу"""
+    return ImageSource.objects.filter(
+        pk=source_id, status=ImageSource.STATUS_QUEUED
+    ).update(status=ImageSource.STATUS_RUNNING, started_at=timezone.now()) == 1
+
+
+def claim_next_source():
+    for source_id in ImageSource.objects.filter(
+        status=ImageSource.STATUS_QUEUED
+    ).order_by('created_at').values_list('pk', flat=True)[:10]:
+        if claim_source(source_id):
+            return source_id
+    return None
+
+
+def requeue_stalled_sources(older_than):
+    return ImageSource.objects.filter(
+        status=ImageSource.STATUS_RUNNING, started_at__lt=older_than
+    ).update(status=ImageSource.STATUS_QUEUED, started_at=None)
+
+
+def run_worker(processes=None, poll_interval=1.0, once=False):
+    """Обрабатывает очередь изображений в пуле процессов"""
+    from .report_worker import execute_image_job, serve_queue
+
+    processes = processes or setting('IMAGE_WORKER_PROCESSES')
+    serve_queue(claim_next_source, execute_image_job, processes, poll_interval, once)
+
+
+# Построение производных
+
+def _encode(image, fmt, quality):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    options = {'quality': quality}
+    if fmt == 'webp':
+        options['method'] = 6
+    elif fmt == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    image.save(buffer, PIL_FORMATS[fmt], **options)
+    return buffer.getvalue()
+
+
+def build_derivatives(content):
+    """
+    Строит недостающие производные для содержимого исходника. Возвращает
+    (хэш, ширина, высота).
+    """
+    from PIL import Image, ImageOps
+
+    content_hash = hashlib.sha256(content).hexdigest()
+    with Image.open(io.BytesIO(content)) as original:
+        # Фото с телефона хранит поворот в EXIF
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        # Палитра и оттенки серого масштабируются только в RGB(A)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    width, height = image.size
+
+    done = set(ImageDerivative.objects.filter(content_hash=content_hash).values_list('format', 'width'))
+
+    rows = []
+    for target in target_widths(width):
+        resized = image if target == width else image.resize(
+            (target, max(1, round(height * target / width))), Image.Resampling.LANCZOS, reducing_gap=3.0
+        )
+        for fmt, quality in derivative_formats().items():
+            if (fmt, target) in done:
+                continue
+            data = _encode(resized, fmt, quality)
+            name = derivative_name(content_hash, target, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            rows.append(ImageDerivative(
+                content_hash=content_hash, format=fmt, width=target, height=resized.height,
+                file=default_storage.save(name, ContentFile(data)), size=len(data),
+            ))
+    ImageDerivative.objects.bulk_create(rows, ignore_conflicts=True)
+    return content_hash, width, height
+
+
+def process_source(source_id):
+    """Строит производные для изображения, которое уже находится в работе"""
+    source = ImageSource.objects.get(pk=source_id)
+    try:
+        with default_storage.open(source.name, 'rb') as f:
+            content = f.read()
+        source.content_hash, source.width, source.height = build_derivatives(content)
+        source.status = ImageSource.STATUS_DONE
+        source.error = ''
+    except Exception as e:
+        logger.exception('Ошибка построения производных %s', source.name)
+        source.status = ImageSource.STATUS_FAILED
+        source.error = str(e)
+    source.finished_at = timezone.now()
+    source.save(update_fields=['content_hash', 'width', 'height', 'status', 'error', 'finished_at'])
+    return source.status
+
+
+def drop_derivatives(content_hashes):
+    """Удаляет производные (файлы и записи) для исходников с этими хэшами"""
+    derivatives = ImageDerivative.objects.filter(content_hash__in=content_hashes)
+    for name in derivatives.values_list('file', flat=True):
+        default_storage.delete(name)
+    return derivatives.delete()[0]
+
+
+# Пересборка
+
+def referenced_images(model_names=None):
+    """Имена файлов изображений, на которые ссылаются объекты моделей"""
+    from django.apps import apps
+
+    names = set()
+    for model_name in model_names or IMAGE_FIELDS:
+        field = IMAGE_FIELDS[model_name]
+        names.update(
+            apps.get_model('bookings', model_name).objects.exclude(
+                **{f'{field}__isnull': True}
+            ).exclude(**{field: ''}).values_list(field, flat=True)
+        )
+    return names
+
+
+def requeue_images(names, force=False):
+    """
+    Ставит изображения в очередь: новые и неготовые, с force - все,
+    удаляя их производные. Возвращает число поставленных.
+    """
+    existing = set(ImageSource.objects.filter(name__in=names).values_list('name', flat=True))
+    ImageSource.objects.bulk_create([ImageSource(name=name) for name in names - existing], ignore_conflicts=True)
+    sources = ImageSource.objects.filter(name__in=names)
+    if force:
+        drop_derivatives(sources.exclude(content_hash='').values_list('content_hash', flat=True))
+    else:
+        sources = sources.exclude(status=ImageSource.STATUS_DONE)
+    return sources.update(status=ImageSource.STATUS_QUEUED, started_at=None, error='')
+
+
+def prune_images():
+    """Удаляет очередь и производные изображений, на которые больше никто не ссылается"""
+    sources = ImageSource.objects.exclude(name__in=referenced_images()).delete()[0]
+    live = ImageSource.objects.exclude(content_hash='').values('content_hash')
+    orphaned = ImageDerivative.objects.exclude(content_hash__in=live).values_list('content_hash', flat=True)
+    return sources, drop_derivatives(set(orphaned))
+
+
+# Выдача
+
+def image_variants(names, request=None):
+    """
+    {имя исходника: варианты} для готовых изображений - два запроса на
+    любое число файлов. Варианты: размеры исходника, миниатюра и srcset
+    по форматам в порядке предпочтения (для <source type=...>).
+    """
+    names = {name for name in names if name}
+    if not names:
+        return {}
+    sources = {
+        name: (content_hash, width, height)
+        for name, content_hash, width, height in ImageSource.objects.filter(
+            name__in=names, status=ImageSource.STATUS_DONE
+        ).values_list('name', 'content_hash', 'width', 'height')
+    }
+    derivatives = {}
+    for derivative in ImageDerivative.objects.filter(content_hash__in={row[0] for row in sources.values()}):
+        derivatives.setdefault(derivative.content_hash, []).append(derivative)
+
+    def url(derivative):
+        value = derivative.file.url
+        return request.build_absolute_uri(value) if request else value
+
+    preferred = list(setting('IMAGE_DERIVATIVE_FORMATS'))
+    result = {}
+    for name, (content_hash, width, height) in sources.items():
+        by_format = {}
+        for derivative in sorted(derivatives.get(content_hash, ()), key=lambda d: d.width):
+            by_format.setdefault(derivative.format, []).append(derivative)
+        if not by_format:
+            continue
+        thumbnail_format = 'webp' if 'webp' in by_format else next(iter(by_format))
+        result[name] = {
+            'width': width,
+            'height': height,
+            'thumbnail': url(by_format[thumbnail_format][0]),
+            'sources': [
+                {
+                    'type': MIME_TYPES[fmt],
+                    'srcset': ', '.join(f'{url(d)} {d.width}w' for d in by_format[fmt]),
+                }
+                for fmt in sorted(by_format, key=lambda f: preferred.index(f) if f in preferred else len(preferred))
+            ],
+        }
+    return result
@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bookings.file_metadata import METADATA_FIELDS, field_file_metadata
+from bookings.models import Document
+
+
+class Command(BaseCommand):
+    help = 'Заполняет метаданные файлов документов (размер, MIME-тип, SHA-256, страницы, размеры изображения)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересчитать и уже заполненные метаданные')
+        parser.add_argument('--batch-size', type=int, default=200, help='Документов в одном UPDATE')
+        parser.add_argument('--threads', type=int, default=None, help='Потоков чтения файлов')
+
+    def handle(self, *args, **options):
+        documents = Document.objects.exclude(file='').only('pk', 'file', *METADATA_FIELDS).order_by('pk')
+        if not options['force']:
+            documents = documents.filter(file_size__isnull=True)
+        threads = options['threads'] or settings.DOCUMENT_UPLOAD_THREADS
+
+        def read(document):
+            try:
+                return document, field_file_metadata(document.file), None
+            except OSError as e:
+                return document, None, e
+
+        updated = missing = 0
+        rows = documents.iterator(chunk_size=options['batch_size'])
+        # Потоки только читают файлы, в базу пишет основной поток
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while batch := list(islice(rows, options['batch_size'])):
+                changed = []
+                for document, metadata, error in pool.map(read, batch):
+                    if error is not None:
+                        missing += 1
+                        self.stderr.write(f'Документ {document.pk}: {document.file.name} - {error}')
+                        continue
+                    for field, value in metadata.items():
+                        setattr(document, field, value)
+                    changed.append(document)
+                updated += Document.objects.bulk_update(changed, METADATA_FIELDS)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено документов: {updated}, файлов не найдено: {missing}'))
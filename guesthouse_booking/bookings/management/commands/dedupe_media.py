@@ -0,0 +1,42 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from bookings.storage import DeduplicatingStorage, unreferenced_files
+
+
+class Command(BaseCommand):
+    help = 'Переводит загруженные файлы на общие блобы и удаляет блобы без ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Удалить файлы, на которые не ссылается ни одна модель')
+        parser.add_argument('--min-age', type=int, default=24, help='Не удалять файлы моложе N часов (для --prune)')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет сделано')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, DeduplicatingStorage):
+            raise CommandError('Хранилище по умолчанию не DeduplicatingStorage (MEDIA_DEDUPLICATION=False)')
+        dry_run = options['dry_run']
+
+        if options['prune']:
+            names = list(unreferenced_files(default_storage, options['min_age'] * 3600))
+            for name in names:
+                self.stdout.write(f'Без ссылок: {name}')
+                if not dry_run:
+                    default_storage.delete(name)
+            self.stdout.write(f'Удалено файлов без ссылок: {len(names)}')
+
+        plain = list(default_storage.plain_files())
+        saved = 0
+        if not dry_run:
+            saved = sum(default_storage.deduplicate(name) for name in plain)
+        self.stdout.write(f'Переведено на блобы файлов: {len(plain)}, освобождено {filesizeformat(saved)}')
+
+        removed, freed = default_storage.collect_garbage(dry_run=dry_run)
+        self.stdout.write(f'Удалено блобов без ссылок: {removed}, {filesizeformat(freed)}')
+
+        usage = default_storage.usage()
+        self.stdout.write(self.style.SUCCESS(
+            f"Блобов: {usage['blobs']}, ссылок: {usage['links']}, на диске {filesizeformat(usage['stored_bytes'])} "
+            f"вместо {filesizeformat(usage['referenced_bytes'])}"
+        ))
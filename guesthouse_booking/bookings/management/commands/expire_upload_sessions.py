@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bookings.uploads import expire_sessions
+
+
+class Command(BaseCommand):
+    help = 'Удаляет незавершённые сессии загрузки документов и их временные файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Сессии, начатые раньше N часов назад')
+
+    def handle(self, *args, **options):
+        deleted = expire_sessions(timezone.now() - timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей незавершённых загрузок: {deleted}'))
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.metrics import read_records, setting, summarize
+
+
+class Command(BaseCommand):
+    help = 'Сводка метрик запросов по маршрутам из файла METRICS_LOG_FILE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Файл JSON Lines (по умолчанию METRICS_LOG_FILE)')
+        parser.add_argument(
+            '--sort', default='p99_ms',
+            choices=['requests', 'p50_ms', 'p99_ms', 'avg_queries', 'max_queries', 'avg_sql_ms'],
+        )
+        parser.add_argument('--min-queries', type=int, default=0, help='Только маршруты с max_queries не меньше')
+        parser.add_argument('--json', action='store_true', help='Вывести сводку в JSON')
+
+    def handle(self, *args, **options):
+        path = options['file'] or setting('METRICS_LOG_FILE')
+        if not path:
+            raise CommandError('Не задан файл метрик: укажите --file или METRICS_LOG_FILE')
+        try:
+            records = read_records(path)
+        except FileNotFoundError:
+            raise CommandError(f'Файл метрик не найден: {path}')
+
+        summary = {
+            route: row for route, row in summarize(records).items()
+            if row['max_queries'] >= options['min_queries']
+        }
+        rows = sorted(summary.items(), key=lambda item: item[1][options['sort']], reverse=True)
+        if options['json']:
+            self.stdout.write(json.dumps(dict(rows), ensure_ascii=False, indent=2))
+            return
+
+        columns = ['requests', 'p50_ms', 'p99_ms', 'avg_queries', 'max_queries', 'avg_sql_ms', 'avg_serializer_ms', 'avg_bytes']
+        self.stdout.write('route'.ljust(40) + ''.join(column.rjust(18) for column in columns))
+        for route, row in rows:
+            self.stdout.write(route[:40].ljust(40) + ''.join(str(row[column]).rjust(18) for column in columns))
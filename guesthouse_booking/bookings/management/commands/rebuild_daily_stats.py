@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from bookings.rollups import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает дневные сводки по комнатам (RoomDailyStat)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--room', type=int, action='append', dest='rooms',
+            help='ID комнаты (можно указать несколько раз)'
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_daily_stats(room_ids=options['rooms'])
+        self.stdout.write(self.style.SUCCESS(f'Создано строк сводки: {rows}'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from bookings.images import IMAGE_FIELDS, prune_images, referenced_images, requeue_images, run_worker
+from bookings.models import ImageSource
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие производные изображений (с --force - все заново)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', dest='models', choices=sorted(IMAGE_FIELDS),
+            help='модель (можно указать несколько раз)'
+        )
+        parser.add_argument('--force', action='store_true', help='Пересоздать и готовые производные')
+        parser.add_argument('--prune', action='store_true', help='Удалить производные файлов, на которые нет ссылок')
+        parser.add_argument('--queue-only', action='store_true', help='Только поставить в очередь для run_image_worker')
+        parser.add_argument('--processes', type=int, default=None, help='Размер пула процессов')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            sources, derivatives = prune_images()
+            self.stdout.write(f'Удалено исходников: {sources}, производных: {derivatives}')
+        queued = requeue_images(referenced_images(options['models']), force=options['force'])
+        self.stdout.write(f'Поставлено в очередь изображений: {queued}')
+        if queued and not options['queue_only']:
+            run_worker(processes=options['processes'], once=True)
+            failed = ImageSource.objects.filter(status=ImageSource.STATUS_FAILED).count()
+            self.stdout.write(self.style.SUCCESS(f'Готово, с ошибками: {failed}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bookings.search import rebuild_review_index, search_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс отзывов (FTS5 или ReviewSearchTerm)'
+
+    def handle(self, *args, **options):
+        count = rebuild_review_index()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано отзывов: {count} (бэкенд {search_backend()})'))
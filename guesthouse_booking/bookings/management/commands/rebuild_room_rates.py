@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from bookings.pricing import rebuild_rates
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает календарь цен ночей по специальным предложениям (RoomRate)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--room', type=int, action='append', dest='rooms',
+            help='ID комнаты (можно указать несколько раз)'
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_rates(room_ids=options['rooms'])
+        self.stdout.write(self.style.SUCCESS(f'Создано строк календаря цен: {rows}'))
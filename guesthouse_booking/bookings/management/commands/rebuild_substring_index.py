@@ -0,0 +1,19 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from bookings.substring import INDEXED_FIELDS, rebuild_substring_index, substring_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает триграммный индекс поиска подстроки (FTS5 или SearchTrigram)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', dest='models', choices=sorted(INDEXED_FIELDS),
+            help='модель (можно указать несколько раз)'
+        )
+
+    def handle(self, *args, **options):
+        models = [apps.get_model('bookings', name) for name in options['models'] or INDEXED_FIELDS]
+        count = rebuild_substring_index(models)
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано объектов: {count} (бэкенд {substring_backend()})'))
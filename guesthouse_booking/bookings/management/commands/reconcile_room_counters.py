@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from bookings.counters import reconcile_room_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики отзывов и подтверждённых бронирований комнат и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--room', type=int, action='append', dest='rooms',
+            help='ID комнаты (можно указать несколько раз)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='только показать расхождения')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_room_counters(room_ids=options['rooms'], dry_run=options['dry_run'])
+        for room_id, stored, actual in fixed:
+            self.stdout.write(
+                f'Комната {room_id}: (сумма оценок, отзывов, подтверждённых) {stored} -> {actual}'
+            )
+        verb = 'Найдено расхождений' if options['dry_run'] else 'Исправлено комнат'
+        self.stdout.write(self.style.SUCCESS(f'{verb}: {len(fixed)}'))
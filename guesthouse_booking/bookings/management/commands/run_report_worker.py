@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bookings.reports import requeue_stalled_jobs, run_worker
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркер фоновой генерации PDF-отчетов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None, help='Размер пула процессов')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Интервал опроса очереди, сек.')
+        parser.add_argument('--once', action='store_true', help='Выполнить очередь и завершиться')
+        parser.add_argument(
+            '--stalled-after', type=int, default=30,
+            help='Вернуть в очередь задания, выполняющиеся дольше N минут'
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stalled_jobs(timezone.now() - timedelta(minutes=options['stalled_after']))
+        if requeued:
+            self.stdout.write(f'Возвращено в очередь зависших заданий: {requeued}')
+        self.stdout.write(self.style.SUCCESS('Воркер отчетов запущен'))
+        run_worker(
+            processes=options['processes'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+        )
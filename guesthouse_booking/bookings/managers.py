@@ -2,16 +2,13 @@
 from django.db import models
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Q, Count, Avg, F, ExpressionWrapper, DurationField
+from django.db.models import Q, F, ExpressionWrapper, DurationField
 
 class RoomManager(models.Manager):
     def available_rooms(self, check_in, check_out):
         """Получить доступные комнаты на указанные даты"""
-        return self.filter(is_available=True).exclude(
-            Q(bookings__status='confirmed') &
-            Q(bookings__check_in__lte=check_out) &
-            Q(bookings__check_out__gte=check_in)
-        )
+        from .availability import available_rooms
+        return available_rooms(check_in, check_out, queryset=self.get_queryset())
 
     def luxury_rooms(self, min_price=5000):
         """Получить люкс-комнаты (с ценой выше указанной)"""
@@ -22,16 +19,21 @@ class RoomManager(models.Manager):
         return self.filter(price_per_night__lte=max_price)
 
     def popular_rooms(self, min_bookings=5):
-        """Получить популярные комнаты (с количеством бронирований выше указанного)"""
-        return self.annotate(
-            booking_count=Count('bookings')
-        ).filter(booking_count__gte=min_bookings)
+        """Получить популярные комнаты (с количеством подтверждённых бронирований не ниже указанного)"""
+        # Счётчик на комнате: фильтр и сортировка идут по индексу без соединения
+        return self.filter(
+            confirmed_booking_count__gte=min_bookings
+        ).annotate(
+            booking_count=F('confirmed_booking_count')
+        ).order_by('-confirmed_booking_count', 'room_number')
 
     def top_rated(self, min_rating=4.0):
         """Получить высокорейтинговые комнаты"""
-        return self.annotate(
-            avg_rating=Avg('reviews__rating')
-        ).filter(avg_rating__gte=min_rating)
+        return self.filter(
+            average_rating__gte=min_rating
+        ).annotate(
+            avg_rating=F('average_rating')
+        ).order_by('-average_rating', 'room_number')
 
     def with_all_amenities(self, amenity_names):
         """Получить комнаты со всеми указанными удобствами"""
@@ -0,0 +1,338 @@
+# bookings/metrics.py
+"""
+Метрики запросов: число и время SQL-запросов, время сериализации, размер
+ответа и общее время по каждому маршруту.
+
+QueryMetricsMiddleware собирает метрики запроса через
+connection.execute_wrapper и складывает их в кольцевой буфер процесса и,
+если задан settings.METRICS_LOG_FILE, в файл JSON Lines (его читает команда
+metrics_report). Накопленные счётчики отдаются в формате Prometheus по
+адресу /api/_metrics. Повторяющийся запрос с одним и тем же SQL сверх
+settings.METRICS_DUPLICATE_QUERY_THRESHOLD - признак N+1: он пишется в лог
+вместе со стеком вызова из кода проекта.
+"""
+import json
+import logging
+import math
+import re
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+# Числа и строковые литералы не различают запросы одного шаблона
+SQL_LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+DEFAULTS = {
+    'METRICS_ENABLED': True,
+    'METRICS_BUFFER_SIZE': 1000,
+    'METRICS_LOG_FILE': None,
+    'METRICS_QUERY_THRESHOLD': 50,
+    'METRICS_DUPLICATE_QUERY_THRESHOLD': 10,
+    'METRICS_SLOW_REQUEST_MS': 1000,
+    'METRICS_TOKEN': None,
+}
+
+
+def setting(name):
+    return getattr(settings, name, DEFAULTS[name])
+
+
+def project_stack():
+    """Стек вызова без кадров Django, DRF и стандартной библиотеки"""
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('metrics.py')
+    ]
+    return ''.join(traceback.format_list(frames))
+
+
+class RequestMetrics:
+    """Метрики одного запроса"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.in_serializer = False
+        self.templates = Counter()
+        self.duplicate_stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        template = SQL_LITERALS_RE.sub('?', sql)
+        self.templates[template] += 1
+        if self.templates[template] == setting('METRICS_DUPLICATE_QUERY_THRESHOLD') + 1:
+            self.duplicate_stacks[template] = project_stack()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - started
+
+
+class MetricsRegistry:
+    """Кольцевой буфер последних запросов и накопленные счётчики процесса"""
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=size)
+        self.requests = Counter()
+        self.totals = defaultdict(Counter)
+        self.buckets = defaultdict(Counter)
+
+    def record(self, record):
+        route = record['route']
+        with self.lock:
+            self.recent.append(record)
+            self.requests[route, record['method'], record['status']] += 1
+            totals = self.totals[route]
+            totals['count'] += 1
+            totals['duration'] += record['duration']
+            totals['queries'] += record['queries']
+            totals['sql_time'] += record['sql_time']
+            totals['serializer_time'] += record['serializer_time']
+            totals['response_bytes'] += record['response_bytes'] or 0
+            for bucket in DURATION_BUCKETS:
+                if record['duration'] <= bucket:
+                    self.buckets[route][bucket] += 1
+
+    def reset(self):
+        with self.lock:
+            self.recent.clear()
+            self.requests.clear()
+            self.totals.clear()
+            self.buckets.clear()
+
+    def prometheus(self):
+        """Счётчики в текстовом формате Prometheus"""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            family('bookings_http_requests_total', 'counter', 'HTTP requests by route, method and status')
+            for (route, method, status), value in sorted(self.requests.items()):
+                lines.append(f'bookings_http_requests_total{{route="{route}",method="{method}",status="{status}"}} {value}')
+
+            family('bookings_http_request_duration_seconds', 'histogram', 'Request latency')
+            for route, totals in sorted(self.totals.items()):
+                for bucket in DURATION_BUCKETS:
+                    lines.append(f'bookings_http_request_duration_seconds_bucket{{route="{route}",le="{bucket}"}} {self.buckets[route][bucket]}')
+                lines.append(f'bookings_http_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {totals["count"]}')
+                lines.append(f'bookings_http_request_duration_seconds_sum{{route="{route}"}} {totals["duration"]:.6f}')
+                lines.append(f'bookings_http_request_duration_seconds_count{{route="{route}"}} {totals["count"]}')
+
+            for name, key, help_text in (
+                ('bookings_sql_queries_total', 'queries', 'SQL queries executed'),
+                ('bookings_sql_duration_seconds_total', 'sql_time', 'Time spent in SQL'),
+                ('bookings_serializer_duration_seconds_total', 'serializer_time', 'Time spent building serializer data'),
+                ('bookings_response_bytes_total', 'response_bytes', 'Response body size'),
+            ):
+                family(name, 'counter', help_text)
+                for route, totals in sorted(self.totals.items()):
+                    value = totals[key]
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{{route="{route}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(DEFAULTS['METRICS_BUFFER_SIZE'])
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+def response_size(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length else None
+    return len(response.content)
+
+
+def write_record(record):
+    path = setting('METRICS_LOG_FILE')
+    if not path:
+        return
+    with open(path, 'a', encoding='utf-8') as log_file:
+        log_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class QueryMetricsMiddleware:
+    """Работает и в синхронном, и в асинхронном стеке: под ASGI не переводит запросы в поток"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if registry.recent.maxlen != setting('METRICS_BUFFER_SIZE'):
+            registry.recent = deque(registry.recent, maxlen=setting('METRICS_BUFFER_SIZE'))
+
+    def skip(self, request):
+        return not setting('METRICS_ENABLED') or request.path.startswith(('/static/', '/media/'))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.skip(request):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with connections['default'].execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if self.skip(request):
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            # Соединение общее с потоками sync_to_async этого запроса
+            with connections['default'].execute_wrapper(metrics):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, response, metrics, duration):
+        route = route_name(request)
+        if route == 'metrics':
+            return
+        record = {
+            'route': route,
+            'method': request.method,
+            'status': response.status_code,
+            'duration': duration,
+            'queries': metrics.queries,
+            'sql_time': metrics.sql_time,
+            'serializer_time': metrics.serializer_time,
+            'response_bytes': response_size(response),
+            'timestamp': time.time(),
+        }
+        registry.record(record)
+        write_record(record)
+        self.check_thresholds(request, record, metrics)
+
+    def check_thresholds(self, request, record, metrics):
+        for template, stack in metrics.duplicate_stacks.items():
+            logger.warning(
+                'Возможный N+1 в %s %s: запрос повторен %s раз\n%s\nСтек:\n%s',
+                request.method, request.path, metrics.templates[template], template, stack
+            )
+        if record['queries'] > setting('METRICS_QUERY_THRESHOLD'):
+            logger.warning(
+                '%s %s: %s SQL-запросов (порог %s)',
+                request.method, request.path, record['queries'], setting('METRICS_QUERY_THRESHOLD')
+            )
+        if record['duration'] * 1000 > setting('METRICS_SLOW_REQUEST_MS'):
+            logger.warning(
+                '%s %s: медленный ответ %.0f мс (SQL %.0f мс, сериализация %.0f мс)',
+                request.method, request.path, record['duration'] * 1000,
+                record['sql_time'] * 1000, record['serializer_time'] * 1000
+            )
+
+
+def instrument_serializers():
+    """Учитывает время построения serializer.data в метриках текущего запроса"""
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, 'instrumented', False):
+        return
+
+    def timed_data(serializer):
+        metrics = _current.get()
+        # Вложенные сериализаторы считаются в составе внешнего
+        if metrics is None or metrics.in_serializer:
+            return original.fget(serializer)
+        metrics.in_serializer = True
+        started = time.perf_counter()
+        try:
+            return original.fget(serializer)
+        finally:
+            metrics.in_serializer = False
+            metrics.serializer_time += time.perf_counter() - started
+
+    timed_data.instrumented = True
+    BaseSerializer.data = property(timed_data)
+
+
+def metrics_view(request):
+    """Метрики процесса в формате Prometheus"""
+    token = setting('METRICS_TOKEN')
+    if token:
+        allowed = request.headers.get('Authorization') == f'Bearer {token}'
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def percentile(values, fraction):
+    """Процентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def summarize(records):
+    """Сводка по маршрутам: число запросов, p50/p99 времени, SQL и размер ответа"""
+    by_route = defaultdict(list)
+    for record in records:
+        by_route[record['route']].append(record)
+    summary = {}
+    for route, items in by_route.items():
+        durations = sorted(item['duration'] for item in items)
+        queries = [item['queries'] for item in items]
+        summary[route] = {
+            'requests': len(items),
+            'p50_ms': round(percentile(durations, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(durations, 0.99) * 1000, 2),
+            'avg_queries': round(sum(queries) / len(items), 1),
+            'max_queries': max(queries),
+            'avg_sql_ms': round(sum(item['sql_time'] for item in items) / len(items) * 1000, 2),
+            'avg_serializer_ms': round(sum(item['serializer_time'] for item in items) / len(items) * 1000, 2),
+            'avg_bytes': round(sum(item['response_bytes'] or 0 for item in items) / len(items)),
+        }
+    return summary
+
+
+def read_records(path):
+    with open(path, encoding='utf-8') as log_file:
+        return [json.loads(line) for line in log_file if line.strip()]
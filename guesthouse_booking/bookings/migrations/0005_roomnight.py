@@ -0,0 +1,45 @@
+# Generated by Django 5.1.15 on 2026-10-17 12:13
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_room_nights(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    RoomNight = apps.get_model('bookings', 'RoomNight')
+    nights = []
+    for booking in Booking.objects.filter(status='confirmed').iterator():
+        for i in range((booking.check_out - booking.check_in).days):
+            nights.append(RoomNight(
+                room_id=booking.room_id,
+                booking_id=booking.id,
+                date=booking.check_in + timedelta(days=i),
+            ))
+    RoomNight.objects.bulk_create(nights, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_additional_files_booking_contract_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='bookings.booking')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupied_nights', to='bookings.room')),
+            ],
+            options={
+                'verbose_name': 'Занятая ночь',
+                'verbose_name_plural': 'Занятые ночи',
+                'indexes': [models.Index(fields=['date', 'room'], name='bookings_ro_date_1da1fa_idx'), models.Index(fields=['room', 'date'], name='bookings_ro_room_id_3120af_idx')],
+            },
+        ),
+        migrations.RunPython(fill_room_nights, migrations.RunPython.noop),
+    ]
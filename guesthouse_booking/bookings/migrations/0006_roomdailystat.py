@@ -0,0 +1,59 @@
+# Generated by Django 5.1.15 on 2026-10-17 12:16
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_daily_stats(apps, schema_editor):
+    Room = apps.get_model('bookings', 'Room')
+    Booking = apps.get_model('bookings', 'Booking')
+    Review = apps.get_model('bookings', 'Review')
+    RoomNight = apps.get_model('bookings', 'RoomNight')
+    RoomDailyStat = apps.get_model('bookings', 'RoomDailyStat')
+
+    prices = dict(Room.objects.values_list('id', 'price_per_night'))
+    rows = defaultdict(dict)
+    for room_id, night in RoomNight.objects.filter(booking__status='confirmed').values_list('room_id', 'date'):
+        rows[room_id, night].update(occupied=True, revenue=prices[room_id])
+    for row in Booking.objects.filter(status='confirmed').order_by().values('room_id', 'check_in').annotate(total=Count('id')):
+        rows[row['room_id'], row['check_in']]['check_ins'] = row['total']
+    for row in Review.objects.order_by().annotate(day=TruncDate('review_date')).values('room_id', 'day').annotate(total=Count('id'), ratings=Sum('rating')):
+        rows[row['room_id'], row['day']].update(reviews_count=row['total'], rating_sum=row['ratings'])
+    RoomDailyStat.objects.bulk_create(
+        [RoomDailyStat(room_id=room_id, date=day, **values) for (room_id, day), values in rows.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_roomnight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('occupied', models.BooleanField(default=False)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('check_ins', models.PositiveIntegerField(default=0)),
+                ('reviews_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='bookings.room')),
+            ],
+            options={
+                'verbose_name': 'Дневная статистика комнаты',
+                'verbose_name_plural': 'Дневная статистика комнат',
+                'indexes': [models.Index(fields=['date'], name='bookings_ro_date_7d094f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'date'), name='unique_room_daily_stat')],
+            },
+        ),
+        migrations.RunPython(fill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-17 12:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_roomdailystat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('room_statistics', 'Статистика комнат'), ('monthly_report', 'Месячный отчет'), ('booking_report', 'Отчет по бронированиям'), ('special_offers_report', 'Отчет по специальным предложениям')], max_length=50, verbose_name='Тип отчета')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Параметры')),
+                ('key', models.CharField(max_length=64, verbose_name='Ключ отчета')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='queued', max_length=20, verbose_name='Статус')),
+                ('file', models.FileField(blank=True, null=True, upload_to='reports/%Y/%m/%d/', verbose_name='Файл')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('is_stale', models.BooleanField(default=False, help_text='Данные изменились после генерации отчета', verbose_name='Устарел')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Запросил')),
+            ],
+            options={
+                'verbose_name': 'Задание отчета',
+                'verbose_name_plural': 'Задания отчетов',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['key', 'status'], name='bookings_re_key_6b1b6c_idx'), models.Index(fields=['status', 'created_at'], name='bookings_re_status_a08c43_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('key',), name='unique_in_flight_report')],
+            },
+        ),
+    ]
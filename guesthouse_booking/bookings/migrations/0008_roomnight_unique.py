@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-17 12:25
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def rebuild_room_nights(apps, schema_editor):
+    """
+    Перестраивает календарь с учётом ожидающих бронирований. Если ночь уже
+    занята (исторические пересечения), она остаётся за подтверждённым, а
+    затем за более ранним бронированием.
+    """
+    Booking = apps.get_model('bookings', 'Booking')
+    RoomNight = apps.get_model('bookings', 'RoomNight')
+    RoomNight.objects.all().delete()
+    taken = set()
+    nights = []
+    bookings = Booking.objects.filter(status__in=('pending', 'confirmed')).order_by('status', 'created_at', 'id')
+    # 'confirmed' < 'pending' по алфавиту: подтверждённые получают ночи первыми
+    for booking in bookings.iterator():
+        for i in range((booking.check_out - booking.check_in).days):
+            night = booking.check_in + timedelta(days=i)
+            if (booking.room_id, night) in taken:
+                continue
+            taken.add((booking.room_id, night))
+            nights.append(RoomNight(room_id=booking.room_id, booking_id=booking.id, date=night))
+    RoomNight.objects.bulk_create(nights, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_reportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_room_nights, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='roomnight',
+            constraint=models.UniqueConstraint(fields=('room', 'date'), name='unique_room_night'),
+        ),
+    ]
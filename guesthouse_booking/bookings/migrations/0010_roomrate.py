@@ -0,0 +1,60 @@
+# Generated by Django 5.1.15 on 2026-10-17 12:41
+
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_room_rates(apps, schema_editor):
+    """Заполняет календарь цен по активным предложениям комнат"""
+    Room = apps.get_model('bookings', 'Room')
+    RoomRate = apps.get_model('bookings', 'RoomRate')
+    RoomSpecialOffer = apps.get_model('bookings', 'RoomSpecialOffer')
+    prices = dict(Room.objects.values_list('id', 'price_per_night'))
+    best = {}
+    for offer in RoomSpecialOffer.objects.filter(is_active=True).order_by('-created_at'):
+        day = offer.start_date
+        while day <= offer.end_date:
+            current = best.get((offer.room_id, day))
+            if current is None or offer.discount_percentage > current.discount_percentage:
+                best[offer.room_id, day] = offer
+            day += timedelta(days=1)
+    rows = []
+    for (room_id, day), offer in best.items():
+        price = prices[room_id]
+        rows.append(RoomRate(
+            room_id=room_id, date=day, offer_id=offer.id,
+            discount_percentage=offer.discount_percentage,
+            price=(price - price * offer.discount_percentage / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+        ))
+    RoomRate.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('discount_percentage', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('offer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rates', to='bookings.roomspecialoffer')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='bookings.room')),
+            ],
+            options={
+                'verbose_name': 'Цена ночи',
+                'verbose_name_plural': 'Цены ночей',
+                'indexes': [models.Index(fields=['date', 'room'], name='bookings_ro_date_add3ab_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'date'), name='unique_room_rate')],
+            },
+        ),
+        migrations.RunPython(build_room_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.15 on 2026-10-17 12:49
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def fill_room_counters(apps, schema_editor):
+    """Заполняет счётчики комнат по существующим отзывам и бронированиям"""
+    Room = apps.get_model('bookings', 'Room')
+    Review = apps.get_model('bookings', 'Review')
+    Booking = apps.get_model('bookings', 'Booking')
+    ratings = {
+        row['room_id']: row
+        for row in Review.objects.order_by().values('room_id').annotate(
+            total=models.Sum('rating'), count=models.Count('id')
+        )
+    }
+    confirmed = dict(
+        Booking.objects.filter(status='confirmed').order_by().values('room_id').annotate(
+            count=models.Count('id')
+        ).values_list('room_id', 'count')
+    )
+    rooms = list(Room.objects.only('id'))
+    for room in rooms:
+        row = ratings.get(room.id, {'total': 0, 'count': 0})
+        room.rating_sum, room.rating_count = row['total'], row['count']
+        room.confirmed_booking_count = confirmed.get(room.id, 0)
+    Room.objects.bulk_update(rooms, ['rating_sum', 'rating_count', 'confirmed_booking_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_roomrate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='confirmed_booking_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='average_rating',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(rating_count=0, then=models.Value(0.0)), default=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('rating_sum', models.FloatField()), '/', models.F('rating_count'))), output_field=models.FloatField()),
+        ),
+        migrations.RunPython(fill_room_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['-average_rating', 'room_number'], name='room_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['-confirmed_booking_count', 'room_number'], name='room_popularity_idx'),
+        ),
+    ]
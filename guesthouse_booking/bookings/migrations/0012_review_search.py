@@ -0,0 +1,91 @@
+# Generated by Django 5.1.15 on 2026-10-17 12:54
+
+from collections import Counter
+from itertools import islice
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models, transaction
+
+from bookings.migrations._search_v1 import terms
+
+BATCH_SIZE = 1000
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Полнотекстовый индекс отзывов по возможностям базы: FTS5 в SQLite,
+    GIN по to_tsvector('russian') в PostgreSQL, иначе ReviewSearchTerm
+    """
+    connection = schema_editor.connection
+    Review = apps.get_model('bookings', 'Review')
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+        schema_editor.add_index(Review, GinIndex(SearchVector('comment', config='russian'), name='review_comment_search_idx'))
+        return
+
+    reviews = Review.objects.order_by().values_list('id', 'room_id', 'comment')
+    if connection.vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(
+                    "CREATE VIRTUAL TABLE bookings_review_fts USING fts5("
+                    "terms, room_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+                )
+        except OperationalError:
+            # SQLite собран без FTS5 - поиск работает по ReviewSearchTerm
+            pass
+        else:
+            rows = (
+                (pk, ' '.join(terms(comment)), room_id)
+                for pk, room_id, comment in reviews.iterator(chunk_size=BATCH_SIZE)
+            )
+            with connection.cursor() as cursor:
+                while batch := list(islice(rows, BATCH_SIZE)):
+                    cursor.executemany(
+                        'INSERT INTO bookings_review_fts (rowid, terms, room_id) VALUES (%s, %s, %s)', batch
+                    )
+            return
+
+    ReviewSearchTerm = apps.get_model('bookings', 'ReviewSearchTerm')
+    search_terms = (
+        ReviewSearchTerm(review_id=pk, room_id=room_id, term=term[:64], frequency=min(count, 32767))
+        for pk, room_id, comment in reviews.iterator(chunk_size=BATCH_SIZE)
+        for term, count in Counter(terms(comment)).items()
+    )
+    while batch := list(islice(search_terms, BATCH_SIZE)):
+        ReviewSearchTerm.objects.bulk_create(batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS review_comment_search_idx')
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS bookings_review_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0011_room_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.PositiveSmallIntegerField(default=1)),
+                ('review', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='bookings.review')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_search_terms', to='bookings.room')),
+            ],
+            options={
+                'verbose_name': 'Терм отзыва',
+                'verbose_name_plural': 'Термы отзывов',
+                'indexes': [models.Index(fields=['term', 'room'], name='bookings_re_term_d0c80d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('review', 'term'), name='unique_review_term')],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.15 on 2026-10-17 12:57
+
+from django.db import OperationalError, migrations, models, transaction
+
+from bookings.migrations._search_v1 import INDEXED_FIELDS, indexed_tables, install_fts5, trigrams
+
+
+def create_substring_indexes(apps, schema_editor):
+    """
+    Триграммные индексы полей INDEXED_FIELDS: pg_trgm в PostgreSQL,
+    FTS5 trigram в SQLite, иначе таблица SearchTrigram
+    """
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex, OpClass
+        from django.db.models.functions import Upper
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for model_name, fields in INDEXED_FIELDS.items():
+            model = apps.get_model('bookings', model_name)
+            for field in fields:
+                schema_editor.add_index(model, GinIndex(
+                    OpClass(Upper(field), name='gin_trgm_ops'), name=f'{model_name}_{field}_trgm_idx'
+                ))
+        return
+
+    if connection.vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=connection.alias):
+                install_fts5(connection, indexed_tables(apps))
+            return
+        except OperationalError:
+            # SQLite без FTS5 или без токенизатора trigram (до 3.34)
+            pass
+
+    SearchTrigram = apps.get_model('bookings', 'SearchTrigram')
+    for model_name, fields in INDEXED_FIELDS.items():
+        rows = [
+            SearchTrigram(field=f'{model_name}.{field}', object_id=obj['pk'], trigram=gram)
+            for obj in apps.get_model('bookings', model_name).objects.values('pk', *fields)
+            for field in fields
+            for gram in trigrams(obj[field] or '')
+        ]
+        SearchTrigram.objects.bulk_create(rows, batch_size=1000)
+
+
+def drop_substring_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    for model_name, fields in INDEXED_FIELDS.items():
+        db_table = apps.get_model('bookings', model_name)._meta.db_table
+        if connection.vendor == 'postgresql':
+            for field in fields:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {model_name}_{field}_trgm_idx')
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {db_table}_trgm_{suffix}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {db_table}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0012_review_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=64)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('trigram', models.CharField(max_length=3)),
+            ],
+            options={
+                'verbose_name': 'Триграмма',
+                'verbose_name_plural': 'Триграммы',
+                'indexes': [models.Index(fields=['field', 'trigram', 'object_id'], name='search_trigram_idx')],
+                'constraints': [models.UniqueConstraint(fields=('field', 'object_id', 'trigram'), name='unique_search_trigram')],
+            },
+        ),
+        migrations.RunPython(create_substring_indexes, drop_substring_indexes),
+    ]
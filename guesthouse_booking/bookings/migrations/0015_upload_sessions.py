@@ -0,0 +1,54 @@
+# Generated by Django 5.1.15 on 2026-10-17 13:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0014_image_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_type', models.CharField(choices=[('contract', 'Договор'), ('receipt', 'Квитанция'), ('passport', 'Паспорт'), ('id_card', 'Удостоверение личности'), ('photo', 'Фото'), ('plan', 'План'), ('certificate', 'Сертификат'), ('statement', 'Выписка'), ('other', 'Другое')], default='other', max_length=20)),
+                ('is_public', models.BooleanField(default=False)),
+                ('description_template', models.CharField(blank=True, max_length=500)),
+                ('status', models.CharField(choices=[('uploading', 'Загрузка файлов'), ('storing', 'Сохранение'), ('done', 'Готово'), ('failed', 'Ошибка')], default='uploading', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Пакетная загрузка',
+                'verbose_name_plural': 'Пакетные загрузки',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('received', models.PositiveBigIntegerField(default=0)),
+                ('stored_name', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает данных'), ('received', 'Получен'), ('stored', 'Сохранен в хранилище'), ('done', 'Документ создан'), ('failed', 'Ошибка')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bookings.document')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='bookings.uploadsession')),
+            ],
+            options={
+                'verbose_name': 'Файл пакетной загрузки',
+                'verbose_name_plural': 'Файлы пакетной загрузки',
+                'ordering': ['id'],
+            },
+        ),
+    ]
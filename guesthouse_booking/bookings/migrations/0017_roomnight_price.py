@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-17 13:58
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_night_prices(apps, schema_editor):
+    """
+    Цены занятых ночей по текущему календарю цен и выручка дневных сводок
+    по ним (до этой миграции выручка считалась по цене комнаты без скидок)
+    """
+    Room = apps.get_model('bookings', 'Room')
+    RoomNight = apps.get_model('bookings', 'RoomNight')
+    RoomRate = apps.get_model('bookings', 'RoomRate')
+    RoomDailyStat = apps.get_model('bookings', 'RoomDailyStat')
+    RoomNight.objects.update(price=Coalesce(
+        models.Subquery(RoomRate.objects.filter(
+            room_id=models.OuterRef('room_id'), date=models.OuterRef('date')
+        ).values('price')[:1]),
+        models.Subquery(Room.objects.filter(pk=models.OuterRef('room_id')).values('price_per_night')[:1]),
+    ))
+    RoomDailyStat.objects.filter(occupied=True).update(revenue=Coalesce(
+        models.Subquery(RoomNight.objects.filter(
+            room_id=models.OuterRef('room_id'), date=models.OuterRef('date')
+        ).values('price')[:1]),
+        models.Value(0, output_field=models.DecimalField()),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0016_document_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roomnight',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.RunPython(fill_night_prices, migrations.RunPython.noop),
+    ]
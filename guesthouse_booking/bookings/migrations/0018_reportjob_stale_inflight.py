@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-17 14:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0017_roomnight_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='reportjob',
+            name='unique_in_flight_report',
+        ),
+        migrations.AlterField(
+            model_name='reportjob',
+            name='is_stale',
+            field=models.BooleanField(default=False, help_text='Данные изменились во время или после генерации отчета', verbose_name='Устарел'),
+        ),
+        migrations.AddConstraint(
+            model_name='reportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_stale', False), ('status__in', ['queued', 'running'])), fields=('key',), name='unique_in_flight_report'),
+        ),
+    ]
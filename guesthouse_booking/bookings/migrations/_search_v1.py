@@ -0,0 +1,201 @@
+# bookings/migrations/_search_v1.py
+"""
+Замороженная копия кода поиска для миграций 0012_review_search и
+0013_substring_index: стеммер (bookings.stemmer), индексируемые поля,
+DDL FTS5 и триграммы (bookings.substring) в том виде, в каком их
+применили эти миграции.
+
+Миграции не импортируют живые модули приложения, чтобы их изменение не
+меняло уже применённые миграции. Скопированный код не редактируется:
+новая схема поиска - новая миграция и, при необходимости, новая копия.
+Имя с подчёркиванием загрузчик миграций пропускает.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'[^\W_]+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+PERFECTIVE_GERUND = (('вшись', 'вши', 'в'), ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'))
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый', 'ой',
+    'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+     'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей', 'ой',
+    'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у',
+    'ы', 'ь', 'ю', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _longest(endings):
+    return tuple(sorted(endings, key=len, reverse=True))
+
+
+PERFECTIVE_GERUND = tuple(_longest(group) for group in PERFECTIVE_GERUND)
+PARTICIPLE = tuple(_longest(group) for group in PARTICIPLE)
+VERB = tuple(_longest(group) for group in VERB)
+ADJECTIVE, NOUN = _longest(ADJECTIVE), _longest(NOUN)
+
+
+def _strip(word, endings, start):
+    """Слово без самого длинного окончания из endings, целиком лежащего в word[start:]"""
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= start:
+            return word[:-len(ending)]
+    return None
+
+
+def _strip_grouped(word, groups, start):
+    """
+    Окончания первой группы отбрасываются только после «а» или «я»,
+    второй - без условий; берётся самое длинное из подходящих.
+    """
+    first, second = groups
+    candidates = []
+    for ending in first:
+        cut = len(word) - len(ending)
+        if word.endswith(ending) and cut - 1 >= start and word[cut - 1] in 'ая':
+            candidates.append(ending)
+            break
+    stem = _strip(word, second, start)
+    if stem is not None:
+        candidates.append(word[len(stem):])
+    if not candidates:
+        return None
+    return word[:-len(max(candidates, key=len))]
+
+
+def _regions(word):
+    """Начала областей RV и R2"""
+    def after_vowel_pair(start):
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    rv = next((i + 1 for i, char in enumerate(word) if char in VOWELS), len(word))
+    r1 = after_vowel_pair(0)
+    r2 = after_vowel_pair(r1)
+    return rv, r2
+
+
+def stem(word):
+    """Основа русского слова"""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word
+    rv, r2 = _regions(word)
+
+    # Шаг 1: деепричастие, иначе возвратность и прилагательное/глагол/существительное
+    stemmed = _strip_grouped(word, PERFECTIVE_GERUND, rv)
+    if stemmed is None:
+        word = _strip(word, REFLEXIVE, rv) or word
+        stemmed = _strip(word, ADJECTIVE, rv)
+        if stemmed is not None:
+            stemmed = _strip_grouped(stemmed, PARTICIPLE, rv) or stemmed
+        else:
+            stemmed = _strip_grouped(word, VERB, rv)
+            if stemmed is None:
+                stemmed = _strip(word, NOUN, rv)
+    word = stemmed if stemmed is not None else word
+
+    # Шаг 2
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    # Шаг 3: словообразовательный суффикс в R2
+    word = _strip(word, DERIVATIONAL, r2) or word
+    # Шаг 4
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        return word[:-1]
+    superlative = _strip(word, SUPERLATIVE, rv)
+    if superlative is not None:
+        word = superlative
+        return word[:-1] if word.endswith('нн') and len(word) - 1 >= rv else word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    return WORD_RE.findall((text or '').lower())
+
+
+def terms(text):
+    """Основы слов текста по порядку"""
+    return [stem(word) for word in tokenize(text)]
+
+
+# model_name -> индексируемые поля
+INDEXED_FIELDS = {
+    'room': ('room_type',),
+    'amenity': ('name',),
+    'guest': ('first_name', 'last_name', 'email', 'phone_number'),
+    'document': ('title', 'description'),
+}
+
+
+def fts5_table(db_table):
+    return f'{db_table}_trgm'
+
+
+def fts5_statements(db_table, fields):
+    """DDL таблицы FTS5 и триггеров синхронизации для таблицы модели"""
+    table = fts5_table(db_table)
+    columns = ', '.join(fields)
+    new = ', '.join(f'new.{field}' for field in fields)
+    old = ', '.join(f'old.{field}' for field in fields)
+    delete = f"INSERT INTO {table} ({table}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    insert = f'INSERT INTO {table} (rowid, {columns}) VALUES (new.id, {new});'
+    return {
+        table: (
+            f"CREATE VIRTUAL TABLE {table} USING fts5("
+            f"{columns}, content = '{db_table}', content_rowid = 'id', tokenize = 'trigram')"
+        ),
+        f'{table}_ai': f'CREATE TRIGGER {table}_ai AFTER INSERT ON {db_table} BEGIN {insert} END',
+        f'{table}_ad': f'CREATE TRIGGER {table}_ad AFTER DELETE ON {db_table} BEGIN {delete} END',
+        f'{table}_au': (
+            # Только при изменении индексируемых полей: счётчики комнаты
+            # обновляются на каждый отзыв и бронирование
+            f'CREATE TRIGGER {table}_au AFTER UPDATE OF {columns} ON {db_table} BEGIN {delete} {insert} END'
+        ),
+    }
+
+
+def install_fts5(connection, tables):
+    """
+    Создаёт недостающие таблицы FTS5 и триггеры ({db_table: поля}) и
+    перестраивает затронутые индексы
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name for name, in cursor.fetchall()}
+        for db_table, fields in tables.items():
+            statements = fts5_statements(db_table, fields)
+            missing = [sql for name, sql in statements.items() if name not in existing]
+            for sql in missing:
+                cursor.execute(sql)
+            if missing:
+                table = fts5_table(db_table)
+                cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+
+def indexed_tables(apps):
+    return {
+        apps.get_model('bookings', model_name)._meta.db_table: fields
+        for model_name, fields in INDEXED_FIELDS.items()
+    }
+
+
+def trigrams(value):
+    value = value.casefold()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
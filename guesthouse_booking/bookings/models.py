@@ -1,17 +1,22 @@
 # bookings/models.py
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.db.models import (
     Avg, Count, Q, Sum, F, ExpressionWrapper, 
-    DecimalField, IntegerField, DurationField, 
-    Case, When, Value
+    DecimalField, IntegerField, DurationField, FloatField,
+    Case, When, Value, OuterRef, Subquery
 )
-from datetime import timedelta
+from django.db.models.functions import Cast, Coalesce
+from datetime import date, timedelta
+from decimal import Decimal
 from .managers import RoomManager, BookingManager
 from django.urls import reverse
-from django.core.cache import cache
+from django.core.exceptions import ValidationError
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Amenity(models.Model):
     """Модель удобства для комнаты."""
@@ -49,6 +54,20 @@ class Room(models.Model):
         related_name='rooms'
     )
     is_available = models.BooleanField(default=True, db_index=True)
+
+    # Счётчики отзывов и подтверждённых бронирований ведут сигналы
+    # (bookings.counters), расхождения исправляет reconcile_room_counters
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    confirmed_booking_count = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.GeneratedField(
+        expression=Case(
+            When(rating_count=0, then=Value(0.0)),
+            default=Cast('rating_sum', FloatField()) / F('rating_count'),
+        ),
+        output_field=FloatField(),
+        db_persist=True,
+    )
     
     # Новые поля для файлов
     photo = models.ImageField(
@@ -84,8 +103,22 @@ class Room(models.Model):
             models.Index(fields=['price_per_night']),
             models.Index(fields=['is_available']),
             models.Index(fields=['room_type', 'is_available']),
+            models.Index(fields=['-average_rating', 'room_number'], name='room_rating_idx'),
+            models.Index(fields=['-confirmed_booking_count', 'room_number'], name='room_popularity_idx'),
         ]
 
+    COUNTER_FIELDS = ('rating_sum', 'rating_count', 'confirmed_booking_count')
+
+    def save(self, *args, **kwargs):
+        # Счётчики меняются только выражениями F() из сигналов: сохранение
+        # комнаты не должно затирать их значениями, прочитанными раньше
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('room-detail', kwargs={'pk': self.pk})
 
@@ -109,22 +142,19 @@ class Room(models.Model):
     @classmethod
     def get_rooms_by_popularity(cls):
         return cls.objects.annotate(
-            booking_count=Count('bookings')
-        ).order_by('-booking_count')
+            booking_count=F('confirmed_booking_count')
+        ).order_by('-confirmed_booking_count', 'room_number')
 
     @classmethod
     def get_top_rated_rooms(cls):
         return cls.objects.annotate(
-            avg_rating=Avg('reviews__rating')
-        ).order_by('-avg_rating')
+            avg_rating=F('average_rating')
+        ).order_by('-average_rating', 'room_number')
 
     @classmethod
     def get_available_rooms(cls, check_in, check_out):
-        return cls.objects.filter(is_available=True).exclude(
-            bookings__status='confirmed',
-            bookings__check_in__lt=check_out,
-            bookings__check_out__gt=check_in
-        ).distinct().order_by('price_per_night')
+        from .availability import available_rooms
+        return available_rooms(check_in, check_out).order_by('price_per_night')
 
     @classmethod
     def get_rooms_by_price_range(cls, min_price=None, max_price=None):
@@ -168,9 +198,17 @@ class Room(models.Model):
 
     @classmethod
     def get_rooms_by_review_keywords(cls, keyword):
-        return cls.objects.filter(
-            reviews__comment__icontains=keyword
-        ).distinct().select_related(None)
+        """Комнаты с отзывами по запросу, от более релевантных (bookings.search)"""
+        from .search import rank_rooms
+        ranks = rank_rooms(keyword)
+        if not ranks:
+            return cls.objects.none()
+        return cls.objects.filter(pk__in=ranks).annotate(
+            search_rank=Case(
+                *[When(pk=room_id, then=Value(rank)) for room_id, rank in ranks.items()],
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', 'room_number')
 
     @classmethod
     def get_rooms_with_long_stays(cls, min_days=7):
@@ -205,16 +243,8 @@ class Room(models.Model):
         ).select_related('guest').order_by('check_in')
 
     def get_average_rating(self):
-        cache_key = f'room_{self.id}_avg_rating'
-        avg_rating = cache.get(cache_key)
-        
-        if avg_rating is None:
-            avg_rating = self.reviews.aggregate(
-                avg_rating=Avg('rating')
-            )['avg_rating'] or 0
-            cache.set(cache_key, avg_rating, timeout=60*60)
-        
-        return avg_rating
+        """Средний рейтинг из счётчиков комнаты (ведутся сигналами отзывов)"""
+        return self.average_rating
 
     def get_amenities_list(self):
         return list(self.amenities.values_list('name', flat=True))
@@ -241,25 +271,18 @@ class Room(models.Model):
 
     def get_current_price_with_discount(self):
         """Возвращает текущую цену с учетом активных скидок"""
-        active_offers = self.get_active_special_offers()
-        if active_offers.exists():
-            # Берем предложение с максимальной скидкой
-            best_offer = active_offers.first()
-            return best_offer.get_discounted_price()
-        return self.price_per_night
+        from .pricing import current_rates
+        return current_rates([self])[self.id]['price']
 
     def get_max_discount_percentage(self):
         """Возвращает максимальный процент скидки среди активных предложений"""
-        active_offers = self.get_active_special_offers()
-        if active_offers.exists():
-            return active_offers.aggregate(
-                max_discount=models.Max('discount_percentage')
-            )['max_discount']
-        return 0
+        from .pricing import current_rates
+        return current_rates([self])[self.id]['discount_percentage']
 
     def has_active_special_offers(self):
         """Проверяет, есть ли у комнаты активные специальные предложения"""
-        return self.get_active_special_offers().exists()
+        from .pricing import current_rates
+        return current_rates([self])[self.id]['offer_id'] is not None
 
     def get_special_offers_history(self):
         """Возвращает историю всех специальных предложений для комнаты"""
@@ -319,8 +342,9 @@ class Room(models.Model):
 
     @classmethod
     def get_room_statistics(cls):
+        # Рейтинг из счётчиков: соединение с отзывами размножало бы бронирования
         return cls.objects.annotate(
-            avg_rating=Avg('reviews__rating'),
+            avg_rating=F('average_rating'),
             total_bookings=Count('bookings'),
             cancelled_bookings=Count(
                 'bookings',
@@ -363,58 +387,39 @@ class Room(models.Model):
 
     @classmethod
     def get_monthly_statistics(cls, year, month):
-        start_date = timezone.datetime(year, month, 1)
+        """
+        Месячная статистика по дневным сводкам RoomDailyStat.
+        Все показатели берутся из одной таблицы, поэтому соединение
+        не размножает строки бронирований и отзывов.
+        """
+        start_date = date(year, month, 1)
         if month == 12:
-            end_date = timezone.datetime(year + 1, 1, 1)
+            end_date = date(year + 1, 1, 1)
         else:
-            end_date = timezone.datetime(year, month + 1, 1)
+            end_date = date(year, month + 1, 1)
+        days_in_month = (end_date - start_date).days
+        in_month = Q(daily_stats__date__gte=start_date, daily_stats__date__lt=end_date)
 
         return cls.objects.annotate(
-            monthly_bookings=Count(
-                'bookings',
-                filter=Q(
-                    bookings__check_in__gte=start_date,
-                    bookings__check_in__lt=end_date,
-                    bookings__status='confirmed'
-                )
-            ),
-            monthly_revenue=Sum(
-                ExpressionWrapper(
-                    F('bookings__check_out') - F('bookings__check_in'),
-                    output_field=IntegerField()
-                ) * F('price_per_night'),
-                filter=Q(
-                    bookings__check_in__gte=start_date,
-                    bookings__check_in__lt=end_date,
-                    bookings__status='confirmed'
-                )
+            monthly_bookings=Coalesce(Sum('daily_stats__check_ins', filter=in_month), 0),
+            monthly_revenue=Coalesce(
+                Sum('daily_stats__revenue', filter=in_month),
+                Value(Decimal('0')),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
             ),
             occupied_days=Count(
-                'bookings__check_in',
-                filter=Q(
-                    bookings__check_in__gte=start_date,
-                    bookings__check_in__lt=end_date,
-                    bookings__status='confirmed'
-                ),
-                distinct=True
+                'daily_stats',
+                filter=in_month & Q(daily_stats__occupied=True)
             ),
             occupancy_rate=ExpressionWrapper(
-                F('occupied_days') * 100.0 / Value(30),
-                output_field=DecimalField(decimal_places=2)
+                F('occupied_days') * 100.0 / Value(days_in_month),
+                output_field=FloatField()
             ),
-            monthly_rating=Avg(
-                'reviews__rating',
-                filter=Q(
-                    reviews__review_date__gte=start_date,
-                    reviews__review_date__lt=end_date
-                )
-            ),
-            reviews_count=Count(
-                'reviews',
-                filter=Q(
-                    reviews__review_date__gte=start_date,
-                    reviews__review_date__lt=end_date
-                )
+            reviews_count=Coalesce(Sum('daily_stats__reviews_count', filter=in_month), 0),
+            monthly_rating=Case(
+                When(reviews_count=0, then=Value(None)),
+                default=Sum('daily_stats__rating_sum', filter=in_month) * 1.0 / F('reviews_count'),
+                output_field=FloatField()
             )
         )
 
@@ -485,6 +490,65 @@ class Guest(models.Model):
             models.Index(fields=['last_name', 'first_name']),
         ]
 
+    @classmethod
+    def with_statistics(cls, queryset=None, period='all', include_cancelled=False, min_rating=0):
+        """
+        Аннотирует гостей статистикой (поля stat_*) коррелированными
+        подзапросами: список гостей со статистикой - один запрос
+        независимо от их числа и длины истории бронирований
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        now = timezone.now()
+        bookings = Booking.objects.filter(guest_id=OuterRef('user_id')).order_by()
+        if not include_cancelled:
+            bookings = bookings.exclude(status='cancelled')
+        payments = Payment.objects.filter(booking__guest_id=OuterRef('user_id'), status='completed').order_by()
+        if period == 'month':
+            payments = payments.filter(booking__created_at__month=now.month)
+        elif period == 'year':
+            payments = payments.filter(booking__created_at__year=now.year)
+        reviews = Review.objects.filter(guest_id=OuterRef('user_id'), rating__gte=min_rating).order_by()
+        last_booking = bookings.order_by('-check_out')
+
+        def total(subquery, group, aggregate, output_field):
+            return Subquery(
+                subquery.values(group).annotate(value=aggregate).values('value'), output_field=output_field
+            )
+
+        return queryset.annotate(
+            stat_total_bookings=Coalesce(total(bookings, 'guest_id', Count('id'), IntegerField()), 0),
+            stat_total_spent=total(
+                payments, 'booking__guest_id', Sum('amount'), DecimalField(max_digits=12, decimal_places=2)
+            ),
+            stat_average_rating=total(reviews, 'guest_id', Avg('rating'), FloatField()),
+            stat_last_booking_id=Subquery(last_booking.values('id')[:1]),
+            stat_last_booking_room_number=Subquery(last_booking.values('room__room_number')[:1]),
+            stat_last_booking_check_out=Subquery(last_booking.values('check_out')[:1]),
+            stat_last_booking_status=Subquery(last_booking.values('status')[:1]),
+        )
+
+    def statistics(self):
+        """Статистика гостя из аннотаций with_statistics()"""
+        return {
+            'total_bookings': self.stat_total_bookings,
+            'total_spent': self.stat_total_spent or 0,
+            'average_rating': self.stat_average_rating or 0,
+            'last_booking': {
+                'id': self.stat_last_booking_id,
+                'room_number': self.stat_last_booking_room_number,
+                'check_out': self.stat_last_booking_check_out,
+                'status': self.stat_last_booking_status,
+            } if self.stat_last_booking_id else None,
+        }
+
+    def get_statistics(self, period='all', include_cancelled=False, min_rating=0):
+        """Статистика гостя одним запросом; для списков - with_statistics()"""
+        guest = type(self).with_statistics(
+            type(self).objects.filter(pk=self.pk), period, include_cancelled, min_rating
+        ).get()
+        return guest.statistics()
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
@@ -494,6 +558,10 @@ class Booking(models.Model):
         ('confirmed', 'Подтверждено'),
         ('cancelled', 'Отменено')
     ]
+    # Статусы, при которых бронирование занимает ночи в календаре комнаты.
+    # Ожидающее подтверждения бронирование тоже держит ночи, иначе два
+    # гостя успевают забронировать одну комнату до подтверждения
+    BLOCKING_STATUSES = ('pending', 'confirmed')
 
     guest = models.ForeignKey(
         User, 
@@ -557,8 +625,23 @@ class Booking(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['check_in', 'check_out']),
             models.Index(fields=['guest', 'room']),
+            # Курсорная пагинация: сортировка Meta.ordering + id
+            models.Index(fields=['-created_at', 'check_in', '-id'], name='booking_keyset_idx'),
+            models.Index(fields=['guest', '-created_at'], name='booking_guest_created_idx'),
         ]
 
+    def clean(self):
+        super().clean()
+        if not (self.check_in and self.check_out):
+            return
+        if self.check_out <= self.check_in:
+            raise ValidationError({'check_out': 'Дата выезда должна быть позже даты заезда'})
+        from .availability import is_room_available
+        if self.room_id and self.status in self.BLOCKING_STATUSES and not is_room_available(
+            self.room_id, self.check_in, self.check_out, exclude_booking=self.pk
+        ):
+            raise ValidationError('Комната уже забронирована на выбранные даты')
+
     def get_absolute_url(self):
         return reverse('booking-detail', kwargs={'pk': self.pk})
 
@@ -571,11 +654,21 @@ class Booking(models.Model):
     def get_payment_url(self):
         return reverse('booking-payment', kwargs={'pk': self.pk})
 
+    def save(self, *args, **kwargs):
+        # Календарь, сводки и счётчики комнаты обновляются сигналами в той же транзакции
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
     def total_price(self):
-        if not all([self.check_in, self.check_out, self.room]):
+        """Стоимость проживания по календарю цен с учётом специальных предложений"""
+        if not all([self.check_in, self.check_out, self.room_id]):
             return 0
-        days = (self.check_out - self.check_in).days
-        return self.room.price_per_night * days
+        from .availability import to_date
+        from .pricing import booking_totals
+        cached = getattr(self, '_total_price', None)
+        if cached is None or cached[0] != (self.room_id, to_date(self.check_in), to_date(self.check_out)):
+            booking_totals([self])
+        return self._total_price[1]
 
     def is_active(self):
         today = timezone.now().date()
@@ -611,6 +704,107 @@ class Booking(models.Model):
     def __str__(self):
         return f"Booking {self.id} - {self.guest.username} - {self.room.room_number}"
 
+class RoomNight(models.Model):
+    """Ночь, занятая бронированием (календарь занятости комнаты)"""
+    room = models.ForeignKey(
+        Room,
+        on_delete=models.CASCADE,
+        related_name='occupied_nights'
+    )
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='nights'
+    )
+    date = models.DateField()
+    # Цена ночи на момент бронирования (с учётом предложений): выручка
+    # прошлых дней не меняется вслед за ценой комнаты
+    price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Занятая ночь'
+        verbose_name_plural = 'Занятые ночи'
+        constraints = [
+            # Одна ночь комнаты принадлежит только одному бронированию
+            models.UniqueConstraint(fields=['room', 'date'], name='unique_room_night'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'room']),
+            models.Index(fields=['room', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.room.room_number} - {self.date}"
+
+class RoomDailyStat(models.Model):
+    """
+    Дневная сводка по комнате: занятость, выручка, заезды и отзывы.
+    Заполняется инкрементально из сигналов Booking и Review,
+    полностью перестраивается командой rebuild_daily_stats.
+    """
+    room = models.ForeignKey(
+        Room,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+    date = models.DateField()
+    occupied = models.BooleanField(default=False)
+    revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    check_ins = models.PositiveIntegerField(default=0)
+    reviews_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Дневная статистика комнаты'
+        verbose_name_plural = 'Дневная статистика комнат'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['room', 'date'],
+                name='unique_room_daily_stat'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.room_id} - {self.date}"
+
+class RoomRate(models.Model):
+    """
+    Действующая цена ночи комнаты по специальным предложениям.
+    Хранятся только дни, покрытые активным предложением, в остальные дни
+    действует price_per_night. Перестраивается из RoomSpecialOffer (bookings.pricing).
+    """
+    room = models.ForeignKey(
+        Room,
+        on_delete=models.CASCADE,
+        related_name='rates'
+    )
+    date = models.DateField()
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    discount_percentage = models.DecimalField(max_digits=5, decimal_places=2)
+    offer = models.ForeignKey(
+        'RoomSpecialOffer',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='rates'
+    )
+
+    class Meta:
+        verbose_name = 'Цена ночи'
+        verbose_name_plural = 'Цены ночей'
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'date'], name='unique_room_rate'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'room']),
+        ]
+
+    def __str__(self):
+        return f"{self.room_id} - {self.date}: {self.price}"
+
 class Payment(models.Model):
     PAYMENT_STATUS = [
         ('pending', 'Ожидает оплаты'),
@@ -674,6 +868,7 @@ class Payment(models.Model):
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['payment_date']),
+            models.Index(fields=['-payment_date', '-id'], name='payment_keyset_idx'),
         ]
 
     def get_booking_payments(self):
@@ -712,8 +907,14 @@ class Review(models.Model):
         indexes = [
             models.Index(fields=['room', 'rating']),
             models.Index(fields=['guest', 'review_date']),
+            models.Index(fields=['-review_date', '-rating', '-id'], name='review_keyset_idx'),
         ]
 
+    def save(self, *args, **kwargs):
+        # Сводки и счётчики комнаты обновляются сигналами в той же транзакции
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('review-detail', kwargs={'pk': self.pk})
 
@@ -737,6 +938,57 @@ class Review(models.Model):
     def __str__(self):
         return f"Review {self.id} - {self.room} by {self.guest.username if self.guest else 'Anonymous'}"
 
+
+class ReviewSearchTerm(models.Model):
+    """
+    Обратный индекс отзывов: основа слова и число её вхождений в отзыв.
+    Используется поиском (bookings.search), когда база не поддерживает
+    полнотекстовый индекс (нет FTS5 в SQLite, не PostgreSQL).
+    """
+    review = models.ForeignKey(
+        Review,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    room = models.ForeignKey(
+        Room,
+        on_delete=models.CASCADE,
+        related_name='review_search_terms'
+    )
+    term = models.CharField(max_length=64)
+    frequency = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        verbose_name = 'Терм отзыва'
+        verbose_name_plural = 'Термы отзывов'
+        constraints = [
+            models.UniqueConstraint(fields=['review', 'term'], name='unique_review_term'),
+        ]
+        indexes = [
+            models.Index(fields=['term', 'room']),
+        ]
+
+
+class SearchTrigram(models.Model):
+    """
+    Триграммы строковых полей для поиска подстроки (bookings.substring),
+    когда база не поддерживает триграммные индексы. field - метка
+    '<модель>.<поле>', object_id - id объекта этой модели.
+    """
+    field = models.CharField(max_length=64)
+    object_id = models.PositiveBigIntegerField()
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        verbose_name = 'Триграмма'
+        verbose_name_plural = 'Триграммы'
+        constraints = [
+            models.UniqueConstraint(fields=['field', 'object_id', 'trigram'], name='unique_search_trigram'),
+        ]
+        indexes = [
+            models.Index(fields=['field', 'trigram', 'object_id'], name='search_trigram_idx'),
+        ]
+
 class SliderImage(models.Model):
     image = models.ImageField(upload_to='slider_images/')
     title = models.CharField(max_length=200, blank=True)
@@ -902,10 +1154,8 @@ class RoomSpecialOffer(models.Model):
 
     def get_discounted_price(self):
         """Возвращает цену со скидкой"""
-        if self.discount_percentage > 0:
-            discount_amount = self.room.price_per_night * (self.discount_percentage / 100)
-            return self.room.price_per_night - discount_amount
-        return self.room.price_per_night
+        from .pricing import discounted_price
+        return discounted_price(self.room.price_per_night, self.discount_percentage)
 
     def get_discount_amount(self):
         """Возвращает сумму скидки"""
@@ -995,6 +1245,14 @@ class Document(models.Model):
     )
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    # Метаданные файла извлекаются при загрузке (bookings.file_metadata)
+    file_size = models.BigIntegerField(null=True, blank=True, editable=False, verbose_name='Размер, байт')
+    mime_type = models.CharField(max_length=100, blank=True, editable=False, verbose_name='MIME-тип')
+    checksum = models.CharField(max_length=64, blank=True, editable=False, verbose_name='SHA-256')
+    page_count = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Страниц')
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Ширина')
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Высота')
     
     class Meta:
         ordering = ['-uploaded_at']
@@ -1004,10 +1262,33 @@ class Document(models.Model):
             models.Index(fields=['file_type']),
             models.Index(fields=['is_public']),
             models.Index(fields=['uploaded_at']),
+            models.Index(fields=['-uploaded_at', '-id'], name='document_keyset_idx'),
+            models.Index(fields=['mime_type', 'file_size'], name='document_mime_size_idx'),
+            models.Index(fields=['file_size'], name='document_size_idx'),
+            models.Index(fields=['checksum'], name='document_checksum_idx'),
         ]
     
     def __str__(self):
         return f"{self.title} ({self.get_file_type_display()})"
+
+    def save(self, *args, **kwargs):
+        # Новый файл или документ без метаданных: читаем файл один раз здесь,
+        # а не stat хранилища при каждом показе
+        if self.file and (not self.file._committed or self.file_size is None):
+            from .file_metadata import METADATA_FIELDS, field_file_metadata
+
+            try:
+                metadata = field_file_metadata(self.file)
+            except OSError as e:
+                # Пропавший файл не мешает редактировать документ: метаданные
+                # остаются пустыми, как в backfill_document_metadata
+                logger.warning('Документ %s: %s - %s', self.pk, self.file.name, e)
+            else:
+                for field, value in metadata.items():
+                    setattr(self, field, value)
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], *METADATA_FIELDS}
+        super().save(*args, **kwargs)
     
     def get_file_extension(self):
         """Возвращает расширение файла"""
@@ -1017,6 +1298,8 @@ class Document(models.Model):
     
     def get_file_size(self):
         """Возвращает размер файла в байтах"""
+        if self.file_size is not None:
+            return self.file_size
         if self.file and hasattr(self.file, 'size'):
             return self.file.size
         return 0
@@ -1032,11 +1315,15 @@ class Document(models.Model):
     
     def is_image(self):
         """Проверяет, является ли файл изображением"""
+        if self.mime_type:
+            return self.mime_type.startswith('image/')
         image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
         return self.get_file_extension() in image_extensions
     
     def is_pdf(self):
         """Проверяет, является ли файл PDF"""
+        if self.mime_type:
+            return self.mime_type == 'application/pdf'
         return self.get_file_extension() == 'pdf'
     
     def get_download_url(self):
@@ -1049,4 +1336,210 @@ class Document(models.Model):
             return self.file.url
         elif self.is_pdf():
             return self.file.url
-        return None
\ No newline at end of file
+        return None
+
+
+class ReportJob(models.Model):
+    """Задание на фоновую генерацию PDF-отчёта"""
+
+    REPORT_KINDS = [
+        ('room_statistics', 'Статистика комнат'),
+        ('monthly_report', 'Месячный отчет'),
+        ('booking_report', 'Отчет по бронированиям'),
+        ('special_offers_report', 'Отчет по специальным предложениям'),
+    ]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    JOB_STATUS = [
+        (STATUS_QUEUED, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+    IN_FLIGHT = (STATUS_QUEUED, STATUS_RUNNING)
+
+    kind = models.CharField(max_length=50, choices=REPORT_KINDS, verbose_name='Тип отчета')
+    params = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    key = models.CharField(max_length=64, verbose_name='Ключ отчета')
+    status = models.CharField(
+        max_length=20,
+        choices=JOB_STATUS,
+        default=STATUS_QUEUED,
+        verbose_name='Статус'
+    )
+    file = models.FileField(upload_to='reports/%Y/%m/%d/', blank=True, null=True, verbose_name='Файл')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    is_stale = models.BooleanField(
+        default=False,
+        verbose_name='Устарел',
+        help_text='Данные изменились во время или после генерации отчета'
+    )
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Запросил'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Задание отчета'
+        verbose_name_plural = 'Задания отчетов'
+        constraints = [
+            # Одинаковый отчет не может быть поставлен в очередь дважды;
+            # устаревшее выполняющееся задание не мешает поставить новое
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(status__in=['queued', 'running'], is_stale=False),
+                name='unique_in_flight_report'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['key', 'status']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+
+class ImageSource(models.Model):
+    """
+    Загруженное изображение (фото комнаты, слайд, предложение) в очереди
+    на построение производных: уменьшенных копий в WebP/AVIF (bookings.images).
+    """
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    JOB_STATUS = [
+        (STATUS_QUEUED, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=255, unique=True, verbose_name='Файл в хранилище')
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name='SHA-256 содержимого')
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default=STATUS_QUEUED, verbose_name='Статус')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Исходное изображение'
+        verbose_name_plural = 'Исходные изображения'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+
+class ImageDerivative(models.Model):
+    """
+    Уменьшенная копия изображения. Адресуется содержимым исходника:
+    одинаковые файлы, загруженные под разными именами, делят производные.
+    """
+    content_hash = models.CharField(max_length=64)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(max_length=255)
+    size = models.PositiveIntegerField(verbose_name='Размер, байт')
+
+    class Meta:
+        ordering = ['content_hash', 'format', 'width']
+        verbose_name = 'Производное изображение'
+        verbose_name_plural = 'Производные изображения'
+        constraints = [
+            models.UniqueConstraint(fields=['content_hash', 'format', 'width'], name='unique_image_derivative'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} {self.width}w {self.format}"
+
+
+class UploadSession(models.Model):
+    """
+    Пакетная загрузка документов (bookings.uploads): общие параметры
+    документов и прогресс файлов для опроса клиентом.
+    """
+
+    STATUS_UPLOADING = 'uploading'
+    STATUS_STORING = 'storing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    SESSION_STATUS = [
+        (STATUS_UPLOADING, 'Загрузка файлов'),
+        (STATUS_STORING, 'Сохранение'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    file_type = models.CharField(max_length=20, choices=Document.DOCUMENT_TYPES, default='other')
+    is_public = models.BooleanField(default=False)
+    description_template = models.CharField(max_length=500, blank=True)
+    status = models.CharField(max_length=20, choices=SESSION_STATUS, default=STATUS_UPLOADING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Пакетная загрузка'
+        verbose_name_plural = 'Пакетные загрузки'
+
+    def __str__(self):
+        return f"Загрузка #{self.pk} ({self.get_status_display()})"
+
+
+class UploadItem(models.Model):
+    """Файл пакетной загрузки: сколько байт получено и чем закончилось сохранение"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_RECEIVED = 'received'
+    STATUS_STORED = 'stored'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    ITEM_STATUS = [
+        (STATUS_PENDING, 'Ожидает данных'),
+        (STATUS_RECEIVED, 'Получен'),
+        (STATUS_STORED, 'Сохранен в хранилище'),
+        (STATUS_DONE, 'Документ создан'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='items')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    stored_name = models.CharField(max_length=255, blank=True)
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=20, choices=ITEM_STATUS, default=STATUS_PENDING)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Файл пакетной загрузки'
+        verbose_name_plural = 'Файлы пакетной загрузки'
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
@@ -0,0 +1,278 @@
+# bookings/pagination.py
+"""
+Постраничная выдача для дополнительных действий вьюсетов.
+
+Действия (available, past, ...) отдают страницы через настроенный
+DEFAULT_PAGINATION_CLASS, как и стандартный list. Для выгрузок большого
+объема есть потоковый режим (?stream=1): queryset читается блоками через
+серверный итератор, каждый блок сериализуется отдельно, и ответ уходит
+частями в виде одного JSON-массива, поэтому память не зависит от числа строк.
+
+KeysetPagination - постраничная выдача по курсору для длинных лент
+(бронирования, отзывы, платежи, документы). Вместо OFFSET запрос начинается
+с позиции последней строки предыдущей страницы по столбцам сортировки и id,
+поэтому 5000-я страница стоит столько же, сколько первая. Курсор непрозрачен
+(base64 от JSON с позицией), COUNT(*) выполняется только по ?count=1.
+Столбцы сортировки должны быть NOT NULL.
+"""
+import base64
+import binascii
+import datetime
+import json
+from itertools import islice
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+STREAM_PARAM = 'stream'
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_stream(request):
+    return request.query_params.get(STREAM_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+def iter_chunks(queryset, size):
+    iterator = queryset.iterator(chunk_size=size)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_json_array(queryset, serializer_class, context, chunk_size=STREAM_CHUNK_SIZE):
+    """Генератор частей JSON-массива: блок строк сериализуется за раз"""
+    encoder = JSONEncoder(ensure_ascii=False)
+    yield '['
+    first = True
+    for chunk in iter_chunks(queryset, chunk_size):
+        for item in serializer_class(chunk, many=True, context=context).data:
+            yield ('' if first else ',') + encoder.encode(item)
+            first = False
+    yield ']'
+
+
+class PaginatedActionsMixin:
+    """Единая выдача списков из дополнительных действий вьюсета"""
+
+    def list_response(self, queryset, serializer_class=None, context=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        context = {**self.get_serializer_context(), **(context or {})}
+        if wants_stream(self.request):
+            return StreamingHttpResponse(
+                stream_json_array(queryset, serializer_class, context),
+                content_type='application/json'
+            )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = serializer_class(page, many=True, context=context)
+            return self.get_paginated_response(serializer.data)
+        serializer = serializer_class(queryset, many=True, context=context)
+        return Response(serializer.data)
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или выдан для другой сортировки"""
+
+
+def local_field(model, name):
+    """Собственное поле модели, пригодное для сравнения в курсоре, или None"""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.concrete or field.is_relation:
+        return None
+    return field
+
+
+def keyset_ordering(queryset):
+    """
+    Сортировка queryset с id в конце для однозначности позиции.
+    Сортировки по выражениям, аннотациям и связанным полям курсор не
+    поддерживает - для них берется Meta.ordering модели.
+    """
+    model = queryset.model
+    ordering = queryset.query.order_by or model._meta.ordering
+    if not all(isinstance(item, str) and local_field(model, item.lstrip('-')) for item in ordering):
+        ordering = [item for item in model._meta.ordering
+                    if isinstance(item, str) and local_field(model, item.lstrip('-'))]
+    ordering = list(ordering)
+    if not any(item.lstrip('-') == model._meta.pk.name for item in ordering):
+        desc = ordering[0].startswith('-') if ordering else False
+        ordering.append(('-' if desc else '') + model._meta.pk.name)
+    return tuple(ordering)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Время с микросекундами: DjangoJSONEncoder округляет до миллисекунд"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(ordering, values, reverse=False):
+    payload = json.dumps({'o': ordering, 'v': values, 'r': reverse}, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Позиция (значения столбцов сортировки) и направление из курсора"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if payload['o'] != list(ordering) or len(payload['v']) != len(ordering):
+            raise InvalidCursor('Курсор выдан для другой сортировки')
+        values = [
+            local_field(model, name.lstrip('-')).to_python(value)
+            for name, value in zip(ordering, payload['v'])
+        ]
+        return values, bool(payload['r'])
+    except InvalidCursor:
+        raise
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError) as e:
+        raise InvalidCursor('Неверный курсор') from e
+
+
+def position_filter(ordering, values, reverse=False):
+    """
+    Строки строго после позиции в порядке ordering (до нее при reverse).
+    Условие на первый столбец вынесено отдельно, чтобы база могла
+    сканировать диапазон индекса, а не проверять OR для каждой строки.
+    """
+    def lookup(item, strict):
+        desc = item.startswith('-') != reverse
+        return f"{item.lstrip('-')}__{'lt' if desc else 'gt'}{'' if strict else 'e'}"
+
+    names = [item.lstrip('-') for item in ordering]
+    after = Q()
+    for i in reversed(range(len(ordering))):
+        step = Q(**{lookup(ordering[i], True): values[i]})
+        after = step if i == len(ordering) - 1 else step | (Q(**{names[i]: values[i]}) & after)
+    return Q(**{lookup(ordering[0], False): values[0]}) & after
+
+
+def reverse_ordering(ordering):
+    return tuple(item[1:] if item.startswith('-') else '-' + item for item in ordering)
+
+
+class KeysetPage:
+    """Строки страницы и курсоры соседних страниц"""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    # Совместимость с django.core.paginator.Page в шаблонах
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def keyset_page(queryset, cursor=None, page_size=api_settings.PAGE_SIZE):
+    """Страница queryset, начиная с позиции курсора (первая страница без него)"""
+    ordering = keyset_ordering(queryset)
+    reverse = False
+    if cursor:
+        values, reverse = decode_cursor(cursor, queryset.model, ordering)
+        queryset = queryset.filter(position_filter(ordering, values, reverse))
+    queryset = queryset.order_by(*(reverse_ordering(ordering) if reverse else ordering))
+
+    # Лишняя строка показывает, есть ли страница дальше
+    items = list(queryset[:page_size + 1])
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if reverse:
+        items.reverse()
+
+    def position(obj, backwards):
+        return encode_cursor(ordering, [getattr(obj, item.lstrip('-')) for item in ordering], backwards)
+
+    if not items:
+        return KeysetPage(items)
+    has_next = has_more if not reverse else True
+    has_previous = has_more if reverse else bool(cursor)
+    return KeysetPage(
+        items,
+        next_cursor=position(items[-1], False) if has_next else None,
+        previous_cursor=position(items[0], True) if has_previous else None,
+    )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация DRF: {next, previous, results} и count по ?count=1.
+    Сортировка берется из queryset (в т.ч. после OrderingFilter).
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = keyset_page(
+                queryset, request.query_params.get(self.cursor_query_param), self.get_page_size(request)
+            )
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        wants_count = request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+        self.count = queryset.count() if wants_count else None
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload.update({
+            'next': self.get_link(self.page.next_cursor),
+            'previous': self.get_link(self.page.previous_cursor),
+            'results': data,
+        })
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,7 +1,10 @@
 # bookings/pdf_utils.py
 
 import io
+import logging
+import os
 from datetime import datetime
+from functools import lru_cache
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -13,9 +16,13 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 from reportlab.rl_config import defaultPageSize
+from django.conf import settings
 from django.http import HttpResponse
 from django.utils import timezone
 from .models import Room, Booking, Payment, Review, SpecialOffer
+from .pricing import booking_totals, current_rates
+
+logger = logging.getLogger(__name__)
 
 # Функция для безопасного отображения русского текста
 def safe_text(text):
@@ -67,36 +74,42 @@ def get_text_for_pdf(text, use_transliteration=False):
         return safe_text(text)
 
 # Настройка шрифтов для поддержки кириллицы
+def register_font(font):
+    """Регистрирует шрифт и возвращает его имя или None, если шрифт недоступен"""
+    try:
+        pdfmetrics.registerFont(font)
+    except Exception as e:
+        logger.debug('Шрифт %s недоступен: %s', font.fontName, e)
+        return None
+    return font.fontName
+
+
 def setup_fonts():
     """Настраивает шрифты для поддержки кириллицы"""
-    try:
-        # Попытка использовать встроенный Unicode шрифт
-        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-        pdfmetrics.registerFont(UnicodeCIDFont('STSong-Light'))
-        return 'STSong-Light'
-    except:
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+
+    candidates = (
+        # Встроенные Unicode шрифты
+        lambda: UnicodeCIDFont('STSong-Light'),
+        lambda: UnicodeCIDFont('HeiseiMin-W3'),
+        # TTF шрифты из путей поиска ReportLab
+        lambda: TTFont('DejaVuSans', 'DejaVuSans.ttf'),
+        lambda: TTFont('Arial', 'arial.ttf'),
+    )
+    for candidate in candidates:
         try:
-            # Попытка использовать другой Unicode шрифт
-            from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-            pdfmetrics.registerFont(UnicodeCIDFont('HeiseiMin-W3'))
-            return 'HeiseiMin-W3'
-        except:
-            try:
-                # Попытка зарегистрировать TTF шрифт
-                pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-                return 'DejaVuSans'
-            except:
-                try:
-                    # Альтернативный шрифт
-                    pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
-                    return 'Arial'
-                except:
-                    # Если шрифты не найдены, используем стандартный
-                    return 'Helvetica'
+            font = candidate()
+        except Exception as e:
+            logger.debug('Шрифт недоступен: %s', e)
+            continue
+        font_name = register_font(font)
+        if font_name:
+            return font_name
+    # Если шрифты не найдены, используем стандартный
+    return 'Helvetica'
 
 def setup_windows_fonts():
     """Настраивает шрифты Windows для поддержки кириллицы"""
-    import os
     import platform
     
     if platform.system() == 'Windows':
@@ -111,17 +124,38 @@ def setup_windows_fonts():
         for font_path in font_paths:
             if os.path.exists(font_path):
                 try:
-                    font_name = os.path.splitext(os.path.basename(font_path))[0]
-                    pdfmetrics.registerFont(TTFont(font_name, font_path))
-                    return font_name
-                except:
+                    font = TTFont(os.path.splitext(os.path.basename(font_path))[0], font_path)
+                except Exception as e:
+                    logger.debug('Шрифт %s недоступен: %s', font_path, e)
                     continue
+                font_name = register_font(font)
+                if font_name:
+                    return font_name
     
     # Если Windows шрифты не найдены, используем стандартную настройку
     return setup_fonts()
 
-# Инициализируем шрифт
-DEFAULT_FONT = setup_windows_fonts()
+@lru_cache(maxsize=None)
+def get_default_font():
+    """
+    Возвращает имя шрифта для PDF. Шрифт ищется при первом построении
+    документа и запоминается на время жизни процесса. Явный путь
+    settings.PDF_FONT_PATH отключает перебор системных шрифтов.
+    """
+    font_path = getattr(settings, 'PDF_FONT_PATH', None)
+    if font_path:
+        font_name = getattr(settings, 'PDF_FONT_NAME', None) or os.path.splitext(os.path.basename(font_path))[0]
+        # Ошибка в явно указанном шрифте не маскируется перебором
+        pdfmetrics.registerFont(TTFont(font_name, str(font_path)))
+        return font_name
+    return setup_windows_fonts()
+
+
+def __getattr__(name):
+    # Совместимость: DEFAULT_FONT раньше вычислялся при импорте модуля
+    if name == 'DEFAULT_FONT':
+        return get_default_font()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class PDFGenerator:
@@ -130,6 +164,7 @@ class PDFGenerator:
         self.doc = SimpleDocTemplate(self.buffer, pagesize=A4)
         self.styles = getSampleStyleSheet()
         self.story = []
+        self.font = get_default_font()
         
         # Создаем кастомные стили с поддержкой кириллицы
         self.title_style = ParagraphStyle(
@@ -139,7 +174,7 @@ class PDFGenerator:
             spaceAfter=30,
             alignment=TA_CENTER,
             textColor=colors.darkblue,
-            fontName=DEFAULT_FONT
+            fontName=self.font
         )
         
         self.subtitle_style = ParagraphStyle(
@@ -148,7 +183,7 @@ class PDFGenerator:
             fontSize=14,
             spaceAfter=20,
             textColor=colors.darkgreen,
-            fontName=DEFAULT_FONT
+            fontName=self.font
         )
         
         self.header_style = ParagraphStyle(
@@ -157,14 +192,14 @@ class PDFGenerator:
             fontSize=12,
             spaceAfter=10,
             textColor=colors.black,
-            fontName=DEFAULT_FONT
+            fontName=self.font
         )
         
         # Обновляем стандартные стили для поддержки кириллицы
-        self.styles['Normal'].fontName = DEFAULT_FONT
-        self.styles['Heading1'].fontName = DEFAULT_FONT
-        self.styles['Heading2'].fontName = DEFAULT_FONT
-        self.styles['Heading3'].fontName = DEFAULT_FONT
+        self.styles['Normal'].fontName = self.font
+        self.styles['Heading1'].fontName = self.font
+        self.styles['Heading2'].fontName = self.font
+        self.styles['Heading3'].fontName = self.font
 
     def add_title(self, title):
         """Добавляет заголовок документа"""
@@ -203,12 +238,12 @@ class PDFGenerator:
             ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), DEFAULT_FONT),
+            ('FONTNAME', (0, 0), (-1, 0), self.font),
             ('FONTSIZE', (0, 0), (-1, 0), 12),
             ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
             ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
             ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), DEFAULT_FONT),
+            ('FONTNAME', (0, 1), (-1, -1), self.font),
             ('FONTSIZE', (0, 1), (-1, -1), 10),
             ('GRID', (0, 0), (-1, -1), 1, colors.black),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -308,9 +343,10 @@ def generate_room_statistics_pdf_unicode():
         headers = ['Номер', 'Тип', 'Обычная цена', 'Цена со скидкой', 'Макс. скидка']
         data = []
         
+        rates = current_rates(rooms_with_offers)
         for room in rooms_with_offers:
-            current_price = room.get_current_price_with_discount()
-            max_discount = room.get_max_discount_percentage()
+            current_price = rates[room.id]['price']
+            max_discount = rates[room.id]['discount_percentage']
             
             data.append([
                 room.room_number,
@@ -394,9 +430,10 @@ def generate_room_statistics_pdf_translit():
         headers = ['Nomer', 'Tip', 'Obychnaya tsena', 'Tsena so skidkoy', 'Maks. skidka']
         data = []
         
+        rates = current_rates(rooms_with_offers)
         for room in rooms_with_offers:
-            current_price = room.get_current_price_with_discount()
-            max_discount = room.get_max_discount_percentage()
+            current_price = rates[room.id]['price']
+            max_discount = rates[room.id]['discount_percentage']
             
             data.append([
                 room.room_number,
@@ -535,9 +572,10 @@ def generate_room_statistics_html_pdf():
                     </tr>
             """
             
+            rates = current_rates(rooms_with_offers)
             for room in rooms_with_offers:
-                current_price = room.get_current_price_with_discount()
-                max_discount = room.get_max_discount_percentage()
+                current_price = rates[room.id]['price']
+                max_discount = rates[room.id]['discount_percentage']
                 
                 html_content += f"""
                     <tr>
@@ -668,7 +706,8 @@ def generate_booking_report_pdf():
     # Последние бронирования
     generator.add_subtitle("Последние бронирования")
     
-    recent_bookings = Booking.objects.select_related('guest', 'room').order_by('-created_at')[:20]
+    recent_bookings = list(Booking.objects.select_related('guest', 'room').order_by('-created_at')[:20])
+    booking_totals(recent_bookings)
     
     headers = ['Гость', 'Комната', 'Заезд', 'Выезд', 'Статус', 'Сумма']
     data = []
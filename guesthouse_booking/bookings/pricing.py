@@ -0,0 +1,232 @@
+# bookings/pricing.py
+"""
+Цены ночей с учетом специальных предложений.
+
+Календарь цен (RoomRate) хранит для каждой комнаты дни, покрытые
+активными RoomSpecialOffer, и цену ночи по предложению с максимальной
+скидкой. Сигналы перестраивают календарь комнаты при изменении её
+предложений или цены (сохранение комнаты без смены цены календарь не
+трогает), команда rebuild_room_rates - целиком. Цены любого
+набора комнат на любой интервал читаются одним запросом по индексу
+(date, room); дни без строки стоят price_per_night.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import to_date
+from .models import Room, RoomRate, RoomSpecialOffer
+
+CENT = Decimal('0.01')
+
+
+def discounted_price(price, discount_percentage):
+    """Цена со скидкой, округлённая до копеек"""
+    price = Decimal(price)
+    discount = price * Decimal(discount_percentage) / 100
+    return (price - discount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _uncovered(intervals, start, end):
+    """Участки [start, end], не покрытые отсортированными интервалами"""
+    cursor = start
+    for covered_start, covered_end in intervals:
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            yield cursor, covered_start - timedelta(days=1)
+        cursor = max(cursor, covered_end + timedelta(days=1))
+    if cursor <= end:
+        yield cursor, end
+
+
+def _collect_rates(offers, prices):
+    """
+    Строки календаря: на каждый день - предложение с максимальной скидкой.
+    Предложения идут по убыванию скидки и занимают ещё свободные участки
+    своего интервала целиком; цена считается один раз на предложение.
+    """
+    # Сортировка устойчива: при равной скидке побеждает более новое (Meta.ordering)
+    offers = sorted(offers, key=lambda offer: -offer.discount_percentage)
+    covered = defaultdict(list)
+    rows = []
+    for offer in offers:
+        price = discounted_price(prices[offer.room_id], offer.discount_percentage)
+        intervals = covered[offer.room_id]
+        for start, end in list(_uncovered(intervals, offer.start_date, offer.end_date)):
+            rows.extend(
+                RoomRate(
+                    room_id=offer.room_id, date=start + timedelta(days=i), offer_id=offer.id,
+                    discount_percentage=offer.discount_percentage, price=price,
+                )
+                for i in range((end - start).days + 1)
+            )
+        insort(intervals, (offer.start_date, offer.end_date))
+    return rows
+
+
+def rebuild_rates(room_ids=None):
+    """Перестраивает календарь цен (всех или указанных комнат)"""
+    rooms = Room.objects.all()
+    # При равной скидке действует более новое предложение (Meta.ordering)
+    offers = RoomSpecialOffer.objects.filter(is_active=True)
+    rates = RoomRate.objects.all()
+    if room_ids is not None:
+        rooms = rooms.filter(id__in=room_ids)
+        offers = offers.filter(room_id__in=room_ids)
+        rates = rates.filter(room_id__in=room_ids)
+
+    prices = dict(rooms.values_list('id', 'price_per_night'))
+    rows = _collect_rates(
+        offers.only('id', 'room_id', 'start_date', 'end_date', 'discount_percentage'),
+        prices,
+    )
+    with transaction.atomic():
+        rates.delete()
+        RoomRate.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def refresh_room_rates(room_id):
+    """Перестраивает календарь цен одной комнаты"""
+    return rebuild_rates(room_ids=[room_id])
+
+
+def _rates(room_ids, dates):
+    """{room_id: {день: (цена, скидка, offer_id)}} одним запросом"""
+    rates = defaultdict(dict)
+    if not room_ids or not dates:
+        return rates
+    for room_id, day, price, discount, offer_id in RoomRate.objects.filter(
+        room_id__in=room_ids, date__gte=min(dates), date__lte=max(dates)
+    ).values_list('room_id', 'date', 'price', 'discount_percentage', 'offer_id'):
+        rates[room_id][day] = (price, discount, offer_id)
+    return rates
+
+
+def night_prices(room, dates):
+    """{день: цена ночи} комнаты по календарю цен; дни без строки - price_per_night"""
+    dates = list(dates)
+    rates = _rates([room.id], dates)[room.id]
+    return {day: rates[day][0] if day in rates else room.price_per_night for day in dates}
+
+
+def current_rates(rooms, day=None):
+    """Цена ночи, скидка и действующее предложение на день (по умолчанию сегодня)"""
+    day = day or timezone.now().date()
+    rooms = list(rooms)
+    rates = _rates([room.id for room in rooms], [day])
+    result = {}
+    for room in rooms:
+        price, discount, offer_id = rates[room.id].get(day, (room.price_per_night, 0, None))
+        result[room.id] = {'price': price, 'discount_percentage': discount, 'offer_id': offer_id}
+    return result
+
+
+def _rate_rows(room_ids, start, end):
+    """Строки календаря комнат в интервале [start, end) по порядку дат"""
+    return RoomRate.objects.filter(
+        room_id__in=room_ids, date__gte=start, date__lt=end
+    ).order_by('room_id', 'date').values_list('room_id', 'date', 'price', 'discount_percentage')
+
+
+def _segments(base_price, check_in, check_out, rows):
+    """
+    Разбивка проживания на периоды с одинаковой ценой ночи.
+    Идёт по строкам календаря, а не по ночам: промежутки между ними
+    заполняются базовой ценой одним периодом.
+    """
+    segments = []
+
+    def add(start, end, price, discount):
+        last = segments[-1] if segments else None
+        if last and last['end'] == start and last['price'] == price and last['discount_percentage'] == discount:
+            last['end'] = end
+        else:
+            segments.append({'start': start, 'end': end, 'price': price, 'discount_percentage': discount})
+
+    cursor = check_in
+    for day, price, discount in rows:
+        if day > cursor:
+            add(cursor, day, base_price, Decimal('0'))
+        add(day, day + timedelta(days=1), price, discount)
+        cursor = day + timedelta(days=1)
+    if cursor < check_out:
+        add(cursor, check_out, base_price, Decimal('0'))
+    for segment in segments:
+        segment['nights'] = (segment['end'] - segment['start']).days
+        segment['subtotal'] = segment['price'] * segment['nights']
+    return segments
+
+
+def quote_rooms(rooms, check_in, check_out):
+    """
+    Стоимость проживания [check_in, check_out) для набора комнат одним
+    запросом: периоды с ценой ночи, итог без скидок, итог и сумма скидки.
+    """
+    check_in, check_out = to_date(check_in), to_date(check_out)
+    nights = max((check_out - check_in).days, 0)
+    rooms = list(rooms)
+    rows = defaultdict(list)
+    if rooms and nights:
+        for room_id, day, price, discount in _rate_rows([room.id for room in rooms], check_in, check_out):
+            rows[room_id].append((day, price, discount))
+    quotes = {}
+    for room in rooms:
+        segments = _segments(room.price_per_night, check_in, check_out, rows[room.id]) if nights else []
+        base_total = room.price_per_night * nights
+        total = sum((segment['subtotal'] for segment in segments), Decimal('0'))
+        quotes[room.id] = {
+            'nights': nights,
+            'base_total': base_total,
+            'total': total,
+            'discount_total': base_total - total,
+            'segments': segments,
+        }
+    return quotes
+
+
+def quote(room, check_in, check_out):
+    """Стоимость проживания в одной комнате"""
+    return quote_rooms([room], check_in, check_out)[room.id]
+
+
+def booking_totals(bookings):
+    """
+    Стоимость бронирований по календарю цен одним запросом:
+    базовая цена за все ночи минус скидки ночей, попавших в календарь.
+    Результат запоминается в бронированиях для Booking.total_price().
+    """
+    # Несохранённые бронирования не хешируются, поэтому список, а не словарь
+    stays = [
+        (booking, to_date(booking.check_in), to_date(booking.check_out))
+        for booking in bookings
+        if booking.check_in and booking.check_out and booking.room_id
+    ]
+    if not stays:
+        return {}
+    discounts = defaultdict(list)
+    for room_id, day, price, _ in _rate_rows(
+        {booking.room_id for booking, _, _ in stays},
+        min(check_in for _, check_in, _ in stays),
+        max(check_out for _, _, check_out in stays),
+    ):
+        discounts[room_id].append((day, price))
+
+    totals = {}
+    for booking, check_in, check_out in stays:
+        base_price = booking.room.price_per_night
+        dates = discounts[booking.room_id]
+        low, high = bisect_left(dates, (check_in,)), bisect_left(dates, (check_out,))
+        discount = sum((base_price - price for _, price in dates[low:high]), Decimal('0'))
+        total = base_price * (check_out - check_in).days - discount
+        # Ключ кэша - комната и даты: после их изменения цена считается заново
+        booking._total_price = ((booking.room_id, check_in, check_out), total)
+        totals[booking.pk] = total
+    return totals
@@ -0,0 +1,64 @@
+# bookings/report_worker.py
+"""
+Пул процессов фоновых заданий (PDF-отчёты, производные изображений) и
+точки входа для его процессов.
+
+Модуль не импортирует модели на верхнем уровне, чтобы его можно было
+загрузить в дочернем процессе до django.setup() (режим spawn в Windows).
+"""
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker():
+    django.setup()
+    # Соединения, унаследованные от родителя через fork, не используем
+    connections.close_all()
+
+
+def execute_job(job_id):
+    from .reports import run_job
+    try:
+        return run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def execute_image_job(source_id):
+    from .images import process_source
+    try:
+        return process_source(source_id)
+    finally:
+        connections.close_all()
+
+
+def serve_queue(claim_next, execute, processes, poll_interval=1.0, once=False):
+    """
+    Выполняет задания очереди в пуле процессов: claim_next() забирает id
+    следующего задания (None - очередь пуста), execute(id) выполняется в
+    дочернем процессе.
+    """
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker) as pool:
+        running = set()
+        while True:
+            while len(running) < processes:
+                job_id = claim_next()
+                if job_id is None:
+                    break
+                running.add(pool.submit(execute, job_id))
+            if not running:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+            done, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception():
+                    logger.error('Воркер завершился с ошибкой: %s', future.exception())
@@ -0,0 +1,172 @@
+# bookings/reports.py
+"""
+Очередь фоновой генерации PDF-отчётов.
+
+Брокером служит таблица ReportJob в основной базе, поэтому очередь работает
+без внешних сервисов. Админка ставит задание в очередь, воркер
+(manage.py run_report_worker) выполняет задания в пуле процессов, готовый
+PDF сохраняется в хранилище и отдаётся по ссылке. Одинаковые задания не
+дублируются, а готовый отчёт переиспользуется, пока данные не изменятся.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+
+def build_room_statistics():
+    """Статистика комнат: Unicode, затем HTML, затем транслитерация"""
+    from .pdf_utils import (
+        generate_room_statistics_pdf_unicode,
+        generate_room_statistics_html_pdf,
+        generate_room_statistics_pdf_translit,
+    )
+
+    generators = (
+        generate_room_statistics_pdf_unicode,
+        generate_room_statistics_html_pdf,
+        generate_room_statistics_pdf_translit,
+    )
+    for generator in generators[:-1]:
+        try:
+            return generator()
+        except Exception:
+            logger.exception('Ошибка генерации %s', generator.__name__)
+    return generators[-1]()
+
+
+# Генераторы указаны путями: ReportLab загружается только в воркере,
+# а не при импорте админки
+REPORT_BUILDERS = {
+    'room_statistics': 'bookings.reports.build_room_statistics',
+    'monthly_report': 'bookings.pdf_utils.generate_monthly_report_pdf',
+    'booking_report': 'bookings.pdf_utils.generate_booking_report_pdf',
+    'special_offers_report': 'bookings.pdf_utils.generate_special_offers_report_pdf',
+}
+
+
+# Модели, из которых строится каждый отчёт: их изменение делает отчёт устаревшим
+REPORT_SOURCES = {
+    'room_statistics': ('room', 'booking', 'review'),
+    'monthly_report': ('room', 'booking', 'review'),
+    'booking_report': ('room', 'booking', 'roomspecialoffer'),
+    'special_offers_report': ('room', 'specialoffer', 'roomspecialoffer'),
+}
+
+
+def report_key(kind, params):
+    """Ключ задания: одинаковые отчёты с одинаковыми параметрами совпадают"""
+    payload = json.dumps([kind, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def enqueue_report(kind, params=None, user=None):
+    """
+    Ставит отчёт в очередь. Возвращает уже выполняющееся задание с тем же
+    ключом или готовый актуальный отчёт, если он есть.
+    """
+    if kind not in REPORT_BUILDERS:
+        raise ValueError(f'Неизвестный тип отчета: {kind}')
+    params = params or {}
+    key = report_key(kind, params)
+
+    existing = ReportJob.objects.filter(key=key, is_stale=False).filter(
+        status__in=ReportJob.IN_FLIGHT
+    ).first() or ReportJob.objects.filter(
+        key=key, status=ReportJob.STATUS_DONE, is_stale=False
+    ).first()
+    if existing:
+        return existing
+
+    try:
+        with transaction.atomic():
+            job = ReportJob.objects.create(kind=kind, params=params, key=key, requested_by=user)
+    except IntegrityError:
+        # Такое же задание успели поставить параллельно
+        return ReportJob.objects.filter(key=key, is_stale=False).order_by('-created_at').first()
+
+    if getattr(settings, 'REPORT_JOBS_EAGER', False):
+        claim_job(job.pk)
+        run_job(job.pk)
+        job.refresh_from_db()
+    return job
+
+
+def claim_job(job_id):
+    """Атомарно переводит задание из очереди в работу"""
+    return ReportJob.objects.filter(
+        pk=job_id, status=ReportJob.STATUS_QUEUED
+    ).update(status=ReportJob.STATUS_RUNNING, started_at=timezone.now()) == 1
+
+
+def claim_next_job():
+    """Забирает самое старое задание из очереди, если оно есть"""
+    for job_id in ReportJob.objects.filter(
+        status=ReportJob.STATUS_QUEUED
+    ).order_by('created_at').values_list('pk', flat=True)[:10]:
+        if claim_job(job_id):
+            return job_id
+    return None
+
+
+def run_job(job_id):
+    """Генерирует отчёт для задания, которое уже находится в работе"""
+    job = ReportJob.objects.get(pk=job_id)
+    try:
+        response = import_string(REPORT_BUILDERS[job.kind])(**job.params)
+        filename = response['Content-Disposition'].split('filename=')[-1].strip('"')
+        job.file.save(filename, ContentFile(response.content), save=False)
+        job.status = ReportJob.STATUS_DONE
+        job.error = ''
+    except Exception as e:
+        logger.exception('Ошибка выполнения задания отчета %s', job_id)
+        job.status = ReportJob.STATUS_FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'error', 'finished_at'])
+    return job.status
+
+
+def _mark_stale(kinds):
+    # Выполняющиеся задания могли прочитать данные до изменения: их
+    # результат не переиспользуется
+    ReportJob.objects.filter(
+        kind__in=kinds, status__in=(ReportJob.STATUS_RUNNING, ReportJob.STATUS_DONE), is_stale=False
+    ).update(is_stale=True)
+
+
+def invalidate_reports(model_name):
+    """
+    Помечает устаревшими готовые и выполняющиеся отчёты, которые читают
+    изменённую модель. Отметка ставится сразу и ещё раз после фиксации
+    транзакции: задание, взятое в работу до коммита, видело старые данные.
+    """
+    kinds = [kind for kind, sources in REPORT_SOURCES.items() if model_name in sources]
+    if not kinds:
+        return
+    _mark_stale(kinds)
+    transaction.on_commit(lambda: _mark_stale(kinds))
+
+
+def requeue_stalled_jobs(older_than):
+    """Возвращает в очередь задания, зависшие после падения воркера"""
+    return ReportJob.objects.filter(
+        status=ReportJob.STATUS_RUNNING, started_at__lt=older_than
+    ).update(status=ReportJob.STATUS_QUEUED, started_at=None)
+
+
+def run_worker(processes=None, poll_interval=1.0, once=False):
+    """Выполняет задания из очереди в пуле процессов"""
+    from .report_worker import execute_job, serve_queue
+
+    processes = processes or getattr(settings, 'REPORT_WORKER_PROCESSES', 2)
+    serve_queue(claim_next_job, execute_job, processes, poll_interval, once)
@@ -0,0 +1,94 @@
+# bookings/rollups.py
+"""
+Дневные сводки по комнатам (RoomDailyStat).
+
+Строка сводки хранит для пары (комната, день): занята ли ночь подтверждённым
+бронированием, выручку за эту ночь (цена ночи RoomNight, зафиксированная
+при записи бронирования), число заездов и отзывы за день. Пустые
+дни не хранятся. Сигналы пересчитывают только затронутые дни, команда
+rebuild_daily_stats перестраивает таблицу целиком.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Booking, Review, Room, RoomDailyStat, RoomNight, SpecialOffer
+
+
+def review_day(review_date):
+    """День отзыва в текущем часовом поясе (как у TruncDate)"""
+    if timezone.is_aware(review_date):
+        return timezone.localtime(review_date).date()
+    return review_date.date()
+
+
+def _collect_rows(nights, bookings, reviews):
+    """Собирает строки сводки из занятых ночей, заездов и отзывов"""
+    rows = defaultdict(dict)
+    for room_id, night, price in nights.values_list('room_id', 'date', 'price'):
+        rows[room_id, night].update(occupied=True, revenue=price)
+    for row in bookings.values('room_id', 'check_in').annotate(total=Count('id')):
+        rows[row['room_id'], row['check_in']]['check_ins'] = row['total']
+    for row in reviews.annotate(day=TruncDate('review_date')).values('room_id', 'day').annotate(
+        total=Count('id'), ratings=Sum('rating')
+    ):
+        rows[row['room_id'], row['day']].update(
+            reviews_count=row['total'], rating_sum=row['ratings']
+        )
+    return [
+        RoomDailyStat(room_id=room_id, date=day, **values)
+        for (room_id, day), values in rows.items()
+    ]
+
+
+def refresh_room_days(room_id, dates):
+    """Пересчитывает сводку комнаты за указанные дни"""
+    dates = {day for day in dates if day is not None}
+    if not dates:
+        return
+    if not Room.objects.filter(pk=room_id).exists():
+        return
+    rows = _collect_rows(
+        RoomNight.objects.filter(room_id=room_id, date__in=dates, booking__status='confirmed'),
+        Booking.objects.filter(room_id=room_id, check_in__in=dates, status='confirmed').order_by(),
+        Review.objects.filter(room_id=room_id, review_date__date__in=dates).order_by(),
+    )
+    with transaction.atomic():
+        RoomDailyStat.objects.filter(room_id=room_id, date__in=dates).delete()
+        RoomDailyStat.objects.bulk_create(rows)
+
+
+def rebuild_daily_stats(room_ids=None):
+    """Полностью перестраивает дневные сводки (всех или указанных комнат)"""
+    nights = RoomNight.objects.filter(booking__status='confirmed')
+    bookings = Booking.objects.filter(status='confirmed').order_by()
+    reviews = Review.objects.order_by()
+    stats = RoomDailyStat.objects.all()
+    if room_ids is not None:
+        nights = nights.filter(room_id__in=room_ids)
+        bookings = bookings.filter(room_id__in=room_ids)
+        reviews = reviews.filter(room_id__in=room_ids)
+        stats = stats.filter(room_id__in=room_ids)
+
+    rows = _collect_rows(nights, bookings, reviews)
+    with transaction.atomic():
+        stats.delete()
+        RoomDailyStat.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def get_dashboard_totals():
+    """Итоговые показатели для дашборда админки"""
+    totals = RoomDailyStat.objects.aggregate(
+        total_bookings=Sum('check_ins'),
+        total_revenue=Sum('revenue'),
+    )
+    return {
+        'total_rooms': Room.objects.count(),
+        'total_bookings': totals['total_bookings'] or 0,
+        'active_offers': SpecialOffer.objects.filter(is_active=True).count(),
+        'total_revenue': f"{totals['total_revenue'] or 0:.0f}",
+    }
@@ -0,0 +1,193 @@
+# bookings/search.py
+"""
+Полнотекстовый поиск по отзывам с ранжированием комнат.
+
+Бэкенд выбирается по базе (настройка REVIEW_SEARCH_BACKEND, по умолчанию
+'auto'):
+- 'fts5' - SQLite: виртуальная таблица FTS5 с основами слов отзыва
+  (стеммер bookings.stemmer), релевантность по bm25;
+- 'postgresql' - to_tsvector('russian', comment) по GIN-индексу,
+  релевантность по ts_rank; стемминг делает сама база;
+- 'terms' - обратный индекс ReviewSearchTerm в любой базе, релевантность
+  по tf-idf.
+
+Слова запроса ищутся как префиксы основ и должны встретиться в одном
+отзыве все. Ранг комнаты - сумма рангов её подходящих отзывов. Индекс
+обновляется сигналами Review (для PostgreSQL не нужен), целиком
+перестраивается командой rebuild_review_search.
+"""
+import math
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+
+from .models import Review, ReviewSearchTerm
+from .stemmer import stem, term_counts, terms, tokenize
+
+FTS_TABLE = 'bookings_review_fts'
+
+
+@lru_cache(maxsize=None)
+def _fts5_table_exists(alias):
+    # Таблица не создаётся миграцией, если SQLite собран без FTS5
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def search_backend():
+    backend = getattr(settings, 'REVIEW_SEARCH_BACKEND', 'auto')
+    if backend != 'auto':
+        return backend
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite' and _fts5_table_exists(connection.alias):
+        return 'fts5'
+    return 'terms'
+
+
+def query_terms(keyword):
+    """
+    Основы слов запроса без повторов. Основа стеммируется повторно:
+    у разных форм слова основы бывают разной длины («персоналом» ->
+    «персонал», «персонал» -> «персона»), а более короткая находит
+    префиксом обе.
+    """
+    return list(dict.fromkeys(stem(term) for term in terms(keyword)))
+
+
+# Индексация
+
+def index_review(review):
+    """Добавляет или заменяет отзыв в индексе"""
+    backend = search_backend()
+    if backend == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [review.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, terms, room_id) VALUES (%s, %s, %s)',
+                [review.pk, ' '.join(terms(review.comment)), review.room_id],
+            )
+    elif backend == 'terms':
+        ReviewSearchTerm.objects.filter(review_id=review.pk).delete()
+        ReviewSearchTerm.objects.bulk_create(_review_terms(review.pk, review.room_id, review.comment))
+
+
+def unindex_review(review_id):
+    # Строки ReviewSearchTerm удаляются каскадом вместе с отзывом
+    if search_backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [review_id])
+
+
+def _review_terms(review_id, room_id, comment):
+    field = ReviewSearchTerm._meta.get_field('term')
+    return [
+        ReviewSearchTerm(review_id=review_id, room_id=room_id, term=term[:field.max_length], frequency=min(count, 32767))
+        for term, count in term_counts(comment).items()
+    ]
+
+
+def rebuild_review_index(batch_size=1000):
+    """Перестраивает индекс текущего бэкенда по всем отзывам, возвращает их число"""
+    backend = search_backend()
+    reviews = Review.objects.order_by().values_list('id', 'room_id', 'comment')
+    if backend == 'fts5':
+        count = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            rows = (
+                (pk, ' '.join(terms(comment)), room_id)
+                for pk, room_id, comment in reviews.iterator(chunk_size=batch_size)
+            )
+            while batch := list(islice(rows, batch_size)):
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, terms, room_id) VALUES (%s, %s, %s)', batch)
+                count += len(batch)
+        return count
+    if backend == 'terms':
+        ReviewSearchTerm.objects.all().delete()
+        count, batch = 0, []
+        for pk, room_id, comment in reviews.iterator(chunk_size=batch_size):
+            batch.extend(_review_terms(pk, room_id, comment))
+            count += 1
+            if len(batch) >= batch_size:
+                ReviewSearchTerm.objects.bulk_create(batch)
+                batch = []
+        ReviewSearchTerm.objects.bulk_create(batch)
+        return count
+    return reviews.count()
+
+
+# Поиск
+
+def _fts5_ranks(stems):
+    # bm25 отрицателен: чем меньше, тем релевантнее
+    match = ' '.join('"{}"*'.format(stem.replace('"', '""')) for stem in stems)
+    with connection.cursor() as cursor:
+        # bm25() доступна только в самом запросе MATCH: без MATERIALIZED
+        # SQLite встроит подзапрос в GROUP BY и откажется её вычислять
+        cursor.execute(
+            f'WITH matched AS MATERIALIZED ('
+            f'SELECT room_id, -bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+            f') SELECT room_id, SUM(score) FROM matched GROUP BY room_id',
+            [match],
+        )
+        return dict(cursor.fetchall())
+
+
+def _postgresql_ranks(keyword):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    words = list(dict.fromkeys(tokenize(keyword)))
+    if not words:
+        return {}
+    # Выражение совпадает с GIN-индексом review_comment_search_idx
+    vector = SearchVector('comment', config='russian')
+    query = SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config='russian')
+    rows = Review.objects.annotate(search=vector).filter(search=query).order_by().values('room_id').annotate(
+        score=Sum(SearchRank(vector, query))
+    )
+    return {row['room_id']: row['score'] for row in rows}
+
+
+def _terms_ranks(stems):
+    total = Review.objects.count()
+    scores = None
+    rooms = {}
+    for stem in stems:
+        matched = defaultdict(int)
+        for review_id, room_id, frequency in ReviewSearchTerm.objects.filter(
+            term__startswith=stem
+        ).values_list('review_id', 'room_id', 'frequency'):
+            matched[review_id] += frequency
+            rooms[review_id] = room_id
+        if not matched:
+            return {}
+        idf = math.log(1 + total / len(matched))
+        # В отзыве должны встретиться все слова запроса
+        scores = {
+            review_id: (scores[review_id] if scores is not None else 0) + frequency * idf
+            for review_id, frequency in matched.items()
+            if scores is None or review_id in scores
+        }
+    ranks = defaultdict(float)
+    for review_id, score in (scores or {}).items():
+        ranks[rooms[review_id]] += score
+    return dict(ranks)
+
+
+def rank_rooms(keyword):
+    """{room_id: ранг} комнат, в отзывах которых встречается запрос"""
+    backend = search_backend()
+    if backend == 'postgresql':
+        return _postgresql_ranks(keyword)
+    stems = query_terms(keyword)
+    if not stems:
+        return {}
+    if backend == 'fts5':
+        return _fts5_ranks(stems)
+    return _terms_ranks(stems)
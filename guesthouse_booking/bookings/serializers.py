@@ -1,10 +1,17 @@
 from rest_framework import serializers
-from .models import Room, Booking, Review, Amenity, SliderImage, SpecialOffer, Guest, Payment, UserRole
+from .models import Room, Booking, Review, Amenity, SliderImage, SpecialOffer, Guest, Payment, UserRole, UploadItem, UploadSession
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Avg
+from django.db import models
+from django.db.models import Avg, Count, Q
 from decimal import Decimal
+from string import Formatter
+from .services import save_booking
+from .pricing import booking_totals, current_rates, quote, quote_rooms
+from .images import IMAGE_FIELDS, image_variants
+from .uploads import start_session
 
 class UserRoleSerializer(serializers.ModelSerializer):
     """Сериализатор для модели UserRole."""
@@ -38,50 +45,33 @@ class GuestSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def collect_statistics(self, obj):
+        """Статистика гостя, вычисленная один раз на объект"""
+        if not hasattr(self, '_statistics'):
+            self._statistics = {}
+        if obj.pk not in self._statistics:
+            if hasattr(obj, 'stat_total_bookings'):
+                # Гости ProfileViewSet уже аннотированы (Guest.with_statistics)
+                self._statistics[obj.pk] = obj.statistics()
+            else:
+                self._statistics[obj.pk] = obj.get_statistics(
+                    period=self.context.get('period', 'all'),  # 'all', 'month', 'year'
+                    include_cancelled=self.context.get('include_cancelled', False),
+                    min_rating=self.context.get('min_rating', 0),
+                )
+        return self._statistics[obj.pk]
+
     def get_total_bookings(self, obj):
-        include_cancelled = self.context.get('include_cancelled', False)
-        queryset = obj.user.bookings
-        if not include_cancelled:
-            queryset = queryset.exclude(status='cancelled')
-        return queryset.count()
+        return self.collect_statistics(obj)['total_bookings']
 
     def get_total_spent(self, obj):
-        period = self.context.get('period', 'all')  # 'all', 'month', 'year'
-        queryset = obj.user.bookings.all()
-        
-        if period == 'month':
-            queryset = queryset.filter(created_at__month=timezone.now().month)
-        elif period == 'year':
-            queryset = queryset.filter(created_at__year=timezone.now().year)
-            
-        return sum(
-            payment.amount
-            for booking in queryset
-            for payment in booking.payments.filter(status='completed')
-        )
+        return self.collect_statistics(obj)['total_spent']
 
     def get_average_rating(self, obj):
-        min_rating = self.context.get('min_rating', 0)
-        reviews = Review.objects.filter(guest=obj.user, rating__gte=min_rating)
-        if not reviews.exists():
-            return 0
-        return sum(review.rating for review in reviews) / reviews.count()
+        return self.collect_statistics(obj)['average_rating']
 
     def get_last_booking(self, obj):
-        include_cancelled = self.context.get('include_cancelled', False)
-        queryset = obj.user.bookings.order_by('-check_out')
-        if not include_cancelled:
-            queryset = queryset.exclude(status='cancelled')
-            
-        last_booking = queryset.first()
-        if last_booking:
-            return {
-                'id': last_booking.id,
-                'room_number': last_booking.room.room_number,
-                'check_out': last_booking.check_out,
-                'status': last_booking.status
-            }
-        return None
+        return self.collect_statistics(obj)['last_booking']
 
     def update(self, instance, validated_data):
         user_data = validated_data.pop('user', None)
@@ -108,11 +98,113 @@ class AmenitySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'rooms_count', 'active_rooms_count']
 
     def get_rooms_count(self, obj):
+        bulk = getattr(self.root, 'room_bulk', None)
+        if bulk and obj.id in bulk['amenities']:
+            return bulk['amenities'][obj.id]['total']
         return obj.rooms.count()
 
     def get_active_rooms_count(self, obj):
+        bulk = getattr(self.root, 'room_bulk', None)
+        if bulk and obj.id in bulk['amenities']:
+            return bulk['amenities'][obj.id]['active']
         return obj.rooms.filter(is_available=True).count()
 
+def review_stats_queryset(room_ids, min_rating):
+    """Средняя оценка и число отзывов не ниже min_rating по комнатам"""
+    return Review.objects.filter(
+        room_id__in=room_ids, rating__gte=min_rating
+    ).order_by().values('room_id').annotate(
+        average=Avg('rating'), total=Count('id')
+    )
+
+
+def room_review_stats(rooms):
+    """Средняя оценка и число отзывов из счётчиков комнат, без запросов"""
+    return {room.id: {'average': room.average_rating, 'total': room.rating_count} for room in rooms}
+
+
+def current_bookings_queryset(room_ids, day):
+    return Booking.objects.filter(
+        room_id__in=room_ids,
+        check_in__lte=day,
+        check_out__gte=day,
+        status='confirmed'
+    ).select_related('guest')
+
+
+def amenity_counts_queryset(amenity_ids):
+    """Число комнат и доступных комнат с каждым удобством"""
+    return Room.amenities.through.objects.filter(
+        amenity_id__in=amenity_ids
+    ).values('amenity_id').annotate(
+        total=Count('room_id'),
+        active=Count('room_id', filter=Q(room__is_available=True))
+    )
+
+
+def variants_for(serializer, image):
+    """srcset производных изображения: из данных страницы или запросом для одного объекта"""
+    if not image:
+        return None
+    variants = getattr(serializer.root, 'image_variants', None)
+    if variants is None:
+        variants = image_variants([image.name], serializer.context.get('request'))
+    return variants.get(image.name)
+
+
+class ImageVariantsListSerializer(serializers.ListSerializer):
+    """Список объектов с изображением: производные всей страницы двумя запросами"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        field = IMAGE_FIELDS[self.child.Meta.model._meta.model_name]
+        self.image_variants = image_variants(
+            [getattr(obj, field).name for obj in items], self.context.get('request')
+        )
+        return super().to_representation(items)
+
+
+class RoomListSerializer(serializers.ListSerializer):
+    """
+    Список комнат: рейтинги, число отзывов, текущие бронирования и счётчики
+    удобств считаются одним запросом на всю страницу, а не на каждую комнату.
+    Готовые данные можно передать в context['room_bulk'] (асинхронные
+    представления собирают их сами).
+    """
+
+    def to_representation(self, data):
+        rooms = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.room_bulk = self.context.get('room_bulk') or self.collect_room_data(rooms)
+        self.image_variants = self.room_bulk['images']
+        return super().to_representation(rooms)
+
+    def collect_room_data(self, rooms):
+        room_ids = [room.id for room in rooms]
+        min_rating = self.context.get('min_rating', 0)
+        today = timezone.now().date()
+
+        if not float(min_rating):
+            # Без фильтра по рейтингу хватает счётчиков комнаты
+            reviews = room_review_stats(rooms)
+        else:
+            reviews = {row['room_id']: row for row in review_stats_queryset(room_ids, min_rating)}
+
+        current_bookings = {}
+        for booking in current_bookings_queryset(room_ids, today):
+            current_bookings.setdefault(booking.room_id, booking)
+
+        models.prefetch_related_objects(rooms, 'amenities')
+        amenity_ids = {amenity.id for room in rooms for amenity in room.amenities.all()}
+        amenities = {row['amenity_id']: row for row in amenity_counts_queryset(amenity_ids)}
+
+        return {
+            'reviews': reviews,
+            'current_bookings': current_bookings,
+            'amenities': amenities,
+            'rates': current_rates(rooms, today),
+            'images': image_variants([room.photo.name for room in rooms], self.context.get('request')),
+        }
+
 class RoomSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Room."""
     amenities: AmenitySerializer = AmenitySerializer(many=True, read_only=True)
@@ -122,7 +214,9 @@ class RoomSerializer(serializers.ModelSerializer):
     next_available_date: serializers.SerializerMethodField = serializers.SerializerMethodField()
     current_booking: serializers.SerializerMethodField = serializers.SerializerMethodField()
     price_with_discount: serializers.SerializerMethodField = serializers.SerializerMethodField()
+    current_price: serializers.SerializerMethodField = serializers.SerializerMethodField()
     photo: serializers.ImageField = serializers.ImageField(read_only=True)
+    photo_variants: serializers.SerializerMethodField = serializers.SerializerMethodField()
 
     class Meta:
         model = Room
@@ -131,12 +225,19 @@ class RoomSerializer(serializers.ModelSerializer):
             'max_occupancy', 'amenities', 'is_available',
             'average_rating', 'is_available_now', 'total_reviews',
             'next_available_date', 'current_booking', 'price_with_discount',
-            'photo'
+            'current_price', 'photo', 'photo_variants'
         ]
+        list_serializer_class = RoomListSerializer
 
     def get_average_rating(self, obj: Room) -> float:
         """Возвращает средний рейтинг комнаты."""
+        bulk = getattr(self.root, 'room_bulk', None)
+        if bulk is not None:
+            stats = bulk['reviews'].get(obj.id)
+            return stats['average'] if stats else 0.0
         min_rating = self.context.get('min_rating', 0)
+        if not float(min_rating):
+            return obj.average_rating
         reviews = obj.reviews.filter(rating__gte=min_rating)
         if not reviews.exists():
             return 0.0
@@ -146,14 +247,24 @@ class RoomSerializer(serializers.ModelSerializer):
         return obj.is_available
 
     def get_total_reviews(self, obj):
+        bulk = getattr(self.root, 'room_bulk', None)
+        if bulk is not None:
+            stats = bulk['reviews'].get(obj.id)
+            return stats['total'] if stats else 0
         min_rating = self.context.get('min_rating', 0)
+        if not float(min_rating):
+            return obj.rating_count
         return obj.reviews.filter(rating__gte=min_rating).count()
 
     def get_next_available_date(self, obj):
         return None
 
     def get_current_booking(self, obj):
-        booking = obj.get_current_booking()
+        bulk = getattr(self.root, 'room_bulk', None)
+        if bulk is not None:
+            booking = bulk['current_bookings'].get(obj.id)
+        else:
+            booking = obj.get_current_booking()
         if booking:
             include_guest_details = self.context.get('include_guest_details', False)
             result = {
@@ -174,6 +285,69 @@ class RoomSerializer(serializers.ModelSerializer):
             return obj.price_per_night * (1 - discount_percentage / 100)
         return obj.price_per_night
 
+    def get_current_price(self, obj):
+        """Цена ночи сегодня с учётом специальных предложений"""
+        bulk = getattr(self.root, 'room_bulk', None)
+        if bulk is not None:
+            return bulk['rates'][obj.id]['price']
+        return obj.get_current_price_with_discount()
+
+    def get_photo_variants(self, obj):
+        """Уменьшенные копии фото для srcset (None, пока не построены)"""
+        return variants_for(self, obj.photo)
+
+class RoomQuoteListSerializer(serializers.ListSerializer):
+    """Расчёт стоимости для всей страницы комнат одним запросом к календарю цен"""
+
+    def to_representation(self, data):
+        rooms = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        quotes = quote_rooms(rooms, self.context['check_in'], self.context['check_out'])
+        for room in rooms:
+            room.quote = quotes[room.id]
+        return super().to_representation(rooms)
+
+
+class QuoteSegmentSerializer(serializers.Serializer):
+    """Период проживания с одинаковой ценой ночи [start, end)"""
+    start = serializers.DateField()
+    end = serializers.DateField()
+    nights = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=8, decimal_places=2)
+    discount_percentage = serializers.DecimalField(max_digits=5, decimal_places=2)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class RoomQuoteSerializer(serializers.ModelSerializer):
+    """Стоимость проживания в комнате на даты из контекста (check_in, check_out)"""
+    nights = serializers.IntegerField(source='quote.nights', read_only=True)
+    base_total = serializers.DecimalField(max_digits=12, decimal_places=2, source='quote.base_total', read_only=True)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2, source='quote.total', read_only=True)
+    discount_total = serializers.DecimalField(max_digits=12, decimal_places=2, source='quote.discount_total', read_only=True)
+    segments = QuoteSegmentSerializer(many=True, source='quote.segments', read_only=True)
+
+    class Meta:
+        model = Room
+        fields = [
+            'id', 'room_number', 'room_type', 'price_per_night',
+            'nights', 'base_total', 'total', 'discount_total', 'segments'
+        ]
+        list_serializer_class = RoomQuoteListSerializer
+
+    def to_representation(self, instance):
+        if not hasattr(instance, 'quote'):
+            instance.quote = quote(instance, self.context['check_in'], self.context['check_out'])
+        return super().to_representation(instance)
+
+
+class BookingListSerializer(serializers.ListSerializer):
+    """Список бронирований: стоимость всех строк считается одним запросом к календарю цен"""
+
+    def to_representation(self, data):
+        bookings = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        booking_totals(bookings)
+        return super().to_representation(bookings)
+
+
 class BookingSerializer(serializers.ModelSerializer):
     room_details = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
@@ -191,6 +365,23 @@ class BookingSerializer(serializers.ModelSerializer):
             'guest_details'
         ]
         read_only_fields = ['created_at']
+        list_serializer_class = BookingListSerializer
+
+    def validate(self, attrs):
+        check_in = attrs.get('check_in', getattr(self.instance, 'check_in', None))
+        check_out = attrs.get('check_out', getattr(self.instance, 'check_out', None))
+        if check_in and check_out and check_out <= check_in:
+            raise serializers.ValidationError({'check_out': 'Дата выезда должна быть позже даты заезда'})
+        return attrs
+
+    def create(self, validated_data):
+        # Пересечение с другим бронированием - BookingConflict (409 во вьюсете)
+        return save_booking(Booking(**validated_data))
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        return save_booking(instance)
 
     def get_room_details(self, obj):
         include_amenities = self.context.get('include_amenities', False)
@@ -215,8 +406,7 @@ class BookingSerializer(serializers.ModelSerializer):
         return (obj.check_out - obj.check_in).days
 
     def get_can_be_cancelled(self, obj):
-        cancellation_policy = self.context.get('cancellation_policy', 'standard')
-        return obj.can_be_cancelled(policy=cancellation_policy)
+        return obj.can_be_cancelled()
 
     def get_payment_status(self, obj):
         include_partial = self.context.get('include_partial', True)
@@ -295,17 +485,19 @@ class SliderImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
     display_duration = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = SliderImage
-        fields = ['id', 'image', 'title', 'description', 'order', 'is_active', 'image_url', 'display_duration', 'thumbnail_url']
+        fields = ['id', 'image', 'title', 'description', 'order', 'is_active', 'image_url', 'display_duration', 'thumbnail_url', 'image_variants']
+        list_serializer_class = ImageVariantsListSerializer
 
     def get_image_url(self, obj):
         request = self.context.get('request')
         size = self.context.get('image_size', 'original')
         if request and obj.image:
             if size == 'thumbnail':
-                return request.build_absolute_uri(obj.image.url.replace('/original/', '/thumbnail/'))
+                return self.get_thumbnail_url(obj)
             return request.build_absolute_uri(obj.image.url)
         return None
 
@@ -313,13 +505,19 @@ class SliderImageSerializer(serializers.ModelSerializer):
         return self.context.get('default_duration', 5000)
 
     def get_thumbnail_url(self, obj):
+        """Наименьшая копия слайда, пока её нет - исходник"""
         request = self.context.get('request')
         if request and obj.image:
-            return request.build_absolute_uri(obj.image.url.replace('/original/', '/thumbnail/'))
+            variants = variants_for(self, obj.image)
+            return variants['thumbnail'] if variants else request.build_absolute_uri(obj.image.url)
         return None
 
+    def get_image_variants(self, obj):
+        return variants_for(self, obj.image)
+
 class SpecialOfferSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     discount_percentage = serializers.SerializerMethodField()
     days_remaining = serializers.SerializerMethodField()
     is_active = serializers.SerializerMethodField()
@@ -328,12 +526,13 @@ class SpecialOfferSerializer(serializers.ModelSerializer):
     class Meta:
         model = SpecialOffer
         fields = [
-            'id', 'title', 'image', 'image_url', 'short_description',
+            'id', 'title', 'image', 'image_url', 'image_variants', 'short_description',
             'full_description', 'price', 'is_active',
             'created_at', 'updated_at', 'discount_percentage',
             'days_remaining', 'final_price'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = ImageVariantsListSerializer
 
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -341,6 +540,9 @@ class SpecialOfferSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url)
         return ""
 
+    def get_image_variants(self, obj):
+        return variants_for(self, obj.image)
+
     def get_discount_percentage(self, obj):
         base_discount = self.context.get('base_discount', 15)
         avg_discount = obj.room_special_offers.aggregate(avg=Avg('discount_percentage'))['avg']
@@ -418,4 +620,66 @@ class PaymentSerializer(serializers.ModelSerializer):
         if include_tax:
             amount *= (1 + tax_rate)
             
-        return f"{amount:.2f} {currency}" 
\ No newline at end of file
+        return f"{amount:.2f} {currency}"
+
+
+class UploadItemSerializer(serializers.ModelSerializer):
+    """Файл пакетной загрузки с прогрессом в процентах"""
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadItem
+        fields = ['id', 'filename', 'size', 'received', 'progress', 'status', 'error', 'document']
+
+    def get_progress(self, obj):
+        return round(100 * obj.received / obj.size, 1) if obj.size else 100.0
+
+
+class UploadFileSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=0)
+
+    def validate_size(self, value):
+        if value > settings.UPLOAD_MAX_FILE_SIZE:
+            raise serializers.ValidationError(f'Файл больше {settings.UPLOAD_MAX_FILE_SIZE} байт')
+        return value
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Пакетная загрузка: при создании - параметры документов и список
+    файлов (files), в ответе - статус и прогресс каждого файла (items).
+    """
+    items = UploadItemSerializer(many=True, read_only=True)
+    files = UploadFileSerializer(many=True, write_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'file_type', 'is_public', 'description_template',
+            'status', 'error', 'created_at', 'finished_at', 'items', 'files'
+        ]
+        read_only_fields = ['status', 'error', 'created_at', 'finished_at']
+
+    def validate_files(self, value):
+        if not value:
+            raise serializers.ValidationError('Нужен хотя бы один файл')
+        return value
+
+    def validate_description_template(self, value):
+        # Только {filename}, без атрибутов и индексов ({filename.upper}, {filename[0]});
+        # шаблон проверяется на строке, как при создании документов
+        try:
+            fields = {field for _, field, _, _ in Formatter().parse(value) if field is not None}
+            if fields - {'filename'}:
+                raise KeyError(fields)
+            value.format(filename='file')
+        except Exception:
+            raise serializers.ValidationError('Допустима только подстановка {filename}')
+        return value
+
+    def create(self, validated_data):
+        files = validated_data.pop('files')
+        return start_session(
+            self.context['request'].user, [(f['name'], f['size']) for f in files], **validated_data
+        )
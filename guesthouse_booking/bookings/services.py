@@ -0,0 +1,74 @@
+# bookings/services.py
+"""
+Создание и изменение бронирований с защитой от двойного бронирования.
+
+Бронирование сохраняется в транзакции под блокировкой строки комнаты
+(SELECT ... FOR UPDATE), поэтому на PostgreSQL конкурирующие запросы к одной
+комнате выполняются по очереди, а к разным комнатам - параллельно. Последний
+рубеж - уникальность (комната, ночь) в календаре RoomNight: даже если
+блокировка недоступна (SQLite), вторая вставка той же ночи завершится
+ошибкой целостности, которая превращается в BookingConflict.
+"""
+import random
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+
+from .availability import is_room_available, to_date
+from .models import Booking, Room
+
+# Повторы при "database is locked" (SQLite допускает одного писателя)
+LOCK_RETRIES = 10
+LOCK_RETRY_DELAY = 0.05
+
+
+class BookingConflict(Exception):
+    """Комната уже занята на часть запрошенных ночей"""
+
+
+def _reserve(booking):
+    with transaction.atomic():
+        list(Room.objects.select_for_update().filter(pk=booking.room_id).values_list('pk'))
+        if booking.status in Booking.BLOCKING_STATUSES and not is_room_available(
+            booking.room_id, booking.check_in, booking.check_out, exclude_booking=booking.pk
+        ):
+            raise BookingConflict('Комната уже забронирована на выбранные даты')
+        try:
+            with transaction.atomic():
+                booking.save()
+        except IntegrityError as e:
+            raise BookingConflict('Комната уже забронирована на выбранные даты') from e
+    return booking
+
+
+def save_booking(booking):
+    """
+    Сохраняет новое или изменённое бронирование.
+    BookingConflict, если ночи пересекаются с другим бронированием.
+    """
+    booking.check_in, booking.check_out = to_date(booking.check_in), to_date(booking.check_out)
+    if booking.check_out <= booking.check_in:
+        raise ValueError('Дата выезда должна быть позже даты заезда')
+
+    adding = booking._state.adding
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return _reserve(booking)
+        except (BookingConflict, OperationalError) as e:
+            if adding:
+                # Вставка откатилась вместе с транзакцией
+                booking.pk = None
+                booking._state.adding = True
+            if isinstance(e, BookingConflict):
+                raise
+            if 'locked' not in str(e) or attempt == LOCK_RETRIES - 1:
+                raise
+        # Случайная задержка разводит конкурирующих писателей
+        time.sleep(random.uniform(0, LOCK_RETRY_DELAY * (attempt + 1)))
+
+
+def create_booking(guest, room, check_in, check_out, **fields):
+    """Создаёт бронирование, если комната свободна на [check_in, check_out)"""
+    return save_booking(Booking(
+        guest=guest, room=room, check_in=check_in, check_out=check_out, **fields
+    ))
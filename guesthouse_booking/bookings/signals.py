@@ -0,0 +1,236 @@
+# bookings/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Amenity, Booking, Document, Guest, Review, Room, RoomSpecialOffer, SliderImage, SpecialOffer
+from .images import IMAGE_FIELDS, enqueue_image
+from .counters import change_confirmed_bookings, change_rating
+from .availability import stay_nights, sync_booking_nights
+from .pricing import refresh_room_rates
+from .reports import invalidate_reports
+from .search import index_review, unindex_review
+from .substring import index_object, unindex_object
+from .rollups import refresh_room_days, review_day
+
+
+def _deleted_with_room(origin):
+    """Удаление каскадом от комнаты: её сводки удаляются вместе с ней"""
+    return isinstance(origin, Room) or getattr(origin, 'model', None) is Room
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_stay(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние комнату, даты и статус бронирования до сохранения"""
+    instance._previous_stay = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_stay = Booking.objects.filter(pk=instance.pk).values_list(
+        'room_id', 'check_in', 'check_out', 'status'
+    ).first()
+
+
+@receiver(post_save, sender=Booking)
+def sync_room_nights(sender, instance, raw=False, **kwargs):
+    """Обновляет календарь занятости комнаты при сохранении бронирования"""
+    if raw:
+        return
+    sync_booking_nights(instance)
+
+
+@receiver(post_save, sender=Booking)
+def refresh_booking_daily_stats(sender, instance, raw=False, **kwargs):
+    """Пересчитывает дневные сводки по прежним и новым датам бронирования"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_stay', None)
+    if previous:
+        room_id, check_in, check_out, _ = previous
+        if room_id != instance.room_id:
+            refresh_room_days(room_id, stay_nights(check_in, check_out))
+            previous = None
+    dates = set(stay_nights(instance.check_in, instance.check_out))
+    if previous:
+        dates.update(stay_nights(previous[1], previous[2]))
+    refresh_room_days(instance.room_id, dates)
+
+
+@receiver(post_delete, sender=Booking)
+def refresh_deleted_booking_daily_stats(sender, instance, origin=None, **kwargs):
+    if _deleted_with_room(origin):
+        return
+    refresh_room_days(instance.room_id, stay_nights(instance.check_in, instance.check_out))
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_day(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние комнату, день и оценку отзыва до сохранения"""
+    instance._previous_day = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_day = Review.objects.filter(pk=instance.pk).values_list(
+        'room_id', 'review_date', 'rating'
+    ).first()
+
+
+@receiver(post_save, sender=Review)
+def refresh_review_daily_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_day', None)
+    if previous:
+        refresh_room_days(previous[0], [review_day(previous[1])])
+    refresh_room_days(instance.room_id, [review_day(instance.review_date)])
+
+
+@receiver(post_delete, sender=Review)
+def refresh_deleted_review_daily_stats(sender, instance, origin=None, **kwargs):
+    if _deleted_with_room(origin):
+        return
+    refresh_room_days(instance.room_id, [review_day(instance.review_date)])
+
+
+@receiver(post_save, sender=Booking)
+def count_confirmed_booking(sender, instance, raw=False, **kwargs):
+    """Переносит подтверждённое бронирование между счётчиками комнат"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_stay', None)
+    if previous and previous[3] == 'confirmed':
+        change_confirmed_bookings(previous[0], -1)
+    if instance.status == 'confirmed':
+        change_confirmed_bookings(instance.room_id, 1)
+
+
+@receiver(post_delete, sender=Booking)
+def uncount_confirmed_booking(sender, instance, origin=None, **kwargs):
+    if _deleted_with_room(origin) or instance.status != 'confirmed':
+        return
+    change_confirmed_bookings(instance.room_id, -1)
+
+
+@receiver(post_save, sender=Review)
+def count_review_rating(sender, instance, raw=False, **kwargs):
+    """Переносит оценку отзыва между счётчиками комнат"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_day', None)
+    if previous:
+        change_rating(previous[0], previous[2], -1)
+    change_rating(instance.room_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review_rating(sender, instance, origin=None, **kwargs):
+    if _deleted_with_room(origin):
+        return
+    change_rating(instance.room_id, instance.rating, -1)
+
+
+@receiver(post_save, sender=Review)
+def index_review_text(sender, instance, raw=False, **kwargs):
+    """Обновляет отзыв в поисковом индексе"""
+    if raw:
+        return
+    index_review(instance)
+
+
+@receiver(post_delete, sender=Review)
+def unindex_review_text(sender, instance, **kwargs):
+    # Удаление каскадом от комнаты тоже чистит индекс: FTS5 не знает о внешних ключах
+    unindex_review(instance.pk)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=Amenity)
+@receiver(post_save, sender=Guest)
+@receiver(post_save, sender=Document)
+def index_substring_fields(sender, instance, raw=False, **kwargs):
+    """Триграммы строковых полей для поиска подстроки (вне SQLite/PostgreSQL)"""
+    if raw:
+        return
+    index_object(instance)
+
+
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=Amenity)
+@receiver(post_delete, sender=Guest)
+@receiver(post_delete, sender=Document)
+def unindex_substring_fields(sender, instance, **kwargs):
+    unindex_object(instance)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=SliderImage)
+@receiver(post_save, sender=SpecialOffer)
+def enqueue_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Новое изображение - в очередь на построение уменьшенных копий"""
+    field = IMAGE_FIELDS[sender._meta.model_name]
+    if raw or (update_fields is not None and field not in update_fields):
+        return
+    enqueue_image(getattr(instance, field))
+
+
+@receiver(pre_save, sender=Room)
+def remember_room_price(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Запоминает прежнюю цену комнаты до сохранения"""
+    instance._previous_price = None
+    if raw or instance.pk is None or (update_fields is not None and 'price_per_night' not in update_fields):
+        return
+    instance._previous_price = Room.objects.filter(pk=instance.pk).values_list(
+        'price_per_night', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=Room)
+def refresh_room_rate_prices(sender, instance, created=False, raw=False, **kwargs):
+    """Цены календаря считаются от цены комнаты: перестройка только при её изменении"""
+    previous = getattr(instance, '_previous_price', None)
+    if raw or created or previous is None or previous == instance.price_per_night:
+        return
+    refresh_room_rates(instance.pk)
+
+
+@receiver(pre_save, sender=RoomSpecialOffer)
+def remember_offer_room(sender, instance, raw=False, **kwargs):
+    """Запоминает прежнюю комнату предложения до сохранения"""
+    instance._previous_room_id = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_room_id = RoomSpecialOffer.objects.filter(pk=instance.pk).values_list(
+        'room_id', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=RoomSpecialOffer)
+def refresh_offer_rates(sender, instance, raw=False, **kwargs):
+    """Перестраивает календарь цен комнаты при изменении её предложения"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_room_id', None)
+    if previous and previous != instance.room_id:
+        refresh_room_rates(previous)
+    refresh_room_rates(instance.room_id)
+
+
+@receiver(post_delete, sender=RoomSpecialOffer)
+def refresh_deleted_offer_rates(sender, instance, origin=None, **kwargs):
+    if _deleted_with_room(origin):
+        return
+    refresh_room_rates(instance.room_id)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=SpecialOffer)
+@receiver(post_delete, sender=SpecialOffer)
+@receiver(post_save, sender=RoomSpecialOffer)
+@receiver(post_delete, sender=RoomSpecialOffer)
+def invalidate_cached_reports(sender, raw=False, **kwargs):
+    """Готовые PDF-отчёты устаревают при изменении данных, из которых они строятся"""
+    if raw:
+        return
+    invalidate_reports(sender._meta.model_name)
@@ -0,0 +1,228 @@
+# bookings/storage.py
+"""
+Хранилище загруженных файлов с дедупликацией по содержимому.
+
+При сохранении файл потоково пишется во временный файл с одновременным
+подсчётом SHA-256 и становится блобом .blobs/<xx>/<хэш>. Каждое
+содержимое хранится один раз, а имя файла поля (guests/passports/...,
+documents/...) - жёсткая ссылка на блоб. Поэтому один и тот же скан,
+загруженный как паспорт гостя, документ и файл бронирования, занимает
+место на диске один раз, а path, url, отдача через nginx и скачивание
+работают как с обычным FileSystemStorage.
+
+Счётчик ссылок на блоб - число жёстких ссылок файловой системы. Блоб,
+на который не осталось ни одного имени, удаляет сборка мусора
+(manage.py dedupe_media). Если файловая система не поддерживает жёсткие
+ссылки, файл сохраняется отдельной копией.
+"""
+import hashlib
+import logging
+import os
+import time
+import uuid
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = '.blobs'
+TEMP_PREFIX = '.upload-'
+READ_SIZE = 64 * 1024
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DeduplicatingStorage(FileSystemStorage):
+    """FileSystemStorage, в котором одинаковые файлы - ссылки на один блоб"""
+
+    def blob_root(self):
+        return os.path.join(self.location, BLOB_DIR)
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.blob_root(), content_hash[:2], content_hash)
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def _save(self, name, content):
+        self._makedirs(self.blob_root())
+        temp_path = os.path.join(self.blob_root(), f'{TEMP_PREFIX}{uuid.uuid4().hex}')
+        digest = hashlib.sha256()
+        try:
+            with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666),
+                      'wb') as f:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            full_path = self._link(temp_path, digest.hexdigest(), name)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self._ensure_location_group_id(full_path)
+        return os.path.relpath(full_path, self.location).replace('\\', '/')
+
+    def _link(self, temp_path, content_hash, name):
+        """Делает имя ссылкой на блоб с этим содержимым; возвращает полный путь"""
+        blob = self.blob_path(content_hash)
+        full_path = self.path(name)
+        self._makedirs(os.path.dirname(full_path))
+        while True:
+            try:
+                self._makedirs(os.path.dirname(blob))
+                try:
+                    os.link(temp_path, blob)
+                except FileExistsError:
+                    # Такое содержимое уже хранится
+                    pass
+                if self._allow_overwrite and os.path.lexists(full_path):
+                    os.remove(full_path)
+                os.link(blob, full_path)
+            except FileExistsError:
+                name = self.get_available_name(name)
+                full_path = self.path(name)
+            except FileNotFoundError:
+                # Сборка мусора удалила блоб между двумя ссылками
+                continue
+            except OSError as e:
+                logger.warning('Жёсткие ссылки недоступны (%s), файл %s сохранён копией', e, name)
+                return self._move(temp_path, name)
+            else:
+                return full_path
+
+    def _move(self, temp_path, name):
+        full_path = self.path(name)
+        while True:
+            try:
+                file_move_safe(temp_path, full_path, allow_overwrite=self._allow_overwrite)
+                return full_path
+            except FileExistsError:
+                name = self.get_available_name(name)
+                full_path = self.path(name)
+
+    def deduplicate(self, name):
+        """
+        Заменяет обычный файл ссылкой на блоб. Возвращает число
+        освобождённых байт (0, если содержимое встретилось впервые).
+        """
+        full_path = self.path(name)
+        blob = self.blob_path(file_hash(full_path))
+        self._makedirs(os.path.dirname(blob))
+        try:
+            os.link(full_path, blob)
+            return 0
+        except FileExistsError:
+            pass
+        if os.path.samefile(full_path, blob):
+            return 0
+        size = os.path.getsize(full_path)
+        # Подмена через временное имя: файл не пропадает ни на миг
+        temp_path = os.path.join(os.path.dirname(full_path), f'{TEMP_PREFIX}{uuid.uuid4().hex}')
+        os.link(blob, temp_path)
+        os.replace(temp_path, full_path)
+        return size
+
+    def plain_files(self):
+        """Имена файлов, которые ещё не стали ссылками на блобы"""
+        for root, dirs, files in os.walk(self.location):
+            if root == self.location and BLOB_DIR in dirs:
+                dirs.remove(BLOB_DIR)
+            for filename in files:
+                path = os.path.join(root, filename)
+                if not filename.startswith(TEMP_PREFIX) and os.stat(path).st_nlink == 1:
+                    yield os.path.relpath(path, self.location).replace('\\', '/')
+
+    def blobs(self):
+        """(путь, stat) всех блобов"""
+        if not os.path.isdir(self.blob_root()):
+            return
+        for root, _, files in os.walk(self.blob_root()):
+            for filename in files:
+                path = os.path.join(root, filename)
+                yield path, os.stat(path)
+
+    def collect_garbage(self, dry_run=False, temp_max_age=24 * 3600):
+        """
+        Удаляет блобы без ссылок и брошенные временные файлы прерванных
+        загрузок. Возвращает (число файлов, байт).
+        """
+        removed = freed = 0
+        now = time.time()
+        for path, stat in list(self.blobs()):
+            if os.path.basename(path).startswith(TEMP_PREFIX):
+                orphaned = now - stat.st_mtime > temp_max_age
+            else:
+                orphaned = stat.st_nlink == 1
+            if not orphaned:
+                continue
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            removed += 1
+            freed += stat.st_size
+        return removed, freed
+
+    def usage(self):
+        """Число блобов и ссылок, байты на диске и байты по всем именам"""
+        blobs = links = stored = referenced = 0
+        for path, stat in self.blobs():
+            if os.path.basename(path).startswith(TEMP_PREFIX):
+                continue
+            blobs += 1
+            links += stat.st_nlink - 1
+            stored += stat.st_size
+            referenced += stat.st_size * (stat.st_nlink - 1)
+        return {'blobs': blobs, 'links': links, 'stored_bytes': stored, 'referenced_bytes': referenced}
+
+
+def referenced_files():
+    """Имена файлов, на которые ссылаются поля FileField всех моделей"""
+    from django.apps import apps
+    from django.db import models
+
+    names = set()
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and field.concrete:
+                names.update(
+                    model._default_manager.exclude(**{f'{field.name}__isnull': True})
+                    .exclude(**{field.name: ''}).values_list(field.name, flat=True)
+                )
+    return names
+
+
+def unreferenced_files(storage, min_age=24 * 3600):
+    """
+    Файлы хранилища, на которые не ссылается ни одна модель. Недавно
+    созданные пропускаются: загрузка могла ещё не сохранить объект.
+    """
+    referenced = referenced_files()
+    now = time.time()
+    for root, dirs, files in os.walk(storage.location):
+        if root == storage.location and BLOB_DIR in dirs:
+            dirs.remove(BLOB_DIR)
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, storage.location).replace('\\', '/')
+            if name not in referenced and now - os.stat(path).st_ctime > min_age:
+                yield name
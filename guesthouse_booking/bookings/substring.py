@@ -0,0 +1,220 @@
+# bookings/substring.py
+"""
+Индексированный поиск подстроки (аналог icontains) для фильтров API,
+списка документов и поиска в админке.
+
+Обычный B-tree индекс не помогает LIKE '%...%', поэтому поля из
+INDEXED_FIELDS индексируются триграммами. Бэкенд выбирается по базе
+(настройка SUBSTRING_SEARCH_BACKEND, по умолчанию 'auto'):
+- 'postgresql' - GIN-индексы pg_trgm по UPPER(поле): их использует сам
+  icontains, запрос не меняется;
+- 'fts5' - SQLite: таблица FTS5 с токенизатором trigram на каждую модель
+  (external content), синхронизируется триггерами базы, поэтому update()
+  и bulk_create() её не обходят; регистр не учитывается и для кириллицы;
+- 'terms' - таблица SearchTrigram в любой базе: кандидаты по всем
+  триграммам строки, затем проверка icontains; обновляется сигналами.
+
+Строки короче трёх символов ищутся обычным icontains.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+
+from .models import SearchTrigram
+
+MIN_LENGTH = 3
+
+# model_name -> индексируемые поля
+INDEXED_FIELDS = {
+    'room': ('room_type',),
+    'amenity': ('name',),
+    'guest': ('first_name', 'last_name', 'email', 'phone_number'),
+    'document': ('title', 'description'),
+}
+
+
+def fts5_table(db_table):
+    return f'{db_table}_trgm'
+
+
+def fts5_statements(db_table, fields):
+    """DDL таблицы FTS5 и триггеров синхронизации для таблицы модели"""
+    table = fts5_table(db_table)
+    columns = ', '.join(fields)
+    new = ', '.join(f'new.{field}' for field in fields)
+    old = ', '.join(f'old.{field}' for field in fields)
+    delete = f"INSERT INTO {table} ({table}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    insert = f'INSERT INTO {table} (rowid, {columns}) VALUES (new.id, {new});'
+    return {
+        table: (
+            f"CREATE VIRTUAL TABLE {table} USING fts5("
+            f"{columns}, content = '{db_table}', content_rowid = 'id', tokenize = 'trigram')"
+        ),
+        f'{table}_ai': f'CREATE TRIGGER {table}_ai AFTER INSERT ON {db_table} BEGIN {insert} END',
+        f'{table}_ad': f'CREATE TRIGGER {table}_ad AFTER DELETE ON {db_table} BEGIN {delete} END',
+        f'{table}_au': (
+            # Только при изменении индексируемых полей: счётчики комнаты
+            # обновляются на каждый отзыв и бронирование
+            f'CREATE TRIGGER {table}_au AFTER UPDATE OF {columns} ON {db_table} BEGIN {delete} {insert} END'
+        ),
+    }
+
+
+def install_fts5(connection, tables):
+    """
+    Создаёт недостающие таблицы FTS5 и триггеры ({db_table: поля}) и
+    перестраивает затронутые индексы. Пересоздание таблицы модели
+    миграцией SQLite удаляет её триггеры - после migrate они
+    восстанавливаются здесь же (сигнал post_migrate).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name for name, in cursor.fetchall()}
+        for db_table, fields in tables.items():
+            statements = fts5_statements(db_table, fields)
+            missing = [sql for name, sql in statements.items() if name not in existing]
+            for sql in missing:
+                cursor.execute(sql)
+            if missing:
+                table = fts5_table(db_table)
+                cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+
+def indexed_tables(apps):
+    return {
+        apps.get_model('bookings', model_name)._meta.db_table: fields
+        for model_name, fields in INDEXED_FIELDS.items()
+    }
+
+
+def _fts5_installed(target):
+    # Таблицы не создаются миграцией, если SQLite собран без FTS5
+    with target.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bookings_guest_trgm'")
+        return cursor.fetchone() is not None
+
+
+def repair_fts5_triggers(sender, using='default', apps=None, **kwargs):
+    """post_migrate: возвращает триггеры, удалённые пересозданием таблиц"""
+    target = connections[using]
+    if target.vendor == 'sqlite' and apps is not None and _fts5_installed(target):
+        install_fts5(target, indexed_tables(apps))
+
+
+@lru_cache(maxsize=None)
+def _fts5_tables_exist(alias):
+    return _fts5_installed(connections[alias])
+
+
+def substring_backend():
+    backend = getattr(settings, 'SUBSTRING_SEARCH_BACKEND', 'auto')
+    if backend != 'auto':
+        return backend
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite' and _fts5_tables_exist(connection.alias):
+        return 'fts5'
+    return 'terms'
+
+
+def trigrams(value):
+    value = value.casefold()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def field_label(model, field):
+    return f'{model._meta.model_name}.{field}'
+
+
+def contains(model, field, value, prefix=''):
+    """
+    Q: поле field модели model содержит value без учета регистра.
+    prefix - путь к модели от фильтруемой (например 'room__').
+    """
+    lookup = Q(**{f'{prefix}{field}__icontains': value})
+    if field not in INDEXED_FIELDS.get(model._meta.model_name, ()) or len(value) < MIN_LENGTH:
+        return lookup
+    backend = substring_backend()
+    if backend == 'fts5':
+        table = fts5_table(model._meta.db_table)
+        phrase = value.replace('"', '""')
+        ids = RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [f'{field} : "{phrase}"'])
+        return Q(**{f'{prefix}pk__in': ids})
+    if backend == 'terms':
+        grams = trigrams(value)
+        ids = SearchTrigram.objects.filter(
+            field=field_label(model, field), trigram__in=grams
+        ).values('object_id').annotate(found=Count('trigram')).filter(found=len(grams)).values('object_id')
+        # Все триграммы ещё не означают подстроку: кандидатов проверяет icontains
+        return Q(**{f'{prefix}pk__in': ids}) & lookup
+    return lookup
+
+
+def search_q(model, fields, terms):
+    """Поиск админки: каждое слово - хотя бы в одном из полей"""
+    query = Q()
+    for term in terms:
+        any_field = Q()
+        for field in fields:
+            any_field |= contains(model, field, term)
+        query &= any_field
+    return query
+
+
+# Обратный индекс SearchTrigram (бэкенд 'terms')
+
+def _trigram_rows(obj):
+    rows = []
+    for field in INDEXED_FIELDS[obj._meta.model_name]:
+        label = field_label(type(obj), field)
+        rows.extend(
+            SearchTrigram(field=label, object_id=obj.pk, trigram=gram)
+            for gram in trigrams(getattr(obj, field) or '')
+        )
+    return rows
+
+
+def _labels(model):
+    return [field_label(model, field) for field in INDEXED_FIELDS[model._meta.model_name]]
+
+
+def index_object(obj):
+    if substring_backend() != 'terms':
+        return
+    SearchTrigram.objects.filter(field__in=_labels(type(obj)), object_id=obj.pk).delete()
+    SearchTrigram.objects.bulk_create(_trigram_rows(obj))
+
+
+def unindex_object(obj):
+    if substring_backend() != 'terms':
+        return
+    SearchTrigram.objects.filter(field__in=_labels(type(obj)), object_id=obj.pk).delete()
+
+
+def rebuild_substring_index(models, batch_size=1000):
+    """Перестраивает индекс текущего бэкенда для моделей, возвращает число объектов"""
+    backend = substring_backend()
+    if backend == 'fts5':
+        with connection.cursor() as cursor:
+            for model in models:
+                table = fts5_table(model._meta.db_table)
+                cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+    count = 0
+    for model in models:
+        objects = model.objects.order_by().only('pk', *INDEXED_FIELDS[model._meta.model_name])
+        if backend != 'terms':
+            count += objects.count()
+            continue
+        SearchTrigram.objects.filter(field__in=_labels(model)).delete()
+        batch = []
+        for obj in objects.iterator(chunk_size=batch_size):
+            batch.extend(_trigram_rows(obj))
+            count += 1
+            if len(batch) >= batch_size:
+                SearchTrigram.objects.bulk_create(batch)
+                batch = []
+        SearchTrigram.objects.bulk_create(batch)
+    return count
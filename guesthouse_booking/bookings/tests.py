@@ -1,13 +1,36 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.utils import timezone
+from datetime import timedelta
 from django.urls import reverse
 from django.contrib.auth.models import User
-from .models import Room, Amenity, Booking, Review, Guest, Payment, SpecialOffer
-from .serializers import RoomSerializer, BookingSerializer, ReviewSerializer
+from .models import Room, Amenity, Booking, Review, Guest, Payment, SpecialOffer, Document
+from .serializers import RoomSerializer, BookingSerializer, ReviewSerializer, GuestSerializer
 from rest_framework.test import APIClient
 from rest_framework import status
 import os
 from typing import Any
 
+
+class TempMediaMixin:
+    """MEDIA_ROOT во временном каталоге, который удаляется после теста."""
+
+    def setUp(self) -> None:
+        import tempfile
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        self.override_settings(MEDIA_ROOT=media.name)
+
+    def override_settings(self, **options: Any) -> None:
+        """Настройки до конца теста."""
+        from django.test import override_settings
+        settings_override = override_settings(**options)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
 # PDF и шрифты (минимальные smoke-тесты)
 class PDFAndFontTestCase(TestCase):
     """Тесты PDF-генерации и проверки шрифтов."""
@@ -66,6 +89,79 @@ class BookingModelTest(TestCase):
         booking = Booking.objects.create(guest=self.user, room=self.room, check_in='2025-01-01', check_out='2025-01-02', guests_count=1)
         self.assertEqual(str(booking), f"Booking {booking.id} - {self.user.username} - {self.room.room_number}")
 
+class MonthlyStatisticsTest(TestCase):
+    """Тесты месячной статистики по дневным сводкам."""
+    def setUp(self) -> None:
+        """Создаёт комнату, бронирование через границу месяца и два отзыва."""
+        from datetime import date
+        self.room = Room.objects.create(room_number='501', room_type='Люкс', price_per_night=1000, max_occupancy=2)
+        self.user = User.objects.create_user(username='monthly', password='pass')
+        other = User.objects.create_user(username='monthly2', password='pass')
+        self.booking = Booking.objects.create(guest=self.user, room=self.room, check_in=date(2025, 2, 26), check_out=date(2025, 3, 3), status='confirmed')
+        Review.objects.create(room=self.room, guest=self.user, rating=5, comment='Отлично', review_date=timezone.make_aware(timezone.datetime(2025, 2, 27, 12)))
+        Review.objects.create(room=self.room, guest=other, rating=3, comment='Нормально', review_date=timezone.make_aware(timezone.datetime(2025, 2, 28, 12)))
+
+    def test_no_fan_out(self) -> None:
+        """Отзывы не размножают бронирования и выручку."""
+        room = Room.get_monthly_statistics(2025, 2).get(pk=self.room.pk)
+        self.assertEqual(room.monthly_bookings, 1)
+        self.assertEqual(room.occupied_days, 3)
+        self.assertEqual(room.monthly_revenue, 3000)
+        self.assertAlmostEqual(room.occupancy_rate, 300 / 28)
+        self.assertEqual(room.reviews_count, 2)
+        self.assertEqual(room.monthly_rating, 4)
+
+    def test_incremental_updates(self) -> None:
+        """Изменение и удаление бронирования пересчитывают сводки."""
+        from datetime import date
+        self.booking.check_out = date(2025, 3, 5)
+        self.booking.save()
+        self.assertEqual(Room.get_monthly_statistics(2025, 3).get(pk=self.room.pk).occupied_days, 4)
+        self.booking.delete()
+        march = Room.get_monthly_statistics(2025, 3).get(pk=self.room.pk)
+        self.assertEqual(march.occupied_days, 0)
+        self.assertIsNone(march.monthly_rating)
+
+    def test_rebuild_matches_incremental(self) -> None:
+        """Полная перестройка даёт те же строки, что и сигналы."""
+        from .models import RoomDailyStat
+        from .rollups import rebuild_daily_stats
+        fields = ('room_id', 'date', 'occupied', 'revenue', 'check_ins', 'reviews_count', 'rating_sum')
+        before = sorted(RoomDailyStat.objects.values_list(*fields))
+        rebuild_daily_stats()
+        self.assertEqual(sorted(RoomDailyStat.objects.values_list(*fields)), before)
+
+    def test_revenue_fixed_at_booking(self) -> None:
+        """Выручка - по цене ночей с предложением на момент бронирования; смена цены её не меняет."""
+        from datetime import date
+        from .models import RoomSpecialOffer, SpecialOffer
+        offer = SpecialOffer.objects.create(title='Зима', short_description='-', full_description='-')
+        RoomSpecialOffer.objects.create(room=self.room, special_offer=offer, discount_percentage=10,
+                                        start_date=date(2025, 2, 1), end_date=date(2025, 2, 28))
+        self.booking.check_out = date(2025, 3, 4)
+        self.booking.save()
+        # Новая ночь 3 марта - по полной цене, ночи февраля сохранили прежнюю
+        self.assertEqual(Room.get_monthly_statistics(2025, 2).get(pk=self.room.pk).monthly_revenue, 3000)
+        self.assertEqual(Room.get_monthly_statistics(2025, 3).get(pk=self.room.pk).monthly_revenue, 3000)
+
+        booking = Booking.objects.create(guest=self.user, room=self.room, check_in=date(2025, 2, 10),
+                                         check_out=date(2025, 2, 12), status='confirmed')
+        self.assertEqual(Room.get_monthly_statistics(2025, 2).get(pk=self.room.pk).monthly_revenue, 4800)
+        self.assertEqual(booking.total_price(), 1800)
+
+        self.room.price_per_night = 2000
+        self.room.save()
+        guest = User.objects.create_user(username='monthly3', password='pass')
+        Review.objects.create(room=self.room, guest=guest, rating=4, comment='Хорошо',
+                              review_date=timezone.make_aware(timezone.datetime(2025, 2, 10, 12)))
+        self.assertEqual(Room.get_monthly_statistics(2025, 2).get(pk=self.room.pk).monthly_revenue, 4800)
+
+    def test_monthly_pdf(self) -> None:
+        """Месячный PDF строится по сводкам."""
+        from bookings.pdf_utils import generate_monthly_report_pdf
+        response = generate_monthly_report_pdf(2025, 2)
+        self.assertIn('Content-Disposition', response)
+
 # Сериализаторы
 class RoomSerializerTest(TestCase):
     """Тесты сериализатора RoomSerializer."""
@@ -75,6 +171,108 @@ class RoomSerializerTest(TestCase):
         data = RoomSerializer(room).data
         self.assertEqual(data['room_number'], '104')
 
+class RoomListSerializerQueryTest(TestCase):
+    """Количество запросов списка комнат не зависит от размера страницы."""
+    def _create_rooms(self, start: int, count: int) -> None:
+        """Создаёт комнаты с удобством, отзывом и текущим бронированием."""
+        today = timezone.now().date()
+        wifi, _ = Amenity.objects.get_or_create(name='Wi-Fi')
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f'list{i}', password='pass')
+            room = Room.objects.create(room_number=f'3{i:02d}', room_type='Стандарт', price_per_night=1000, max_occupancy=2)
+            room.amenities.add(wifi)
+            Review.objects.create(room=room, guest=user, rating=4, comment='Хорошо')
+            Booking.objects.create(guest=user, room=room, check_in=today - timedelta(days=1), check_out=today + timedelta(days=1), status='confirmed')
+
+    def _count_list_queries(self) -> int:
+        """Возвращает число запросов при GET /api/rooms/."""
+        with CaptureQueriesContext(connection) as ctx:
+            response = APIClient().get(reverse('room-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def test_constant_query_count(self) -> None:
+        """2 и 10 комнат на странице дают одинаковое число запросов."""
+        self._create_rooms(0, 2)
+        small = self._count_list_queries()
+        self._create_rooms(2, 8)
+        large = self._count_list_queries()
+        self.assertEqual(small, large)
+
+    def test_list_values(self) -> None:
+        """Агрегаты в режиме списка совпадают с одиночной сериализацией."""
+        self._create_rooms(0, 2)
+        room = Room.objects.get(room_number='300')
+        listed = RoomSerializer(Room.objects.all(), many=True).data[0]
+        single = RoomSerializer(room).data
+        for field in ('average_rating', 'total_reviews', 'current_booking', 'amenities'):
+            self.assertEqual(listed[field], single[field])
+
+class GuestSerializerStatisticsTest(TestCase):
+    """Статистика гостя считается постоянным числом запросов."""
+    def setUp(self) -> None:
+        """Создаёт гостя с профилем и комнату."""
+        self.user = User.objects.create_user(username='stats', password='pass')
+        self.guest = Guest.objects.create(user=self.user, first_name='Анна', last_name='Иванова', email='anna@mail.com', phone_number='123')
+        self.room = Room.objects.create(room_number='401', room_type='Люкс', price_per_night=1000, max_occupancy=2)
+
+    def _add_stays(self, count: int, offset: int = 0) -> None:
+        """Добавляет бронирования с оплатой."""
+        for i in range(offset, offset + count):
+            check_in = timezone.now().date() + timedelta(days=10 * i)
+            booking = Booking.objects.create(guest=self.user, room=self.room, check_in=check_in, check_out=check_in + timedelta(days=2), status='confirmed')
+            Payment.objects.create(booking=booking, amount=100, status='completed')
+            Payment.objects.create(booking=booking, amount=50, status='failed')
+
+    def _serialize_queries(self) -> int:
+        """Возвращает число запросов при сериализации гостя."""
+        guest = Guest.objects.select_related('user', 'role').get(pk=self.guest.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            GuestSerializer(guest).data
+        return len(ctx.captured_queries)
+
+    def test_statistics_values(self) -> None:
+        """Проверяет значения статистики."""
+        self._add_stays(3)
+        Review.objects.create(room=self.room, guest=self.user, rating=4, comment='Хорошо')
+        data = GuestSerializer(self.guest).data
+        self.assertEqual(data['total_bookings'], 3)
+        self.assertEqual(data['total_spent'], 300)
+        self.assertEqual(data['average_rating'], 4)
+        self.assertEqual(data['last_booking']['room_number'], '401')
+
+    def test_constant_query_count(self) -> None:
+        """Число запросов не растёт с историей бронирований."""
+        self._add_stays(1)
+        short_history = self._serialize_queries()
+        self._add_stays(10, offset=1)
+        self.assertEqual(self._serialize_queries(), short_history)
+
+    def test_list_statistics_in_one_query(self) -> None:
+        """Аннотированный список гостей сериализуется без запросов на гостя."""
+        other = User.objects.create_user(username='stats2', password='pass')
+        Guest.objects.create(user=other, first_name='Иван', last_name='Петров', email='ivan@mail.com', phone_number='456')
+        self._add_stays(2)
+        Booking.objects.create(guest=self.user, room=self.room, check_in='2020-01-01', check_out='2020-01-03', status='cancelled')
+        Review.objects.create(room=self.room, guest=self.user, rating=5, comment='Отлично')
+        guests = Guest.with_statistics(Guest.objects.select_related('user', 'role').order_by('pk'))
+        with self.assertNumQueries(1):
+            data = GuestSerializer(guests, many=True).data
+        self.assertEqual([item['total_bookings'] for item in data], [2, 0])
+        self.assertEqual([item['total_spent'] for item in data], [200, 0])
+        self.assertEqual([item['average_rating'] for item in data], [5, 0])
+        self.assertIsNone(data[1]['last_booking'])
+        self.assertEqual(data[0], GuestSerializer(self.guest).data)
+
+    def test_profile_endpoint(self) -> None:
+        """Профиль отдаёт статистику с параметрами запроса."""
+        self._add_stays(1)
+        Booking.objects.create(guest=self.user, room=self.room, check_in='2020-01-01', check_out='2020-01-03', status='cancelled')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/profile/me/').data['total_bookings'], 1)
+        self.assertEqual(client.get('/api/profile/me/', {'include_cancelled': '1'}).data['total_bookings'], 2)
+
 # API
 class RoomAPITest(TestCase):
     """Тесты API для комнат."""
@@ -153,3 +351,1090 @@ class ProjectExtraTests(TestCase):
         room = Room.objects.create(room_number='111', room_type='Люкс', price_per_night=2000, max_occupancy=4)
         data = RoomSerializer(room).data
         self.assertIn('room_type', data)
+
+# Доступность комнат
+class AvailabilityTest(TestCase):
+    """Тесты календаря занятости и поиска свободных комнат."""
+    def setUp(self) -> None:
+        """Создаёт две комнаты и подтверждённое бронирование первой."""
+        self.user = User.objects.create_user(username='avail', password='pass')
+        self.room = Room.objects.create(room_number='201', room_type='Стандарт', price_per_night=1000, max_occupancy=2)
+        self.other = Room.objects.create(room_number='202', room_type='Стандарт', price_per_night=1100, max_occupancy=2)
+        self.booking = Booking.objects.create(guest=self.user, room=self.room, check_in='2025-03-10', check_out='2025-03-13', guests_count=1, status='confirmed')
+
+    def test_nights_created(self) -> None:
+        """Подтверждённое бронирование занимает ночи [check_in, check_out)."""
+        self.assertEqual(self.booking.nights.count(), 3)
+
+    def test_overlap_excluded(self) -> None:
+        """Пересекающийся интервал исключает занятую комнату."""
+        from datetime import date
+        rooms = Room.get_available_rooms(date(2025, 3, 12), date(2025, 3, 15))
+        self.assertEqual(list(rooms), [self.other])
+        self.assertEqual(list(Room.rooms.available_rooms(date(2025, 3, 12), date(2025, 3, 15))), [self.other])
+
+    def test_checkout_day_is_free(self) -> None:
+        """Заезд в день выезда предыдущего гостя допустим (одно правило для обоих методов)."""
+        from datetime import date
+        self.assertIn(self.room, Room.get_available_rooms(date(2025, 3, 13), date(2025, 3, 14)))
+        self.assertIn(self.room, Room.rooms.available_rooms(date(2025, 3, 13), date(2025, 3, 14)))
+        self.assertIn(self.room, Room.rooms.available_rooms(date(2025, 3, 8), date(2025, 3, 10)))
+
+    def test_cancel_frees_nights(self) -> None:
+        """Отмена бронирования освобождает ночи."""
+        self.booking.status = 'cancelled'
+        self.booking.save()
+        self.assertEqual(self.booking.nights.count(), 0)
+
+    def test_available_endpoint(self) -> None:
+        """Проверяет эндпоинт /api/rooms/available/ и валидацию дат."""
+        client = APIClient()
+        response = client.get('/api/rooms/available/', {'check_in': '2025-03-11', 'check_out': '2025-03-12'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['room_number'] for r in response.data['results']], ['202'])
+        response = client.get('/api/rooms/available/', {'check_in': '2025-03-12', 'check_out': '2025-03-11'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_available_paginated_and_streamed(self) -> None:
+        """Действие отдаёт страницу с count/results, а ?stream=1 - полный JSON-массив."""
+        import json
+        for number in range(203, 215):
+            Room.objects.create(room_number=str(number), room_type='Эконом', price_per_night=900, max_occupancy=1)
+        client = APIClient()
+        params = {'check_in': '2025-03-11', 'check_out': '2025-03-12'}
+        response = client.get('/api/rooms/available/', params)
+        self.assertEqual(response.data['count'], 13)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+        response = client.get('/api/rooms/available/', {**params, 'stream': '1'})
+        self.assertTrue(response.streaming)
+        rooms = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rooms), 13)
+        self.assertNotIn('201', [r['room_number'] for r in rooms])
+
+class ReportJobQueueTest(TempMediaMixin, TestCase):
+    """Очередь фоновых PDF-отчетов."""
+    def setUp(self) -> None:
+        super().setUp()
+        self.room = Room.objects.create(room_number='301', room_type='Эконом', price_per_night=1500, max_occupancy=1)
+
+    def test_inflight_job_is_reused(self) -> None:
+        """Повторный запрос того же отчета не создает второе задание."""
+        from .reports import enqueue_report
+        first = enqueue_report('booking_report')
+        second = enqueue_report('booking_report')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(first.status, 'queued')
+        self.assertNotEqual(enqueue_report('monthly_report', {'year': 2025, 'month': 3}).pk, first.pk)
+
+    def test_done_report_cached_until_data_changes(self) -> None:
+        """Готовый отчет переиспользуется, пока данные не изменились."""
+        from .reports import enqueue_report, claim_next_job, run_job
+        job = enqueue_report('booking_report')
+        self.assertEqual(claim_next_job(), job.pk)
+        self.assertEqual(run_job(job.pk), 'done')
+        job.refresh_from_db()
+        self.assertTrue(job.file.name.endswith('.pdf'))
+        self.assertEqual(enqueue_report('booking_report').pk, job.pk)
+
+        user = User.objects.create_user(username='olga', password='pass')
+        Booking.objects.create(guest=user, room=self.room, check_in='2025-04-01', check_out='2025-04-03', status='confirmed')
+        job.refresh_from_db()
+        self.assertTrue(job.is_stale)
+        self.assertNotEqual(enqueue_report('booking_report').pk, job.pk)
+
+    def test_invalidation_limited_to_report_sources(self) -> None:
+        """Изменение предложения не трогает статистику комнат, но устаревает отчёт по предложениям."""
+        from .models import ReportJob, SpecialOffer
+        from .reports import enqueue_report, claim_next_job, run_job
+        stats = enqueue_report('room_statistics')
+        offers = enqueue_report('special_offers_report')
+        for _ in range(2):
+            run_job(claim_next_job())
+        SpecialOffer.objects.create(title='Лето', short_description='-', full_description='-')
+        self.assertFalse(ReportJob.objects.get(pk=stats.pk).is_stale)
+        self.assertTrue(ReportJob.objects.get(pk=offers.pk).is_stale)
+
+    def test_running_job_result_not_reused_after_change(self) -> None:
+        """Отчёт, данные которого изменились во время генерации, не переиспользуется."""
+        from .reports import enqueue_report, claim_next_job, run_job
+        job = enqueue_report('booking_report')
+        claim_next_job()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.price_per_night = 1600
+            self.room.save()
+        fresh = enqueue_report('booking_report')
+        self.assertNotEqual(fresh.pk, job.pk)
+        self.assertEqual(run_job(job.pk), 'done')
+        job.refresh_from_db()
+        self.assertTrue(job.is_stale)
+        self.assertEqual(enqueue_report('booking_report').pk, fresh.pk)
+
+    def test_dashboard_endpoint_enqueues(self) -> None:
+        """Эндпоинт дашборда ставит задание и перенаправляет на его страницу."""
+        from .models import ReportJob
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:generate-booking-report-pdf'))
+        job = ReportJob.objects.get()
+        self.assertRedirects(response, reverse('admin:report-job', args=[job.pk]))
+        response = self.client.get(reverse('admin:report-job', args=[job.pk]))
+        self.assertContains(response, 'http-equiv="refresh"')
+
+    def test_dashboard_urls_require_admin_login(self) -> None:
+        """Анонимный запрос к URL дашборда перенаправляется на вход в админку и не ставит задание."""
+        from .models import ReportJob
+        from .reports import claim_next_job, enqueue_report, run_job
+        job = enqueue_report('booking_report')
+        claim_next_job()
+        run_job(job.pk)
+        ReportJob.objects.exclude(pk=job.pk).delete()
+        for url in (
+            reverse('admin:generate-booking-report-pdf'),
+            reverse('admin:report-job', args=[job.pk]),
+            reverse('admin:report-job-download', args=[job.pk]),
+        ):
+            response = self.client.get(url)
+            self.assertRedirects(response, f"{reverse('admin:login')}?next={url}")
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+class PDFFontSettingsTest(TestCase):
+    """Ленивый выбор шрифта для PDF."""
+    def tearDown(self) -> None:
+        from bookings.pdf_utils import get_default_font
+        get_default_font.cache_clear()
+
+    def test_font_resolved_once(self) -> None:
+        """Шрифт ищется один раз на процесс, DEFAULT_FONT остается доступен."""
+        from unittest import mock
+        from bookings import pdf_utils
+        pdf_utils.get_default_font.cache_clear()
+        with mock.patch.object(pdf_utils, 'setup_windows_fonts', return_value='Helvetica') as setup:
+            pdf_utils.PDFGenerator()
+            pdf_utils.PDFGenerator()
+            self.assertEqual(pdf_utils.DEFAULT_FONT, 'Helvetica')
+        setup.assert_called_once()
+
+    def test_missing_configured_font_raises(self) -> None:
+        """Ошибка в явно заданном шрифте не подменяется стандартным."""
+        from django.test import override_settings
+        from bookings.pdf_utils import get_default_font
+        get_default_font.cache_clear()
+        with override_settings(PDF_FONT_PATH='/nonexistent/font.ttf'):
+            with self.assertRaises(Exception):
+                get_default_font()
+
+class FileDownloadTest(TempMediaMixin, TestCase):
+    """Потоковая отдача защищенных файлов."""
+    def setUp(self) -> None:
+        from django.core.files.base import ContentFile
+        super().setUp()
+        self.owner = User.objects.create_user(username='owner', password='pass')
+        self.room = Room.objects.create(room_number='401', room_type='Эконом', price_per_night=900, max_occupancy=1)
+        self.booking = Booking.objects.create(guest=self.owner, room=self.room, check_in='2025-05-01', check_out='2025-05-03')
+        self.booking.contract.save('contract.pdf', ContentFile(b'0123456789' * 100))
+        self.url = reverse('file_download', args=['booking', self.booking.pk, 'contract'])
+        self.client.force_login(self.owner)
+
+    def test_full_download(self) -> None:
+        """Файл отдается целиком с длиной и валидаторами кэша."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '1000')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789' * 100)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_request(self) -> None:
+        """Range возвращает только запрошенные байты."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-14')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-14/1000')
+        self.assertEqual(b''.join(response.streaming_content), b'01234')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_permissions_and_offload(self) -> None:
+        """Чужой файл недоступен, в режиме x-accel тело отдает веб-сервер."""
+        from django.test import override_settings
+        self.client.force_login(User.objects.create_user(username='other', password='pass'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(self.owner)
+        with override_settings(PROTECTED_FILES_OFFLOAD='x-accel'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.booking.contract.name)
+        self.assertEqual(response.content, b'')
+
+class BookingServiceTest(TestCase):
+    """Создание бронирований без пересечений."""
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='guest1', password='pass')
+        self.room = Room.objects.create(room_number='501', room_type='Эконом', price_per_night=800, max_occupancy=2)
+
+    def test_overlap_raises_conflict(self) -> None:
+        """Ожидающее бронирование тоже держит ночи."""
+        from datetime import date
+        from .services import BookingConflict, create_booking
+        create_booking(self.user, self.room, date(2025, 6, 1), date(2025, 6, 4))
+        with self.assertRaises(BookingConflict):
+            create_booking(self.user, self.room, date(2025, 6, 3), date(2025, 6, 5))
+        self.assertEqual(Booking.objects.count(), 1)
+        # Заезд в день выезда допустим
+        create_booking(self.user, self.room, date(2025, 6, 4), date(2025, 6, 6))
+
+    def test_api_returns_conflict(self) -> None:
+        """API отвечает 409 при пересечении."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = {'guest': self.user.pk, 'room': self.room.pk, 'check_in': '2025-07-01', 'check_out': '2025-07-03'}
+        self.assertEqual(client.post('/api/bookings/', payload).status_code, status.HTTP_201_CREATED)
+        response = client.post('/api/bookings/', {**payload, 'check_in': '2025-07-02', 'check_out': '2025-07-04'})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+
+class BookingConcurrencyTest(TransactionTestCase):
+    """Параллельные бронирования одной комнаты."""
+    def test_parallel_bookings_single_winner(self) -> None:
+        """Из многих одновременных запросов на одни даты проходит ровно один."""
+        from concurrent.futures import ThreadPoolExecutor
+        from datetime import date
+        from django.db import connections
+        from .services import BookingConflict, create_booking
+
+        room = Room.objects.create(room_number='601', room_type='Эконом', price_per_night=700, max_occupancy=1)
+        users = [User.objects.create_user(username=f'racer{i}', password='pass') for i in range(8)]
+
+        def attempt(user):
+            try:
+                create_booking(user, room, date(2025, 8, 1), date(2025, 8, 5))
+                return 'ok'
+            except BookingConflict:
+                return 'conflict'
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(attempt, users))
+        self.assertEqual(results.count('ok'), 1)
+        self.assertEqual(results.count('conflict'), 7)
+        self.assertEqual(room.occupied_nights.count(), 4)
+
+class QueryMetricsTest(TestCase):
+    """Метрики запросов и эндпоинт Prometheus."""
+    def setUp(self) -> None:
+        from .metrics import registry
+        registry.reset()
+        self.addCleanup(registry.reset)
+        Room.objects.create(room_number='701', room_type='Эконом', price_per_night=600, max_occupancy=1)
+
+    def test_request_recorded(self) -> None:
+        """Запрос попадает в буфер с числом SQL-запросов и временем сериализации."""
+        from .metrics import registry
+        self.client.get('/api/rooms/')
+        record = registry.recent[-1]
+        self.assertEqual(record['route'], 'room-list')
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['serializer_time'], 0)
+        self.assertGreater(record['response_bytes'], 0)
+
+    def test_prometheus_endpoint(self) -> None:
+        """Эндпоинт доступен персоналу и отдает счетчики в текстовом формате."""
+        self.client.get('/api/rooms/')
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+        self.client.force_login(User.objects.create_superuser('metrics', 'm@example.com', 'pass'))
+        response = self.client.get('/api/_metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('bookings_sql_queries_total{route="room-list"}', response.content.decode())
+
+    def test_duplicate_queries_logged(self) -> None:
+        """Повторяющийся запрос сверх порога пишется в лог со стеком."""
+        from django.http import HttpResponse
+        from django.test import RequestFactory, override_settings
+        from .metrics import QueryMetricsMiddleware
+
+        def n_plus_one_view(request):
+            for room in Room.objects.all():
+                list(room.reviews.all())
+            return HttpResponse('ok')
+
+        for i in range(3):
+            Room.objects.create(room_number=f'80{i}', room_type='Эконом', price_per_night=600, max_occupancy=1)
+        middleware = QueryMetricsMiddleware(n_plus_one_view)
+        with override_settings(METRICS_DUPLICATE_QUERY_THRESHOLD=2):
+            with self.assertLogs('bookings.metrics', level='WARNING') as logs:
+                middleware(RequestFactory().get('/api/rooms/'))
+        self.assertTrue(any('N+1' in line and 'n_plus_one_view' in line for line in logs.output))
+
+
+class KeysetPaginationTest(TestCase):
+    """Курсорная пагинация лент бронирований."""
+    def setUp(self) -> None:
+        """25 бронирований с одинаковым created_at: порядок решают check_in и id."""
+        from datetime import date
+        self.user = User.objects.create_user(username='keyset', password='pass')
+        room = Room.objects.create(room_number='901', room_type='Стандарт', price_per_night=1000, max_occupancy=2)
+        created = timezone.now()
+        for i in range(25):
+            Booking.objects.create(
+                guest=self.user, room=room, check_in=date(2025, 1, 1) + timedelta(days=i),
+                check_out=date(2025, 1, 2) + timedelta(days=i), guests_count=1, created_at=created
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, key='next'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data[key]
+        return ids
+
+    def test_walk_forward_and_back(self) -> None:
+        """Проход вперед покрывает все строки без повторов, назад возвращает к началу."""
+        ids = self.walk('/api/bookings/')
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(len(set(ids)), 25)
+        self.assertEqual(ids, sorted(ids))
+        last_page = self.client.get('/api/bookings/').data
+        while last_page['next']:
+            last_page = self.client.get(last_page['next']).data
+        previous = self.walk(last_page['previous'], key='previous')
+        self.assertEqual(sorted(previous), ids[:20])
+
+    def test_ordering_and_count(self) -> None:
+        """Сортировка OrderingFilter сохраняется в курсоре, COUNT только по запросу."""
+        response = self.client.get('/api/bookings/', {'ordering': 'check_in', 'count': 1})
+        self.assertEqual(response.data['count'], 25)
+        first_page = [item['check_in'] for item in response.data['results']]
+        second_page = [item['check_in'] for item in self.client.get(response.data['next']).data['results']]
+        self.assertEqual(first_page + second_page, sorted(first_page + second_page))
+
+    def test_invalid_cursor(self) -> None:
+        """Поврежденный курсор - 404, а не ошибка сервера."""
+        response = self.client.get('/api/bookings/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PricingTest(TestCase):
+    """Календарь цен по специальным предложениям."""
+    def setUp(self) -> None:
+        """Комната за 1000 с двумя пересекающимися предложениями."""
+        from datetime import date
+        self.room = Room.objects.create(room_number='950', room_type='Стандарт', price_per_night=1000, max_occupancy=2)
+        self.offer = SpecialOffer.objects.create(title='Зима', short_description='-', full_description='-')
+        self.other = SpecialOffer.objects.create(title='Выходные', short_description='-', full_description='-')
+        self.winter = self.room.add_special_offer(self.offer, date(2025, 1, 1), date(2025, 1, 10), 10)
+        self.room.add_special_offer(self.other, date(2025, 1, 5), date(2025, 1, 6), 25)
+
+    def test_quote_uses_best_offer_per_night(self) -> None:
+        """Каждая ночь стоит по максимальной скидке, дни вне окон - по базовой цене; равные цены - один период."""
+        from datetime import date
+        from decimal import Decimal
+        from .pricing import quote
+        result = quote(self.room, date(2024, 12, 31), date(2025, 1, 7))
+        periods = [(segment['nights'], segment['price']) for segment in result['segments']]
+        self.assertEqual(periods, [(1, 1000), (4, Decimal('900.00')), (2, Decimal('750.00'))])
+        self.assertEqual(result['base_total'], 7000)
+        self.assertEqual(result['total'], Decimal('6100.00'))
+        self.assertEqual(result['discount_total'], Decimal('900.00'))
+
+    def test_calendar_follows_changes(self) -> None:
+        """Изменение цены комнаты и удаление предложения перестраивают календарь."""
+        from datetime import date
+        from .models import RoomRate
+        self.room.price_per_night = 2000
+        self.room.save()
+        self.assertEqual(RoomRate.objects.get(room=self.room, date=date(2025, 1, 2)).price, 1800)
+        self.winter.delete()
+        self.assertEqual(list(RoomRate.objects.filter(room=self.room).values_list('date', flat=True).order_by('date')),
+                         [date(2025, 1, 5), date(2025, 1, 6)])
+
+    def test_room_save_without_price_change_keeps_calendar(self) -> None:
+        """Сохранение комнаты без смены цены не перестраивает календарь."""
+        from .models import RoomRate
+        rates = list(RoomRate.objects.filter(room=self.room).order_by('date').values_list('pk', 'date', 'price'))
+        self.assertEqual(len(rates), 10)
+        self.room.room_type = 'Улучшенный'
+        self.room.save()
+        self.room.save(update_fields=['room_type'])
+        self.assertEqual(list(RoomRate.objects.filter(room=self.room).order_by('date').values_list('pk', 'date', 'price')),
+                         rates)
+
+    def test_room_price_methods_single_query(self) -> None:
+        """Текущая цена комнаты - один запрос к календарю."""
+        today = timezone.now().date()
+        self.room.add_special_offer(SpecialOffer.objects.create(title='Сейчас', short_description='-', full_description='-'),
+                                    today, today, 20)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.room.get_current_price_with_discount(), 800)
+        self.assertEqual(self.room.get_max_discount_percentage(), 20)
+        self.assertTrue(self.room.has_active_special_offers())
+
+    def test_quote_endpoint_and_booking_total(self) -> None:
+        """Эндпоинт считает страницу комнат, стоимость бронирования учитывает предложения."""
+        from decimal import Decimal
+        other_room = Room.objects.create(room_number='951', room_type='Эконом', price_per_night=500, max_occupancy=1)
+        client = APIClient()
+        response = client.get('/api/rooms/quote/', {
+            'check_in': '2025-01-04', 'check_out': '2025-01-07', 'rooms': f'{self.room.id},{other_room.id}'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        quotes = {item['room_number']: item for item in response.data['results']}
+        self.assertEqual(Decimal(quotes['950']['total']), Decimal('2400.00'))
+        self.assertEqual(Decimal(quotes['951']['total']), Decimal('1500.00'))
+        self.assertEqual(len(quotes['950']['segments']), 2)
+        response = client.get('/api/rooms/quote/', {'check_in': '2025-01-07', 'check_out': '2025-01-04'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        user = User.objects.create_user(username='quote', password='pass')
+        booking = Booking.objects.create(guest=user, room=self.room, check_in='2025-01-04', check_out='2025-01-07', guests_count=1)
+        self.assertEqual(booking.total_price(), Decimal('2400.00'))
+
+
+class RoomCountersTest(TestCase):
+    """Денормализованные счётчики отзывов и подтверждённых бронирований."""
+    def setUp(self) -> None:
+        """Две комнаты и два гостя."""
+        self.room = Room.objects.create(room_number='970', room_type='Стандарт', price_per_night=1000, max_occupancy=2)
+        self.other = Room.objects.create(room_number='971', room_type='Стандарт', price_per_night=1000, max_occupancy=2)
+        self.users = [User.objects.create_user(username=f'counter{i}', password='pass') for i in range(2)]
+
+    def counters(self, room):
+        room.refresh_from_db()
+        return room.rating_sum, room.rating_count, room.confirmed_booking_count, room.average_rating
+
+    def test_reviews_and_bookings_update_counters(self) -> None:
+        """Создание, изменение и удаление меняют счётчики обеих комнат."""
+        review = Review.objects.create(room=self.room, guest=self.users[0], rating=5, comment='Отлично')
+        Review.objects.create(room=self.room, guest=self.users[1], rating=2, comment='Плохо')
+        booking = Booking.objects.create(guest=self.users[0], room=self.room, check_in='2025-06-01',
+                                         check_out='2025-06-03', guests_count=1, status='confirmed')
+        self.assertEqual(self.counters(self.room), (7, 2, 1, 3.5))
+
+        review.room = self.other
+        review.save()
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertEqual(self.counters(self.room), (2, 1, 0, 2.0))
+        self.assertEqual(self.counters(self.other), (5, 1, 0, 5.0))
+
+        # Сохранение комнаты, прочитанной до изменений, не затирает счётчики
+        stale = Room.objects.get(pk=self.other.pk)
+        review.delete()
+        stale.price_per_night = 1200
+        stale.save()
+        self.assertEqual(self.counters(self.other), (0, 0, 0, 0.0))
+
+    def test_listings_and_reconcile(self) -> None:
+        """Листинги читают счётчики, сверка исправляет обход сигналов."""
+        from .counters import reconcile_room_counters
+        Review.objects.create(room=self.room, guest=self.users[0], rating=3, comment='Нормально')
+        Review.objects.create(room=self.other, guest=self.users[0], rating=5, comment='Отлично')
+        self.assertEqual([room.room_number for room in Room.rooms.top_rated(3)], ['971', '970'])
+        self.assertEqual(Room.get_top_rated_rooms().first().avg_rating, 5.0)
+
+        Review.objects.filter(room=self.room).update(rating=1)
+        self.assertEqual(reconcile_room_counters(dry_run=True), [(self.room.pk, (3, 1, 0), (1, 1, 0))])
+        reconcile_room_counters()
+        self.assertEqual(self.counters(self.room)[:2], (1, 1))
+        self.assertEqual(reconcile_room_counters(), [])
+
+    def test_decrement_stops_at_zero(self) -> None:
+        """Отставший счётчик (массовая операция без сигналов) не ломает удаление."""
+        review = Review.objects.create(room=self.room, guest=self.users[0], rating=4, comment='Хорошо')
+        booking = Booking.objects.create(guest=self.users[0], room=self.room, check_in='2025-07-01',
+                                         check_out='2025-07-03', guests_count=1, status='confirmed')
+        Room.objects.filter(pk=self.room.pk).update(rating_sum=0, rating_count=0, confirmed_booking_count=0)
+        review.delete()
+        booking.delete()
+        self.assertEqual(self.counters(self.room), (0, 0, 0, 0.0))
+
+    def test_rating_read_from_counters(self) -> None:
+        """Рейтинг и число отзывов комнаты и сериализатора - из колонок, без запросов."""
+        Review.objects.create(room=self.room, guest=self.users[0], rating=4, comment='Хорошо')
+        Review.objects.create(room=self.room, guest=self.users[1], rating=2, comment='Так себе')
+        self.room.refresh_from_db()
+        serializer = RoomSerializer(self.room)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.room.get_average_rating(), 3.0)
+            self.assertEqual(serializer.get_average_rating(self.room), 3.0)
+            self.assertEqual(serializer.get_total_reviews(self.room), 2)
+
+
+class ReviewSearchTest(TestCase):
+    """Полнотекстовый поиск по отзывам и ранжирование комнат."""
+    def setUp(self) -> None:
+        """Три комнаты, в одной два отзыва про завтрак."""
+        self.rooms = [
+            Room.objects.create(room_number=f'98{i}', room_type='Стандарт', price_per_night=1000, max_occupancy=2)
+            for i in range(3)
+        ]
+        self.users = [User.objects.create_user(username=f'search{i}', password='pass') for i in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def create_reviews(self) -> Review:
+        Review.objects.create(room=self.rooms[0], guest=self.users[0], rating=5, comment='Вкусные завтраки')
+        Review.objects.create(room=self.rooms[0], guest=self.users[1], rating=4, comment='Завтрак хороший, персоналом довольны')
+        Review.objects.create(room=self.rooms[1], guest=self.users[0], rating=3, comment='Завтраком не кормили, шумно')
+        return Review.objects.create(room=self.rooms[2], guest=self.users[1], rating=5, comment='Тихий номер')
+
+    def test_stemmer(self) -> None:
+        """Формы слова сводятся к одной основе."""
+        from .stemmer import stem, terms
+        self.assertEqual({stem(word) for word in ['завтрак', 'завтраки', 'завтраком']}, {'завтрак'})
+        self.assertEqual(terms('Чистые номера, Wi-Fi!'), ['чист', 'номер', 'wi', 'fi'])
+
+    def test_ranked_by_relevance_and_updated_on_save(self) -> None:
+        """Формы слов находятся, комнаты упорядочены по рангу, индекс следует за изменениями."""
+        quiet = self.create_reviews()
+        response = self.client.get('/api/rooms/by_review_keyword/', {'keyword': 'завтраки'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([room['room_number'] for room in response.data['results']], ['980', '981'])
+        self.assertEqual([room.room_number for room in Room.get_rooms_by_review_keywords('хороший завтрак')], ['980'])
+
+        quiet.comment = 'Завтрак отличный'
+        quiet.save()
+        Review.objects.filter(room=self.rooms[1]).delete()
+        self.assertEqual(
+            {room.room_number for room in Room.get_rooms_by_review_keywords('завтрак')}, {'980', '982'}
+        )
+        self.assertFalse(Room.get_rooms_by_review_keywords('тихий').exists())
+
+    def test_fts5_rebuild_in_batches(self) -> None:
+        """Перестройка FTS5 пачками сохраняет все отзывы."""
+        from django.test.utils import override_settings
+        from .search import rank_rooms, rebuild_review_index, search_backend
+        self.create_reviews()
+        with override_settings(REVIEW_SEARCH_BACKEND='auto'):
+            if search_backend() != 'fts5':
+                self.skipTest('SQLite без FTS5')
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(rebuild_review_index(batch_size=3), 4)
+            # executemany пишется одной записью: '3 times: INSERT ...'
+            inserts = [q['sql'].split(':')[0] for q in ctx.captured_queries if 'INSERT INTO bookings_review_fts' in q['sql']]
+            self.assertEqual(inserts, ['3 times', '1 times'])
+            self.assertEqual(set(rank_rooms('завтраки')), {self.rooms[0].pk, self.rooms[1].pk})
+
+    def test_inverted_index_backend(self) -> None:
+        """Обратный индекс ReviewSearchTerm даёт те же комнаты."""
+        from django.test.utils import override_settings
+        from .search import rank_rooms, rebuild_review_index
+        self.create_reviews()
+        with override_settings(REVIEW_SEARCH_BACKEND='terms'):
+            self.assertEqual(rebuild_review_index(), 4)
+            ranks = rank_rooms('завтраки')
+            self.assertEqual(set(ranks), {self.rooms[0].pk, self.rooms[1].pk})
+            self.assertGreater(ranks[self.rooms[0].pk], ranks[self.rooms[1].pk])
+            self.assertEqual(set(rank_rooms('персонал завтрак')), {self.rooms[0].pk})
+            self.assertEqual(rank_rooms('!!!'), {})
+
+
+class SubstringSearchTest(TestCase):
+    """Поиск подстроки по триграммному индексу в фильтрах и админке."""
+    def setUp(self) -> None:
+        """Комнаты с удобствами и гости."""
+        self.suite = Room.objects.create(room_number='990', room_type='Люкс', price_per_night=5000, max_occupancy=2)
+        self.standard = Room.objects.create(room_number='991', room_type='Стандарт', price_per_night=1000, max_occupancy=2)
+        for name in ('Мини-бар', 'Мини-сейф'):
+            self.suite.amenities.create(name=name)
+        self.guests = [
+            Guest.objects.create(user=User.objects.create_user(username=f'sub{i}', password='pass'),
+                                 first_name='Иван', last_name=f'Петров{i}', email=f'guest{i}@mail.example',
+                                 phone_number=f'+7900555{i:04d}')
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.guests[0].user)
+
+    def test_room_filters(self) -> None:
+        """Регистр не важен, совпадение по двум удобствам даёт одну комнату."""
+        response = self.client.get('/api/rooms/', {'room_type': 'ЛЮКС'})
+        self.assertEqual([room['room_number'] for room in response.data['results']], ['990'])
+        response = self.client.get('/api/rooms/', {'amenities': 'мини'})
+        self.assertEqual([room['room_number'] for room in response.data['results']], ['990'])
+        response = self.client.get('/api/rooms/', {'room_type': 'Лю'})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_guest_filter_follows_updates(self) -> None:
+        """Индекс следует за update() и удалением, админка ищет по нему."""
+        from django.contrib import admin
+        from .filters import GuestFilter
+        Guest.objects.filter(pk=self.guests[1].pk).update(email='changed@mail.example')
+        self.guests[2].delete()
+        self.assertEqual(list(GuestFilter({'email': 'guest'}, queryset=Guest.objects.all()).qs), [self.guests[0]])
+        self.assertEqual(list(GuestFilter({'email': 'CHANGED@'}, queryset=Guest.objects.all()).qs), [self.guests[1]])
+
+        model_admin = admin.site._registry[Guest]
+        found, _ = model_admin.get_search_results(None, Guest.objects.all(), 'иван петров1')
+        self.assertEqual(list(found), [self.guests[1]])
+
+    def test_trigram_table_backend(self) -> None:
+        """Таблица SearchTrigram: кандидаты по триграммам проверяются icontains."""
+        from django.test.utils import override_settings
+        from .substring import contains, rebuild_substring_index
+        with override_settings(SUBSTRING_SEARCH_BACKEND='terms'):
+            self.assertEqual(rebuild_substring_index([Guest]), 3)
+            self.guests[0].email = 'abcxbcd@mail.example'
+            self.guests[0].save()
+            self.assertFalse(Guest.objects.filter(contains(Guest, 'email', 'abcd')).exists())
+            self.assertEqual(list(Guest.objects.filter(contains(Guest, 'email', 'xbcd@'))), [self.guests[0]])
+            self.assertEqual(Guest.objects.filter(contains(Guest, 'phone_number', '5550')).count(), 3)
+
+
+class AsyncReadViewsTest(TestCase):
+    """Асинхронные представления чтения отдают то же, что и вьюсеты DRF."""
+    def setUp(self) -> None:
+        """Комнаты с удобством, отзывом и текущим бронированием."""
+        self.rooms = [
+            Room.objects.create(room_number=f'99{i}', room_type='Стандарт', price_per_night=1000 + i, max_occupancy=2)
+            for i in range(12)
+        ]
+        self.rooms[0].amenities.create(name='Wi-Fi')
+        user = User.objects.create_user(username='asyncreader', password='pass')
+        Review.objects.create(room=self.rooms[0], guest=user, rating=5, comment='Отлично')
+        today = timezone.now().date()
+        Booking.objects.create(guest=user, room=self.rooms[1], check_in=today, check_out=today + timedelta(days=2),
+                               guests_count=1, status='confirmed')
+
+    async def compare(self, path: str) -> Any:
+        from asgiref.sync import sync_to_async
+        expected = await sync_to_async(self.client.get)(f'/api/{path}')
+        response = await self.async_client.get(f'/api/async/{path}')
+        self.assertEqual(response.status_code, expected.status_code)
+        data = response.json()
+        if isinstance(data, dict) and 'next' in data:
+            for key in ('next', 'previous'):
+                if data[key]:
+                    data[key] = data[key].replace('/api/async/', '/api/')
+        self.assertEqual(data, expected.json())
+        return data
+
+    async def test_rooms(self) -> None:
+        """Список с фильтрами и страницами, карточка, свободные комнаты, 404."""
+        data = await self.compare('rooms/?ordering=-price_per_night&min_price=1001')
+        self.assertEqual(data['count'], 11)
+        await self.compare('rooms/?page=2&ordering=-price_per_night')
+        detail = await self.compare(f'rooms/{self.rooms[0].pk}/')
+        self.assertEqual(detail['total_reviews'], 1)
+        await self.compare('rooms/available/?check_in=2030-01-01&check_out=2030-01-03')
+        await self.compare('rooms/?page=5')
+        last = await self.compare('rooms/?page=last')
+        self.assertEqual(len(last['results']), 2)
+        await self.compare('rooms/?page=abc')
+        await self.compare('rooms/0/')
+
+    async def test_reviews(self) -> None:
+        """Лента отзывов с курсором и счётчиком."""
+        data = await self.compare('reviews/?count=1')
+        self.assertEqual(data['count'], 1)
+        await self.compare('reviews/?cursor=broken')
+
+
+class DatabaseProfileTest(TestCase):
+    """Профиль SQLite из настроек: PRAGMA при создании соединения."""
+
+    def pragmas(self, raw_connection: Any) -> dict:
+        from django.conf import settings
+        return {
+            name: raw_connection.execute(f'PRAGMA {name}').fetchone()
+            for name in settings.SQLITE_PRAGMAS
+        }
+
+    def test_pragmas_applied(self) -> None:
+        """Текущее соединение ждет блокировку и пишет с synchronous=NORMAL."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('только SQLite')
+        connection.ensure_connection()
+        pragmas = self.pragmas(connection.connection)
+        self.assertEqual(pragmas['busy_timeout'], (20000,))
+        self.assertEqual(pragmas['synchronous'], (1,))
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_new_connection(self) -> None:
+        """Каждое новое соединение получает те же PRAGMA."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('только SQLite')
+        connection.ensure_connection()
+        raw_connection = connection.get_new_connection(connection.get_connection_params())
+        try:
+            self.assertEqual(self.pragmas(raw_connection), self.pragmas(connection.connection))
+        finally:
+            raw_connection.close()
+
+
+class AdminChangelistQueryTest(TempMediaMixin, TestCase):
+    """Число запросов списков админки не зависит от числа строк."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.admin = User.objects.create_superuser('changelist', 'c@example.com', 'pass')
+        self.client.force_login(self.admin)
+        self.wifi = Amenity.objects.create(name='Wi-Fi')
+        self.offer = SpecialOffer.objects.create(title='Скидка', image='test.jpg', short_description='d', full_description='f')
+
+    def _add_rows(self, start: int, count: int) -> None:
+        """Комнаты с удобствами, предложениями и документами разных связей."""
+        from django.core.files.base import ContentFile
+        from .models import RoomSpecialOffer
+        today = timezone.now().date()
+        for i in range(start, start + count):
+            room = Room.objects.create(room_number=f'7{i:02d}', room_type='Стандарт', price_per_night=1000, max_occupancy=2)
+            room.amenities.add(self.wifi, Amenity.objects.create(name=f'Удобство {i}'))
+            RoomSpecialOffer.objects.create(room=room, special_offer=self.offer, start_date=today,
+                                            end_date=today + timedelta(days=3), discount_percentage=10)
+            offer = SpecialOffer.objects.create(title=f'Предложение {i}', image='test.jpg', short_description='d', full_description='f')
+            RoomSpecialOffer.objects.create(room=room, special_offer=offer, start_date=today - timedelta(days=5),
+                                            end_date=today - timedelta(days=1))
+            user = User.objects.create_user(username=f'changelist{i}')
+            guest = Guest.objects.create(user=user, first_name='Гость', last_name=str(i), email=f'g{i}@mail.com', phone_number='1')
+            booking = Booking.objects.create(guest=user, room=room, check_in=today + timedelta(days=30),
+                                             check_out=today + timedelta(days=32))
+            for related in ({'room': room}, {'guest': guest}, {'booking': booking}):
+                Document.objects.create(title=f'Документ {i}', file=ContentFile(b'data', name='doc.pdf'),
+                                        uploaded_by=self.admin, **related)
+
+    def _count_queries(self, model: str) -> tuple:
+        """Число запросов и ответ GET списка модели в админке."""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(f'admin:bookings_{model}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def assertConstantQueries(self, *models: str) -> dict:
+        """2 и 10 строк на странице дают одинаковое число запросов."""
+        self._add_rows(0, 2)
+        small = {model: self._count_queries(model)[0] for model in models}
+        self._add_rows(2, 8)
+        responses = {}
+        for model in models:
+            large, responses[model] = self._count_queries(model)
+            self.assertEqual(small[model], large, model)
+        return responses
+
+    def test_rooms_and_amenities(self) -> None:
+        """Комнаты с ценой и предложениями, удобства с числом комнат."""
+        response = self.assertConstantQueries('room', 'amenity')['amenity']
+        row = next(row for row in response.context['cl'].result_list if row.pk == self.wifi.pk)
+        self.assertEqual(row.rooms_total, 10)
+
+    def test_special_offers(self) -> None:
+        """Всего и активных применений - из аннотаций."""
+        response = self.assertConstantQueries('specialoffer', 'roomspecialoffer')['specialoffer']
+        offers = {offer.pk: offer for offer in response.context['cl'].result_list}
+        self.assertEqual(offers[self.offer.pk].applications_total, 10)
+        self.assertEqual(offers[self.offer.pk].active_applications_total, 10)
+        other = next(offer for offer in offers.values() if offer.pk != self.offer.pk)
+        self.assertEqual((other.applications_total, other.active_applications_total), (1, 0))
+
+    def test_documents(self) -> None:
+        """Связанный объект документа не подгружается построчно."""
+        response = self.assertConstantQueries('document')['document']
+        self.assertContains(response, 'Комната: 700')
+        self.assertContains(response, 'Гость: Гость 0')
+        self.assertContains(response, 'Бронирование: ')
+
+
+class ImageDerivativeTest(TempMediaMixin, TestCase):
+    """Уменьшенные копии загруженных изображений и их выдача в API."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.override_settings(
+            IMAGE_DERIVATIVES_EAGER=True,
+            IMAGE_DERIVATIVE_WIDTHS=[64, 128], IMAGE_DERIVATIVE_FORMATS={'webp': 75, 'jpeg': 80},
+        )
+
+    def _upload(self, name: str = 'photo.png', color: str = 'red') -> Any:
+        """PNG 300x200 как загруженный файл."""
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 200), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_room_photo_variants(self) -> None:
+        """Копии строятся при загрузке, одинаковый файл не обрабатывается дважды."""
+        from .models import ImageDerivative, ImageSource, SliderImage
+        room = Room.objects.create(room_number='801', room_type='Люкс', price_per_night=1000, max_occupancy=2,
+                                   photo=self._upload())
+        source = ImageSource.objects.get(name=room.photo.name)
+        self.assertEqual((source.status, source.width, source.height), ('done', 300, 200))
+        self.assertEqual(
+            sorted(ImageDerivative.objects.values_list('format', 'width', 'height')),
+            [('jpeg', 64, 43), ('jpeg', 128, 85), ('webp', 64, 43), ('webp', 128, 85)],
+        )
+        SliderImage.objects.create(image=self._upload('same.png'))
+        self.assertEqual(ImageDerivative.objects.count(), 4)
+
+        data = APIClient().get(reverse('room-list')).json()['results'][0]['photo_variants']
+        self.assertEqual([source['type'] for source in data['sources']], ['image/webp', 'image/jpeg'])
+        self.assertRegex(data['sources'][0]['srcset'], r'^http://testserver/media/derivatives/.+/64\.webp 64w, .+/128\.webp 128w$')
+        self.assertTrue(data['thumbnail'].endswith('/64.webp'))
+
+    def test_slider_list_queries(self) -> None:
+        """Миниатюры слайдов - настоящие копии, запросов не больше с ростом списка."""
+        from .models import SliderImage
+
+        def list_queries() -> tuple:
+            with CaptureQueriesContext(connection) as ctx:
+                response = APIClient().get('/api/slider-images/')
+            return len(ctx.captured_queries), response.json()
+
+        SliderImage.objects.create(image=self._upload('a.png', 'red'))
+        small, _ = list_queries()
+        for color in ('green', 'blue', 'white'):
+            SliderImage.objects.create(image=self._upload(f'{color}.png', color))
+        large, data = list_queries()
+        self.assertEqual(small, large)
+        slides = data['results'] if isinstance(data, dict) else data
+        self.assertTrue(all(slide['thumbnail_url'].endswith('/64.webp') for slide in slides))
+
+    def test_rebuild_command(self) -> None:
+        """Команда ставит в очередь удаленные копии и с --force пересоздает все."""
+        import io
+        from django.core.management import call_command
+        from .images import claim_next_source, process_source
+        from .models import ImageDerivative, ImageSource
+        with self.settings(IMAGE_DERIVATIVES_EAGER=False):
+            room = Room.objects.create(room_number='802', room_type='Люкс', price_per_night=1000, max_occupancy=2,
+                                       photo=self._upload())
+        self.assertEqual(ImageSource.objects.get().status, 'queued')
+        self.assertIsNone(RoomSerializer(room).data['photo_variants'])
+
+        call_command('rebuild_image_derivatives', '--queue-only', stdout=io.StringIO())
+        process_source(claim_next_source())
+        self.assertEqual(ImageDerivative.objects.count(), 4)
+        call_command('rebuild_image_derivatives', '--queue-only', stdout=io.StringIO())
+        self.assertIsNone(claim_next_source())
+
+        call_command('rebuild_image_derivatives', '--force', '--queue-only', stdout=io.StringIO())
+        self.assertEqual(ImageDerivative.objects.count(), 0)
+        process_source(claim_next_source())
+        self.assertEqual(ImageDerivative.objects.count(), 4)
+
+
+class UploadSessionTest(TempMediaMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.override_settings(UPLOAD_STAGING_DIR=os.path.join(self.media_root, 'staging'), UPLOAD_CHUNK_MAX_SIZE=16)
+        self.user = User.objects.create_user(username='uploader', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _put(self, session_id: int, item_id: int, data: bytes, start: int, size: int) -> Any:
+        return self.client.generic(
+            'PUT', f'/api/document-uploads/{session_id}/files/{item_id}/', data,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(data) - 1}/{size}',
+        )
+
+    def test_chunked_upload(self) -> None:
+        """Файл передается частями, повтор части - 409 с позицией, после последней создается документ."""
+        from django.conf import settings
+        from .models import Document
+        content = b'0123456789abcdefghij'
+        response = self.client.post('/api/document-uploads/', {
+            'file_type': 'other', 'description_template': 'Архив {filename}',
+            'files': [{'name': 'big.txt', 'size': len(content)}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        session_id, item_id = response.data['id'], response.data['items'][0]['id']
+
+        response = self._put(session_id, item_id, content[:12], 0, len(content))
+        self.assertEqual(response.json()['items'][0]['received'], 12)
+        self.assertEqual(self._put(session_id, item_id, content[:12], 0, len(content)).json()['received'], 12)
+        self.assertEqual(self._put(session_id, item_id, content, 0, len(content)).status_code, 413)
+
+        response = self._put(session_id, item_id, content[12:], 12, len(content))
+        self.assertEqual(response.json()['status'], 'done')
+        document = Document.objects.get()
+        self.assertEqual((document.title, document.description), ('big.txt', 'Архив big.txt'))
+        with document.file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertFalse(os.path.exists(os.path.join(settings.UPLOAD_STAGING_DIR, str(session_id))))
+
+        other = User.objects.create_user(username='other')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/api/document-uploads/{session_id}/').status_code, 404)
+
+    def test_store_session_bulk_create(self) -> None:
+        """Полученные файлы сохраняются потоками, документы создаются одним INSERT."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .models import Document, UploadItem
+        from .uploads import start_session, store_session
+        files = [SimpleUploadedFile(f'doc{i}.txt', f'file {i}'.encode()) for i in range(5)]
+        session = start_session(self.user, [(f.name, f.size) for f in files], received=True, file_type='contract')
+        items = dict(zip(session.items.all(), files))
+        with CaptureQueriesContext(connection) as ctx:
+            documents = store_session(session, items)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "bookings_document"')]
+        self.assertEqual((len(documents), len(inserts)), (5, 1))
+        self.assertEqual(set(UploadItem.objects.values_list('status', flat=True)), {'done'})
+        self.assertEqual(session.status, 'done')
+        self.assertEqual(
+            sorted(Document.objects.values_list('title', flat=True)), [f'doc{i}.txt' for i in range(5)]
+        )
+
+    def test_empty_file_and_validation(self) -> None:
+        """Пустой файл сохраняется сразу, неверный шаблон описания отклоняется."""
+        response = self.client.post('/api/document-uploads/', {
+            'file_type': 'other', 'files': [{'name': 'empty.txt', 'size': 0}],
+        }, format='json')
+        self.assertEqual(response.data['status'], 'done')
+        for template in ('{other}', '{filename.foo}', '{filename.upper.x}', '{filename[0]}', '{filename:d}', '{'):
+            response = self.client.post('/api/document-uploads/', {
+                'file_type': 'other', 'description_template': template, 'files': [{'name': 'a.txt', 'size': 1}],
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, template)
+
+
+class DeduplicatingStorageTest(TempMediaMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = User.objects.create_user(username='dedupe', password='pass')
+
+    def test_same_content_stored_once(self) -> None:
+        """Один скан в разных полях - разные имена, один блоб на диске."""
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        guest = Guest.objects.create(user=self.user, first_name='Анна', last_name='Иванова',
+                                     email='dedupe@mail.com', phone_number='1')
+        guest.passport_scan.save('scan.pdf', ContentFile(b'%PDF passport'))
+        document = Document.objects.create(title='Паспорт', file=ContentFile(b'%PDF passport', name='scan.pdf'),
+                                           uploaded_by=self.user)
+        other = default_storage.save('bookings/additional_files/other.pdf', ContentFile(b'%PDF other'))
+
+        self.assertNotEqual(guest.passport_scan.name, document.file.name)
+        self.assertTrue(os.path.samefile(guest.passport_scan.path, document.file.path))
+        with document.file.open('rb') as f:
+            self.assertEqual(f.read(), b'%PDF passport')
+        self.assertTrue(guest.passport_scan.url.startswith('/media/guests/passports/'))
+        self.assertEqual(default_storage.usage(), {
+            'blobs': 2, 'links': 3, 'stored_bytes': 23, 'referenced_bytes': 36,
+        })
+        self.assertEqual(default_storage.save('copy.pdf', ContentFile(b'%PDF other')), 'copy.pdf')
+        self.assertTrue(os.path.samefile(default_storage.path(other), default_storage.path('copy.pdf')))
+
+    def test_garbage_collection(self) -> None:
+        """Блоб удаляется сборкой мусора только после удаления последней ссылки."""
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        first = default_storage.save('a/scan.pdf', ContentFile(b'scan'))
+        second = default_storage.save('b/scan.pdf', ContentFile(b'scan'))
+        default_storage.delete(first)
+        self.assertEqual(default_storage.collect_garbage(), (0, 0))
+        default_storage.delete(second)
+        self.assertEqual(default_storage.collect_garbage(dry_run=True), (1, 4))
+        self.assertEqual(default_storage.collect_garbage(), (1, 4))
+        self.assertEqual(default_storage.usage()['blobs'], 0)
+        # После сборки то же содержимое сохраняется заново
+        third = default_storage.save('c/scan.pdf', ContentFile(b'scan'))
+        with default_storage.open(third) as f:
+            self.assertEqual(f.read(), b'scan')
+
+    def test_dedupe_command(self) -> None:
+        """Команда переводит ранее сохраненные копии на общий блоб и удаляет файлы без ссылок."""
+        import io
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        for name in ('documents/one.pdf', 'guests/passports/two.pdf', 'orphan.pdf'):
+            path = default_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'same scan')
+        Document.objects.create(title='Один', file='documents/one.pdf', uploaded_by=self.user)
+        Document.objects.create(title='Два', file='guests/passports/two.pdf', uploaded_by=self.user)
+
+        out = io.StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('Переведено на блобы файлов: 3', out.getvalue())
+        self.assertEqual(default_storage.usage()['links'], 3)
+        self.assertTrue(os.path.samefile(default_storage.path('documents/one.pdf'),
+                                         default_storage.path('guests/passports/two.pdf')))
+
+        call_command('dedupe_media', '--prune', stdout=io.StringIO())
+        self.assertTrue(default_storage.exists('orphan.pdf'))
+        call_command('dedupe_media', '--prune', '--min-age', '0', stdout=io.StringIO())
+        self.assertFalse(default_storage.exists('orphan.pdf'))
+        self.assertEqual(default_storage.usage()['links'], 2)
+
+
+class DocumentMetadataTest(TempMediaMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = User.objects.create_user(username='meta', password='pass')
+
+    def _png(self) -> bytes:
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (30, 20), 'red').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_metadata_on_upload(self) -> None:
+        """Метаданные извлекаются при загрузке, размер и тип читаются без хранилища."""
+        import hashlib
+        import io
+        from reportlab.pdfgen import canvas
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+        png = self._png()
+        # Расширение обманчиво: тип определяется по содержимому
+        image = Document.objects.create(title='Фото', file=ContentFile(png, name='scan.bin'), uploaded_by=self.user)
+        pdf_buffer = io.BytesIO()
+        pages = canvas.Canvas(pdf_buffer)
+        for _ in range(3):
+            pages.showPage()
+        pages.save()
+        pdf = Document.objects.create(title='Договор', file=ContentFile(pdf_buffer.getvalue(), name='contract.pdf'))
+        image.refresh_from_db()
+        self.assertEqual(
+            (image.file_size, image.mime_type, image.image_width, image.image_height, image.checksum),
+            (len(png), 'image/png', 30, 20, hashlib.sha256(png).hexdigest()),
+        )
+        self.assertTrue(image.is_image())
+        pdf.refresh_from_db()
+        self.assertEqual((pdf.mime_type, pdf.page_count), ('application/pdf', 3))
+
+        with mock.patch.object(FileSystemStorage, 'size', side_effect=AssertionError('stat')):
+            self.assertEqual(image.get_file_size_display(), f'{len(png):.1f} B')
+        self.assertEqual(list(Document.objects.filter(file_size__gt=50, mime_type__startswith='image/')), [image])
+
+    def test_bulk_upload_and_backfill(self) -> None:
+        """Пакетная загрузка заполняет метаданные, команда - у старых документов."""
+        import io
+        from django.core.files.storage import default_storage
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.management import call_command
+        from .uploads import start_session, store_session
+        files = [SimpleUploadedFile('a.png', self._png()), SimpleUploadedFile('b.txt', b'hello')]
+        session = start_session(self.user, [(f.name, f.size) for f in files], received=True)
+        documents = store_session(session, dict(zip(session.items.all(), files)))
+        self.assertEqual(sorted(d.mime_type for d in documents), ['image/png', 'text/plain'])
+
+        name = default_storage.save('documents/old.txt', io.BytesIO(b'old file'))
+        Document.objects.bulk_create([
+            Document(title='Старый', file=name),
+            Document(title='Пропавший', file='documents/missing.txt'),
+        ])
+        out, err = io.StringIO(), io.StringIO()
+        call_command('backfill_document_metadata', stdout=out, stderr=err)
+        self.assertIn('Обновлено документов: 1, файлов не найдено: 1', out.getvalue())
+        self.assertEqual(Document.objects.get(title='Старый').file_size, 8)
+        self.assertEqual(Document.objects.filter(file_size__isnull=True).count(), 1)
+
+        missing = Document.objects.get(title='Пропавший')
+        missing.is_public = True
+        with self.assertLogs('bookings.models', 'WARNING'):
+            missing.save()
+        missing.refresh_from_db()
+        self.assertEqual((missing.is_public, missing.file_size), (True, None))
@@ -0,0 +1,217 @@
+# bookings/uploads.py
+"""
+Пакетная загрузка документов.
+
+Файлы записываются в хранилище параллельно в пуле потоков (запись в
+хранилище - ожидание ввода-вывода, особенно для сетевого), а строки
+Document создаются одним bulk_create в одной транзакции. Прогресс
+каждого файла хранится в UploadItem и доступен клиенту по
+GET /api/document-uploads/<id>/.
+
+Пути загрузки:
+- форма bulk_document_upload: файлы уже получены Django и сразу
+  сохраняются (store_session);
+- API для больших файлов: сессия создаётся по списку имён и размеров,
+  каждый файл передаётся частями (PUT с заголовком Content-Range) во
+  временный каталог UPLOAD_STAGING_DIR. Прерванную передачу можно
+  продолжить с байта received из статуса. Когда получен последний
+  файл, сессия сохраняется в хранилище.
+"""
+import io
+import logging
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .file_metadata import extract_metadata
+from .models import Document, UploadItem, UploadSession
+from .substring import index_object
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadConflict(Exception):
+    """Часть файла не продолжает уже полученные байты или файл уже получен"""
+
+    def __init__(self, received):
+        super().__init__(f'Ожидается продолжение с байта {received}')
+        self.received = received
+
+
+def start_session(user, files, received=False, **options):
+    """
+    Создаёт сессию для файлов [(имя, размер)]. received - файлы уже
+    получены целиком (форма), иначе их ждут частями.
+    """
+    session = UploadSession.objects.create(user=user, **options)
+    UploadItem.objects.bulk_create([
+        UploadItem(
+            session=session, filename=name, size=size,
+            received=size if received else 0,
+            status=UploadItem.STATUS_RECEIVED if received or not size else UploadItem.STATUS_PENDING,
+        )
+        for name, size in files
+    ])
+    return session
+
+
+def staging_path(item):
+    return Path(settings.UPLOAD_STAGING_DIR) / str(item.session_id) / str(item.pk)
+
+
+def parse_content_range(header, length):
+    """(начало, длина части) из Content-Range; без заголовка - весь файл одним запросом"""
+    if not header:
+        return 0, length
+    match = CONTENT_RANGE.match(header.strip())
+    if not match:
+        raise ValueError('Неверный заголовок Content-Range')
+    start, end, _ = map(int, match.groups())
+    if end < start or end - start + 1 != length:
+        raise ValueError('Длина части не совпадает с Content-Range')
+    return start, length
+
+
+def receive_chunk(item, start, length, stream):
+    """
+    Дописывает часть файла во временный каталог. Часть должна начинаться
+    с уже полученного байта: параллельная или повторная отправка той же
+    части получает UploadConflict с актуальной позицией.
+    """
+    if item.status != UploadItem.STATUS_PENDING or start != item.received:
+        raise UploadConflict(item.received)
+    if start + length > item.size:
+        raise ValueError('Часть выходит за размер файла')
+    path = staging_path(item)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with open(path, 'r+b' if path.exists() else 'wb') as f:
+        f.seek(start)
+        # Байты после start не подтверждены клиенту и переписываются
+        f.truncate()
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            f.write(data)
+            written += len(data)
+
+    received = start + written
+    status = UploadItem.STATUS_RECEIVED if received == item.size else UploadItem.STATUS_PENDING
+    if not UploadItem.objects.filter(pk=item.pk, received=start, status=UploadItem.STATUS_PENDING).update(
+        received=received, status=status
+    ):
+        raise UploadConflict(UploadItem.objects.values_list('received', flat=True).get(pk=item.pk))
+    item.received, item.status = received, status
+    if written < length:
+        raise ValueError(f'Получено {written} из {length} байт части')
+    if status == UploadItem.STATUS_RECEIVED:
+        store_received(item.session_id)
+    return item
+
+
+def store_received(session_id):
+    """Сохраняет сессию, если все её файлы получены; выполняется один раз"""
+    claimed = UploadSession.objects.filter(pk=session_id, status=UploadSession.STATUS_UPLOADING).exclude(
+        items__status=UploadItem.STATUS_PENDING
+    ).update(status=UploadSession.STATUS_STORING)
+    if not claimed:
+        return None
+    session = UploadSession.objects.get(pk=session_id)
+    items = list(session.items.filter(status=UploadItem.STATUS_RECEIVED))
+    try:
+        # Для пустых файлов частей не было и временного файла нет
+        return store_session(session, {
+            item: open(staging_path(item), 'rb') if item.size else io.BytesIO() for item in items
+        })
+    finally:
+        shutil.rmtree(Path(settings.UPLOAD_STAGING_DIR) / str(session_id), ignore_errors=True)
+
+
+def store_session(session, files):
+    """
+    Записывает файлы {UploadItem: файл} в хранилище пулом потоков и создаёт
+    документы одной транзакцией. Потоки только читают метаданные файлов и
+    пишут в хранилище: статусы обновляет вызывающий поток, у потоков нет
+    своих соединений с базой.
+    """
+    field = Document._meta.get_field('file')
+    if session.status != UploadSession.STATUS_STORING:
+        session.status = UploadSession.STATUS_STORING
+        session.save(update_fields=['status'])
+
+    def store(item, f):
+        try:
+            # bulk_create не вызывает Document.save, метаданные - здесь
+            metadata = extract_metadata(f, item.filename)
+            name = field.storage.save(field.generate_filename(None, item.filename), File(f, name=item.filename))
+            return name, metadata
+        finally:
+            f.close()
+
+    stored = []
+    metadata = {}
+    with ThreadPoolExecutor(max_workers=settings.DOCUMENT_UPLOAD_THREADS) as pool:
+        futures = {pool.submit(store, item, f): item for item, f in files.items()}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                item.stored_name, metadata[item.pk] = future.result()
+                item.status = UploadItem.STATUS_STORED
+                stored.append(item)
+            except Exception as e:
+                logger.exception('Ошибка сохранения файла %s', item.filename)
+                item.status, item.error = UploadItem.STATUS_FAILED, str(e)
+            UploadItem.objects.filter(pk=item.pk).update(
+                stored_name=item.stored_name, status=item.status, error=item.error
+            )
+
+    stored.sort(key=lambda item: item.pk)
+    documents = [
+        Document(
+            file=item.stored_name,
+            title=item.filename,
+            description=session.description_template.format(filename=item.filename),
+            file_type=session.file_type,
+            is_public=session.is_public,
+            uploaded_by=session.user,
+            **metadata[item.pk],
+        )
+        for item in stored
+    ]
+    try:
+        with transaction.atomic():
+            Document.objects.bulk_create(documents)
+            for item, document in zip(stored, documents):
+                item.document, item.status = document, UploadItem.STATUS_DONE
+            UploadItem.objects.bulk_update(stored, ['document', 'status'])
+    except Exception as e:
+        logger.exception('Ошибка создания документов загрузки %s', session.pk)
+        for item in stored:
+            field.storage.delete(item.stored_name)
+        session.status, session.error = UploadSession.STATUS_FAILED, str(e)
+    else:
+        # bulk_create не вызывает сигналы post_save
+        for document in documents:
+            index_object(document)
+        session.status = UploadSession.STATUS_DONE if documents or not files else UploadSession.STATUS_FAILED
+    session.finished_at = timezone.now()
+    session.save(update_fields=['status', 'error', 'finished_at'])
+    return documents
+
+
+def expire_sessions(older_than):
+    """Удаляет незавершённые сессии, начатые раньше older_than, и их временные файлы"""
+    sessions = UploadSession.objects.filter(status=UploadSession.STATUS_UPLOADING, created_at__lt=older_than)
+    for session_id in sessions.values_list('pk', flat=True):
+        shutil.rmtree(Path(settings.UPLOAD_STAGING_DIR) / str(session_id), ignore_errors=True)
+    return sessions.delete()[0]
@@ -10,6 +10,7 @@ router.register(r'reviews', views.ReviewViewSet)
 router.register(r'slider-images', views.SliderImageViewSet)
 router.register(r'special-offers', views.SpecialOfferViewSet)
 router.register(r'profile', views.ProfileViewSet, basename='profile')
+router.register(r'document-uploads', views.UploadSessionViewSet, basename='document-upload')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -59,6 +60,7 @@ urlpatterns = [
     path('documents/bulk-upload/', views.bulk_document_upload, name='bulk_document_upload'),
     path('documents/<int:pk>/', views.document_detail, name='document_detail'),
     path('documents/<int:pk>/download/', views.document_download, name='document_download'),
+    path('files/<str:model_name>/<int:pk>/<str:field_name>/', views.file_download, name='file_download'),
     
     # Маршруты для редактирования с файлами
     path('rooms/<int:pk>/edit/', views.room_edit, name='room_edit'),
@@ -4,22 +4,31 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.urls import reverse
-from django.http import HttpResponseRedirect, HttpResponse
-from .models import Room, Amenity, Booking, Review, SliderImage, SpecialOffer, Guest, Payment, UserRole, Document
+from django.http import HttpResponseRedirect, HttpResponse, HttpResponseForbidden, Http404
+from .models import Room, Amenity, Booking, Review, SliderImage, SpecialOffer, Guest, Payment, UserRole, Document, UploadSession
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from .forms import ReviewForm, DocumentUploadForm, DocumentFilterForm, BulkDocumentUploadForm, RoomForm, BookingForm, PaymentForm
-from rest_framework import viewsets, permissions, status
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
-from .serializers import RoomSerializer, BookingSerializer, ReviewSerializer, UserSerializer, SliderImageSerializer, SpecialOfferSerializer, GuestSerializer, PaymentSerializer, UserRoleSerializer, AmenitySerializer
+from .serializers import RoomSerializer, RoomQuoteSerializer, BookingSerializer, ReviewSerializer, UserSerializer, SliderImageSerializer, SpecialOfferSerializer, GuestSerializer, PaymentSerializer, UserRoleSerializer, AmenitySerializer, UploadSessionSerializer
 from django.db.models import Q
 from datetime import datetime
 from rest_framework.views import APIView
 from django.db.models import Prefetch
 from .filters import RoomFilter, BookingFilter, ReviewFilter, PaymentFilter, GuestFilter
-from django.core.paginator import Paginator
+from .availability import parse_stay
+from .downloads import get_downloadable_file, serve_file
+from .services import BookingConflict, create_booking, save_booking
+from .pagination import InvalidCursor, KeysetPagination, PaginatedActionsMixin, keyset_page
+from .file_metadata import filter_by_kind, filter_by_size
+from .substring import contains
+from .uploads import UploadConflict, parse_content_range, receive_chunk, start_session, store_received, store_session
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import APIException
 
 def index(request):
     rooms = Room.objects.all()
@@ -30,13 +39,20 @@ def book_room(request, room_id):
     room = get_object_or_404(Room, id=room_id)
     if request.method == 'POST':
         # Обработка бронирования
-        booking = Booking.objects.create(
-            guest=request.user,
-            room=room,
-            check_in=request.POST['check_in'],
-            check_out=request.POST['check_out'],
-            guests_count=request.POST['guests_count']
-        )
+        try:
+            booking = create_booking(
+                guest=request.user,
+                room=room,
+                check_in=request.POST['check_in'],
+                check_out=request.POST['check_out'],
+                guests_count=request.POST['guests_count']
+            )
+        except (BookingConflict, ValueError) as e:
+            messages.error(request, str(e))
+            return render(request, 'bookings/book_room.html', {'room': room})
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+            return render(request, 'bookings/book_room.html', {'room': room})
         messages.success(request, 'Бронирование успешно создано!')
         return HttpResponseRedirect(booking.get_absolute_url())
     return render(request, 'bookings/book_room.html', {'room': room})
@@ -59,7 +75,14 @@ def modify_booking(request, pk):
         booking.check_in = request.POST['check_in']
         booking.check_out = request.POST['check_out']
         booking.guests_count = request.POST['guests_count']
-        booking.save()
+        try:
+            save_booking(booking)
+        except (BookingConflict, ValueError) as e:
+            messages.error(request, str(e))
+            return render(request, 'bookings/modify_booking.html', {'booking': booking})
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+            return render(request, 'bookings/modify_booking.html', {'booking': booking})
         messages.success(request, 'Бронирование успешно изменено!')
         return HttpResponseRedirect(booking.get_absolute_url())
     return render(request, 'bookings/modify_booking.html', {'booking': booking})
@@ -173,10 +196,6 @@ def register(request):
         form = UserCreationForm()
     return render(request, 'bookings/register.html', {'form': form})
 
-def book_room(request, room_id):
-    # Реализуйте вашу логику бронирования здесь
-    return redirect('index')
-
 @login_required
 def add_review(request):
     if request.method == "POST":
@@ -205,18 +224,16 @@ def available_rooms(request):
     try:
         # Преобразуем строки дат в объекты datetime
         if check_in and check_out:
-            check_in = datetime.strptime(check_in, '%Y-%m-%d').date()
-            check_out = datetime.strptime(check_out, '%Y-%m-%d').date()
+            check_in, check_out = parse_stay(check_in, check_out)
             rooms = Room.get_available_rooms(check_in, check_out)
         else:
             rooms = Room.objects.filter(is_available=True)
 
         # Применяем фильтр по цене
-        if min_price or max_price:
-            rooms = Room.get_rooms_by_price_range(
-                min_price=float(min_price) if min_price else None,
-                max_price=float(max_price) if max_price else None
-            )
+        if min_price:
+            rooms = rooms.filter(price_per_night__gte=float(min_price))
+        if max_price:
+            rooms = rooms.filter(price_per_night__lte=float(max_price))
 
         # Исключаем комнаты с определенным удобством
         if exclude_amenity:
@@ -239,24 +256,16 @@ def rooms_without_reviews(request):
     serializer = RoomSerializer(rooms, many=True)
     return Response(serializer.data)
 
-class RoomViewSet(viewsets.ModelViewSet):
-    queryset = Room.objects.select_related().prefetch_related('amenities', 'reviews').all()
+class RoomViewSet(PaginatedActionsMixin, viewsets.ModelViewSet):
+    # Агрегаты отзывов и текущие бронирования считает RoomListSerializer
+    # одним запросом на страницу, поэтому отзывы и бронирования не подгружаются
+    queryset = Room.objects.prefetch_related('amenities').all()
     serializer_class = RoomSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filterset_class = RoomFilter
     search_fields = ['room_number', 'room_type']
     ordering_fields = ['price_per_night', 'max_occupancy', 'room_number']
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        if self.action == 'list':
-            return queryset.select_related().prefetch_related(
-                'amenities',
-                'reviews',
-                'bookings'
-            )
-        return queryset
-
     @action(detail=False, methods=['get'])
     def available(self, request):
         """Получить доступные комнаты"""
@@ -265,8 +274,7 @@ class RoomViewSet(viewsets.ModelViewSet):
         
         if check_in and check_out:
             try:
-                check_in = datetime.strptime(check_in, '%Y-%m-%d').date()
-                check_out = datetime.strptime(check_out, '%Y-%m-%d').date()
+                check_in, check_out = parse_stay(check_in, check_out)
                 rooms = Room.rooms.available_rooms(check_in, check_out)
             except ValueError:
                 return Response(
@@ -276,40 +284,66 @@ class RoomViewSet(viewsets.ModelViewSet):
         else:
             rooms = Room.rooms.filter(is_available=True)
         
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
+
+    @action(detail=False, methods=['get'])
+    def quote(self, request):
+        """
+        Стоимость проживания [check_in, check_out) с разбивкой по ценам ночей.
+        rooms=1,2,3 - указанные комнаты, иначе все свободные на эти даты.
+        """
+        try:
+            check_in, check_out = parse_stay(
+                request.query_params.get('check_in', ''), request.query_params.get('check_out', '')
+            )
+        except ValueError:
+            return Response(
+                {'error': 'Укажите check_in и check_out в формате YYYY-MM-DD, выезд позже заезда'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        room_ids = request.query_params.get('rooms')
+        if room_ids:
+            try:
+                ids = [int(room_id) for room_id in room_ids.split(',')]
+            except ValueError:
+                return Response(
+                    {'error': 'rooms - список ID комнат через запятую'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            rooms = Room.objects.filter(id__in=ids).order_by('room_number')
+        else:
+            rooms = Room.rooms.available_rooms(check_in, check_out)
+        return self.list_response(
+            rooms, RoomQuoteSerializer, context={'check_in': check_in, 'check_out': check_out}
+        )
 
     @action(detail=False, methods=['get'])
     def luxury(self, request):
         """Получить люкс-комнаты"""
         min_price = request.query_params.get('min_price', 5000)
         rooms = Room.rooms.luxury_rooms(float(min_price))
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=False, methods=['get'])
     def budget(self, request):
         """Получить бюджетные комнаты"""
         max_price = request.query_params.get('max_price', 2000)
         rooms = Room.rooms.budget_rooms(float(max_price))
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=False, methods=['get'])
     def popular(self, request):
         """Получить популярные комнаты"""
         min_bookings = request.query_params.get('min_bookings', 5)
         rooms = Room.rooms.popular_rooms(int(min_bookings))
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=False, methods=['get'])
     def top_rated(self, request):
         """Получить высокорейтинговые комнаты"""
         min_rating = request.query_params.get('min_rating', 4.0)
         rooms = Room.rooms.top_rated(float(min_rating))
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=False, methods=['get'])
     def with_amenities(self, request):
@@ -321,16 +355,14 @@ class RoomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         rooms = Room.rooms.with_all_amenities(amenities)
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=False, methods=['get'])
     def long_stays(self, request):
         """Получить комнаты с длительными бронированиями"""
         min_days = request.query_params.get('min_days', 7)
         rooms = Room.rooms.long_stay_rooms(int(min_days))
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
@@ -339,8 +371,7 @@ class RoomViewSet(viewsets.ModelViewSet):
         """
         room = self.get_object()
         reviews = room.get_room_reviews()
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        return self.list_response(reviews, ReviewSerializer)
 
     @action(detail=True, methods=['get'])
     def future_bookings(self, request, pk=None):
@@ -349,8 +380,7 @@ class RoomViewSet(viewsets.ModelViewSet):
         """
         room = self.get_object()
         bookings = room.get_future_bookings()
-        serializer = BookingSerializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(bookings, BookingSerializer)
 
     @action(detail=False, methods=['get'])
     def high_rated(self, request):
@@ -359,8 +389,7 @@ class RoomViewSet(viewsets.ModelViewSet):
         """
         min_rating = request.query_params.get('min_rating', 4)
         rooms = Room.get_rooms_with_high_rated_reviews(min_rating=float(min_rating))
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=False, methods=['get'])
     def recent_bookings(self, request):
@@ -369,8 +398,7 @@ class RoomViewSet(viewsets.ModelViewSet):
         """
         days = request.query_params.get('days', 30)
         rooms = Room.get_rooms_with_recent_bookings(days=int(days))
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=False, methods=['get'])
     def by_guest_country(self, request):
@@ -384,8 +412,7 @@ class RoomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         rooms = Room.get_rooms_by_guest_country(country)
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=False, methods=['get'])
     def by_review_keyword(self, request):
@@ -399,8 +426,7 @@ class RoomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         rooms = Room.get_rooms_by_review_keywords(keyword)
-        serializer = self.get_serializer(rooms, many=True)
-        return Response(serializer.data)
+        return self.list_response(rooms)
 
     @action(detail=True, methods=['get'])
     def guest_reviews(self, request, pk=None):
@@ -415,8 +441,7 @@ class RoomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         reviews = room.get_guest_reviews(guest_id)
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        return self.list_response(reviews, ReviewSerializer)
 
     @action(detail=True, methods=['get'])
     def bookings_by_status(self, request, pk=None):
@@ -431,8 +456,7 @@ class RoomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         bookings = room.get_bookings_by_status(status_param)
-        serializer = BookingSerializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(bookings, BookingSerializer)
 
     @action(detail=True, methods=['get'])
     def future_bookings_with_guests(self, request, pk=None):
@@ -441,8 +465,7 @@ class RoomViewSet(viewsets.ModelViewSet):
         """
         room = self.get_object()
         bookings = room.get_future_bookings_with_guest_info()
-        serializer = BookingSerializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(bookings, BookingSerializer)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -455,10 +478,16 @@ class RoomViewSet(viewsets.ModelViewSet):
         })
         return context
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingConflictError(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Комната уже забронирована на выбранные даты'
+    default_code = 'booking_conflict'
+
+class BookingViewSet(PaginatedActionsMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.select_related('guest', 'room').prefetch_related('payments').all()
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     filterset_class = BookingFilter
     search_fields = ['room__room_number', 'room__room_type']
     ordering_fields = ['check_in', 'check_out', 'created_at']
@@ -467,10 +496,10 @@ class BookingViewSet(viewsets.ModelViewSet):
         if self.action == 'my':
             return Booking.objects.select_related(
                 'guest',
-                'room',
-                'room__amenities'
+                'room'
             ).prefetch_related(
                 'payments',
+                'room__amenities',
                 'room__reviews'
             ).filter(guest=self.request.user)
         return Booking.objects.select_related(
@@ -478,39 +507,38 @@ class BookingViewSet(viewsets.ModelViewSet):
             'room'
         ).prefetch_related('payments')
 
+    def with_related(self, bookings):
+        """Гость, комната и платежи нужны сериализатору для каждой строки"""
+        return bookings.select_related('guest', 'room').prefetch_related('payments')
+
     @action(detail=False, methods=['get'])
     def my(self, request):
         bookings = self.get_queryset()
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(bookings)
 
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Получить активные бронирования"""
         bookings = Booking.bookings.active_bookings()
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.with_related(bookings))
 
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
         """Получить предстоящие бронирования"""
         bookings = Booking.bookings.upcoming_bookings()
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.with_related(bookings))
 
     @action(detail=False, methods=['get'])
     def past(self, request):
         """Получить прошедшие бронирования"""
         bookings = Booking.bookings.past_bookings()
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.with_related(bookings))
 
     @action(detail=False, methods=['get'])
     def cancelled(self, request):
         """Получить отмененные бронирования"""
         bookings = Booking.bookings.cancelled_bookings()
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.with_related(bookings))
 
     @action(detail=False, methods=['get'])
     def guest_bookings(self, request):
@@ -522,24 +550,21 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         bookings = Booking.bookings.get_guest_bookings(guest_id)
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.with_related(bookings))
 
     @action(detail=False, methods=['get'])
     def long_stays(self, request):
         """Получить бронирования с длительным проживанием"""
         min_days = request.query_params.get('min_days', 7)
         bookings = Booking.bookings.get_long_stays(int(min_days))
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.with_related(bookings))
 
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """Получить недавние бронирования"""
         days = request.query_params.get('days', 30)
         bookings = Booking.bookings.get_recent_bookings(int(days))
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.with_related(bookings))
 
     @action(detail=False, methods=['get'])
     def by_room_type(self, request):
@@ -551,8 +576,19 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         bookings = Booking.bookings.get_bookings_by_room_type(room_type)
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.with_related(bookings))
+
+    def perform_create(self, serializer):
+        try:
+            serializer.save()
+        except BookingConflict as e:
+            raise BookingConflictError(str(e))
+
+    def perform_update(self, serializer):
+        try:
+            serializer.save()
+        except BookingConflict as e:
+            raise BookingConflictError(str(e))
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -570,6 +606,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
     queryset = Review.objects.select_related('guest', 'room').all()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
     filterset_class = ReviewFilter
     search_fields = ['comment', 'room__room_number']
     ordering_fields = ['rating', 'review_date']
@@ -688,10 +725,19 @@ class ProfileViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'updated_at']
 
     def get_queryset(self):
-        return Guest.objects.select_related(
+        queryset = Guest.objects.select_related(
             'user',
             'role'
         ).filter(user=self.request.user)
+        if self.request.method != 'GET':
+            return queryset
+        # Статистика в том же запросе, что и гости
+        return Guest.with_statistics(
+            queryset,
+            period=self.request.query_params.get('period', 'all'),
+            include_cancelled=self.request.query_params.get('include_cancelled', False),
+            min_rating=self.request.query_params.get('min_rating', 0),
+        )
 
     def get_object(self):
         return self.get_queryset().first()
@@ -720,10 +766,49 @@ class ProfileViewSet(viewsets.ModelViewSet):
         })
         return context
 
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Возобновляемая пакетная загрузка документов (bookings.uploads):
+    POST - сессия по списку файлов, PUT files/<id>/ - часть файла с
+    заголовком Content-Range, GET - прогресс каждого файла.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user).prefetch_related('items')
+
+    def perform_create(self, serializer):
+        session = serializer.save()
+        # Пустые файлы получены сразу
+        store_received(session.pk)
+        session.refresh_from_db()
+
+    @action(detail=True, methods=['put'], url_path=r'files/(?P<item_id>\d+)')
+    def upload_chunk(self, request, pk=None, item_id=None):
+        session = self.get_object()
+        item = get_object_or_404(session.items.all(), pk=item_id)
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+            return Response(
+                {'detail': f'Часть больше {settings.UPLOAD_CHUNK_MAX_SIZE} байт'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        try:
+            start, length = parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), length)
+            receive_chunk(item, start, length, request.stream)
+        except UploadConflict as e:
+            return Response({'detail': str(e), 'received': e.received}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        session.refresh_from_db()
+        return Response(self.get_serializer(session).data)
+
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.select_related('booking', 'booking__guest', 'booking__room').all()
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     filterset_class = PaymentFilter
     search_fields = ['booking__room__room_number']
     ordering_fields = ['amount', 'payment_date']
@@ -775,19 +860,27 @@ def document_list(request):
         if filter_form.cleaned_data.get('search'):
             search = filter_form.cleaned_data['search']
             documents = documents.filter(
-                Q(title__icontains=search) | 
-                Q(description__icontains=search)
+                contains(Document, 'title', search) |
+                contains(Document, 'description', search)
             )
+
+        # Размер и тип - из колонок метаданных, без обращения к хранилищу
+        if filter_form.cleaned_data.get('size'):
+            documents = filter_by_size(documents, filter_form.cleaned_data['size'])
+
+        if filter_form.cleaned_data.get('kind'):
+            documents = filter_by_kind(documents, filter_form.cleaned_data['kind'])
     
-    # Пагинация
-    paginator = Paginator(documents, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Пагинация по курсору: без OFFSET и без COUNT(*) на каждой странице
+    try:
+        page_obj = keyset_page(documents, request.GET.get('cursor'), 20)
+    except InvalidCursor:
+        raise Http404('Неверный курсор')
     
     context = {
         'page_obj': page_obj,
         'filter_form': filter_form,
-        'total_documents': documents.count(),
+        'total_documents': documents.count() if request.GET.get('count') else None,
     }
     return render(request, 'bookings/document_list.html', context)
 
@@ -815,30 +908,25 @@ def document_upload(request):
 def bulk_document_upload(request):
     """
     Массовая загрузка документов с использованием одной формы.
+    Файлы пишутся в хранилище параллельно, документы создаются одним
+    bulk_create (bookings.uploads).
     """
     if request.method == 'POST':
         form = BulkDocumentUploadForm(request.POST, request.FILES)
         if form.is_valid():
             files = request.FILES.getlist('files')
-            file_type = form.cleaned_data['file_type']
-            is_public = form.cleaned_data['is_public']
-            description_template = form.cleaned_data.get('description_template', '')
-
-            created_documents = []
-            for f in files:
-                description = description_template.format(filename=f.name)
-                doc = Document(
-                    file=f,
-                    title=f.name,
-                    description=description,
-                    file_type=file_type,
-                    is_public=is_public,
-                    uploaded_by=request.user
-                )
-                doc.save()
-                created_documents.append(doc)
+            session = start_session(
+                request.user, [(f.name, f.size) for f in files], received=True,
+                file_type=form.cleaned_data['file_type'],
+                is_public=form.cleaned_data['is_public'],
+                description_template=form.cleaned_data.get('description_template', ''),
+            )
+            created_documents = store_session(session, dict(zip(session.items.all(), files)))
 
             messages.success(request, f'Успешно загружено {len(created_documents)} документов.')
+            failed = len(files) - len(created_documents)
+            if failed:
+                messages.error(request, f'Не удалось сохранить файлов: {failed}.')
             return redirect('document_list')
         else:
             messages.error(request, 'Ошибка при загрузке документов. Пожалуйста, проверьте форму.')
@@ -866,20 +954,23 @@ def document_detail(request, pk):
 def document_download(request, pk):
     """Скачивание документа"""
     try:
-        document = Document.objects.get(pk=pk)
-        # Проверяем права доступа
-        if not document.is_public and document.uploaded_by != request.user:
-            messages.error(request, 'У вас нет прав для скачивания этого документа')
-            return redirect('document_list')
-        
-        # Возвращаем файл для скачивания
-        response = HttpResponse(document.file, content_type='application/octet-stream')
-        response['Content-Disposition'] = f'attachment; filename="{document.file.name}"'
-        return response
-        
-    except Document.DoesNotExist:
+        document = get_downloadable_file(request.user, 'document', pk, 'file')
+    except Http404:
         messages.error(request, 'Документ не найден')
         return redirect('document_list')
+    except PermissionError:
+        messages.error(request, 'У вас нет прав для скачивания этого документа')
+        return redirect('document_list')
+    return serve_file(request, document)
+
+@login_required
+def file_download(request, model_name, pk, field_name):
+    """Скачивание файла гостя, бронирования, платежа или комнаты"""
+    try:
+        field_file = get_downloadable_file(request.user, model_name, pk, field_name)
+    except PermissionError:
+        return HttpResponseForbidden('У вас нет прав для скачивания этого файла')
+    return serve_file(request, field_file)
 
 @login_required
 def room_edit(request, pk):
@@ -918,9 +1009,13 @@ def booking_edit(request, pk):
     if request.method == 'POST':
         form = BookingForm(request.POST, request.FILES, instance=booking)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Бронирование успешно обновлено')
-            return redirect('booking_detail', pk=booking.pk)
+            try:
+                save_booking(form.save(commit=False))
+            except BookingConflict as e:
+                form.add_error(None, str(e))
+            else:
+                messages.success(request, 'Бронирование успешно обновлено')
+                return redirect('booking_detail', pk=booking.pk)
     else:
         form = BookingForm(instance=booking)
     
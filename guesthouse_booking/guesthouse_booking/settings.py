@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
+from decouple import config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'bookings.metrics.QueryMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'guesthouse_booking.urls'
@@ -79,13 +83,67 @@ WSGI_APPLICATION = 'guesthouse_booking.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# Профиль базы задается окружением (.env): DB_ENGINE=sqlite (по умолчанию)
+# или postgresql. Соединения переиспользуются между запросами
+# (DB_CONN_MAX_AGE секунд) с проверкой живости перед повторным использованием
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+
+# PRAGMA SQLite, выполняются при создании каждого соединения: WAL не дает
+# читателям блокировать запись, synchronous=NORMAL в режиме WAL не теряет
+# целостность, busy_timeout (мс) - ожидание блокировки записи вместо
+# ошибки "database is locked", mmap_size - чтение файла базы через mmap
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=20000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=128 * 1024 * 1024, cast=int),
+}
+
+# PostgreSQL: пул соединений psycopg (нужен psycopg[pool]) вместо
+# постоянных соединений. Django не совмещает пул с CONN_MAX_AGE
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+DB_POOL_OPTIONS = {
+    'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+    'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+    # Секунд ожидания свободного соединения
+    'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
 }
 
+if DB_ENGINE == 'postgresql':
+    if DB_POOL:
+        from psycopg_pool import ConnectionPool
+
+        # Соединение проверяется при выдаче из пула
+        DB_POOL_OPTIONS['check'] = ConnectionPool.check_connection
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='guesthouse'),
+            'USER': config('DB_USER', default='guesthouse'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='127.0.0.1'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pool': DB_POOL_OPTIONS} if DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Транзакция сразу берет блокировку записи: конкурирующие
+                # бронирования ждут друг друга вместо ошибки "database is locked"
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            },
+        }
+    }
 
 
 # Password validation
@@ -131,6 +189,87 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Хранилище загруженных файлов (bookings.storage): одинаковое содержимое
+# всех FileField хранится на диске один раз. Сборка мусора и перевод уже
+# загруженных файлов - manage.py dedupe_media
+MEDIA_DEDUPLICATION = config('MEDIA_DEDUPLICATION', default=True, cast=bool)
+STORAGES = {
+    'default': {
+        'BACKEND': 'bookings.storage.DeduplicatingStorage' if MEDIA_DEDUPLICATION
+        else 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Отдача защищенных файлов: None - потоково из Django, 'x-accel' - nginx
+# (internal location с префиксом ниже, указывающий на MEDIA_ROOT),
+# 'x-sendfile' - Apache mod_xsendfile / lighttpd
+PROTECTED_FILES_OFFLOAD = None
+PROTECTED_FILES_INTERNAL_PREFIX = '/protected/'
+
+# Пакетная загрузка документов (bookings.uploads): потоки записи в
+# хранилище, каталог для частей файлов вне MEDIA_ROOT и пределы размеров
+DOCUMENT_UPLOAD_THREADS = 4
+UPLOAD_STAGING_DIR = Path(tempfile.gettempdir()) / 'guesthouse_uploads'
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024
+UPLOAD_MAX_FILE_SIZE = 500 * 1024 * 1024
+
+# Фоновая генерация PDF-отчетов (manage.py run_report_worker)
+REPORT_JOBS_EAGER = False
+REPORT_WORKER_PROCESSES = 2
+
+# Производные изображений (bookings.images, manage.py run_image_worker):
+# ширины копий и {формат: качество} в порядке предпочтения для <picture>.
+# Форматы, которые не умеет кодировать установленный Pillow, пропускаются
+IMAGE_DERIVATIVE_WIDTHS = [320, 640, 960, 1280, 1920]
+IMAGE_DERIVATIVE_FORMATS = {'avif': 50, 'webp': 75}
+IMAGE_DERIVATIVES_EAGER = False
+IMAGE_WORKER_PROCESSES = 2
+
+# Шрифт с кириллицей для PDF. Без пути шрифт ищется среди системных
+# при первом построении отчета
+PDF_FONT_PATH = None
+PDF_FONT_NAME = None
+
+# Метрики запросов (bookings.metrics): /api/_metrics и manage.py metrics_report
+METRICS_ENABLED = True
+METRICS_BUFFER_SIZE = 1000
+# Файл JSON Lines с метриками каждого запроса (None - только в памяти)
+METRICS_LOG_FILE = None
+# Пороги для предупреждений в логе
+METRICS_QUERY_THRESHOLD = 50
+METRICS_DUPLICATE_QUERY_THRESHOLD = 10
+METRICS_SLOW_REQUEST_MS = 1000
+# Токен для сборщика Prometheus (Authorization: Bearer ...); без токена - только персонал
+METRICS_TOKEN = None
+
+# Кэш: locmem (по умолчанию, отдельный в каждом процессе), file - общий
+# для процессов одной машины, redis - общий для всех серверов
+# (CACHE_LOCATION=redis://host:6379/1, нужен пакет redis)
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'guesthouse'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', '/var/tmp/guesthouse_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': config('CACHE_LOCATION', default=CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': 'guesthouse',
+        'TIMEOUT': 300,
+    }
+}
+
+# Полнотекстовый поиск по отзывам (bookings.search): auto выбирает FTS5
+# в SQLite и tsvector в PostgreSQL, terms - обратный индекс в любой базе.
+# После смены бэкенда нужен manage.py rebuild_review_search
+REVIEW_SEARCH_BACKEND = config('REVIEW_SEARCH_BACKEND', default='auto')
+
+# Поиск подстроки в фильтрах и админке (bookings.substring): auto выбирает
+# pg_trgm в PostgreSQL и FTS5 trigram в SQLite, terms - таблицу SearchTrigram
+SUBSTRING_SEARCH_BACKEND = config('SUBSTRING_SEARCH_BACKEND', default='auto')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -5,7 +5,9 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from bookings.views import RoomViewSet, BookingViewSet, ReviewViewSet, SliderImageViewSet, SpecialOfferViewSet, RegisterView, ProfileViewSet, PaymentViewSet, AmenityViewSet
+from bookings import async_views
+from bookings.metrics import metrics_view
+from bookings.views import file_download, RoomViewSet, BookingViewSet, ReviewViewSet, SliderImageViewSet, SpecialOfferViewSet, RegisterView, ProfileViewSet, PaymentViewSet, AmenityViewSet, UploadSessionViewSet
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
@@ -17,13 +19,22 @@ router.register(r'special-offers', SpecialOfferViewSet)
 router.register(r'profile', ProfileViewSet, basename='profile')
 router.register(r'payments', PaymentViewSet)
 router.register(r'amenities', AmenityViewSet)
+router.register(r'document-uploads', UploadSessionViewSet, basename='document-upload')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/_metrics', metrics_view, name='metrics'),
+    # Асинхронное чтение (ASGI): те же ответы, что у RoomViewSet и ReviewViewSet
+    path('api/async/rooms/', async_views.room_list, name='async-room-list'),
+    path('api/async/rooms/available/', async_views.available_rooms, name='async-room-available'),
+    path('api/async/rooms/<int:pk>/', async_views.room_detail, name='async-room-detail'),
+    path('api/async/reviews/', async_views.review_list, name='async-review-list'),
     path('api/', include(router.urls)),
     path('api/auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/register/', RegisterView.as_view(), name='register'),
+    # Защищённые файлы: права проверяет Django, передача потоковая или через веб-сервер
+    path('files/<str:model_name>/<int:pk>/<str:field_name>/', file_download, name='file_download'),
     # path('silk/', include('silk.urls', namespace='silk')), # Temporarily removed for debugging
     path('__debug__/', include('debug_toolbar.urls')), # Added for diagnostics
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)